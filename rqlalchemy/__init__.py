@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 
 
+from rqlalchemy.instrumentation import RQLEvent
+from rqlalchemy.instrumentation import RQLInstrument
 from rqlalchemy.query import RQLSelect
 from rqlalchemy.query import RQLSelectError
+from rqlalchemy.query import RQLTimeoutError
 from rqlalchemy.query import select
+from rqlalchemy.templates import RQLTemplate
+from rqlalchemy.templates import warm_up
 
 __title__ = "rqlalchemy"
 __version__ = "0.6.0"
@@ -11,4 +16,13 @@ __author__ = "Pedro Werneck"
 __license__ = "MIT"
 
 
-__all__ = ["select", "RQLSelect", "RQLSelectError"]
+__all__ = [
+    "select",
+    "RQLSelect",
+    "RQLSelectError",
+    "RQLTimeoutError",
+    "RQLInstrument",
+    "RQLEvent",
+    "RQLTemplate",
+    "warm_up",
+]
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+import json
+import re
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+SUPPORTED_DIALECTS = {"sqlite", "postgresql", "mysql", "mariadb"}
+
+
+class PlanScan(NamedTuple):
+    table: Optional[str]
+    kind: str
+    index: Optional[str] = None
+    rows: Optional[float] = None
+    sequential: bool = False
+
+
+class QueryPlan(NamedTuple):
+    dialect: str
+    scans: List[PlanScan]
+    indexes: List[str]
+    estimated_rows: Optional[float]
+    cost: Optional[float]
+    warnings: List[str]
+    raw: Any
+
+
+class RQLExplanation(NamedTuple):
+    statement: QueryPlan
+    count: QueryPlan
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "sqlite")
+def _compile_explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain_postgresql(element, compiler, **kw):
+    options = "ANALYZE, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+
+@compiles(Explain, "mysql")
+@compiles(Explain, "mariadb")
+def _compile_explain_mysql(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+_SQLITE_SCAN = re.compile(
+    r"^(?P<op>SCAN|SEARCH) (?:TABLE )?(?P<table>\S+)(?: AS \S+)?"
+    r"(?: USING (?P<covering>COVERING )?INDEX (?P<index>\S+)"
+    r"| USING (?:INTEGER )?(?P<pk>PRIMARY KEY))?"
+)
+
+
+def parse_sqlite_plan(rows) -> List[PlanScan]:
+    scans = []
+
+    for row in rows:
+        detail = row[-1]
+        match = _SQLITE_SCAN.match(detail)
+        if match is None:
+            continue
+
+        index = match["index"] or (f"{match['table']}.pk" if match["pk"] else None)
+        if match["covering"]:
+            kind = "index_only"
+        elif index is not None:
+            kind = "index"
+        else:
+            kind = "seq"
+
+        scans.append(
+            PlanScan(table=match["table"], kind=kind, index=index, sequential=kind == "seq")
+        )
+
+    return scans
+
+
+_POSTGRESQL_KINDS = {
+    "Seq Scan": "seq",
+    "Index Scan": "index",
+    "Index Only Scan": "index_only",
+    "Bitmap Heap Scan": "bitmap",
+    "Bitmap Index Scan": "bitmap_index",
+}
+
+
+def parse_postgresql_plan(plan: Dict[str, Any], analyze: bool = False) -> List[PlanScan]:
+    scans = []
+
+    kind = _POSTGRESQL_KINDS.get(plan.get("Node Type"))
+    if kind is not None:
+        rows = plan.get("Actual Rows" if analyze else "Plan Rows")
+        scans.append(
+            PlanScan(
+                table=plan.get("Relation Name"),
+                kind=kind,
+                index=plan.get("Index Name"),
+                rows=rows,
+                sequential=kind == "seq",
+            )
+        )
+
+    for child in plan.get("Plans", ()):
+        scans.extend(parse_postgresql_plan(child, analyze))
+
+    return scans
+
+
+_MYSQL_KINDS = {"ALL": "seq", "index": "index_scan"}
+
+
+def parse_mysql_plan(rows) -> List[PlanScan]:
+    scans = []
+
+    for row in rows:
+        row = row._mapping
+        if row["table"] is None:
+            continue
+
+        kind = _MYSQL_KINDS.get(row["type"], "index" if row["key"] else str(row["type"]))
+        scans.append(
+            PlanScan(
+                table=row["table"],
+                kind=kind,
+                index=row["key"],
+                rows=row["rows"],
+                sequential=kind == "seq",
+            )
+        )
+
+    return scans
+
+
+def explain(session, statement, analyze: bool = False, seq_scan_rows: int = 0) -> QueryPlan:
+    """Run the dialect-appropriate EXPLAIN on a statement and summarize the
+    plan.
+
+    Sequential scans reading at least `seq_scan_rows` rows, or on tables with
+    no row estimate, are reported in the plan warnings.
+
+    """
+    dialect = session.get_bind().dialect.name
+
+    if dialect not in SUPPORTED_DIALECTS:
+        raise NotImplementedError(f"EXPLAIN is not supported for dialect {dialect}")
+
+    if analyze and dialect != "postgresql":
+        raise NotImplementedError(f"EXPLAIN ANALYZE is not supported for dialect {dialect}")
+
+    result = session.execute(Explain(statement, analyze=analyze))
+
+    estimated_rows = cost = None
+
+    if dialect == "postgresql":
+        raw = result.scalar()
+        if isinstance(raw, str):
+            raw = json.loads(raw)
+
+        plan = raw[0]["Plan"]
+        scans = parse_postgresql_plan(plan, analyze)
+        estimated_rows = plan.get("Actual Rows" if analyze else "Plan Rows")
+        cost = plan.get("Total Cost")
+
+    elif dialect == "sqlite":
+        raw = [tuple(row) for row in result]
+        scans = parse_sqlite_plan(raw)
+
+    else:
+        raw = result.all()
+        scans = parse_mysql_plan(raw)
+        if scans:
+            estimated_rows = max(scan.rows or 0 for scan in scans)
+        raw = [tuple(row) for row in raw]
+
+    indexes = sorted({scan.index for scan in scans if scan.index is not None})
+
+    warnings = [
+        f"Sequential scan on {scan.table}"
+        + (f" ({scan.rows:g} rows)" if scan.rows is not None else "")
+        for scan in scans
+        if scan.sequential and (scan.rows is None or scan.rows >= seq_scan_rows)
+    ]
+
+    return QueryPlan(
+        dialect=dialect,
+        scans=scans,
+        indexes=indexes,
+        estimated_rows=estimated_rows,
+        cost=cost,
+        warnings=warnings,
+        raw=raw,
+    )
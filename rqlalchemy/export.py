@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+from typing import Any
+from typing import Callable
+from typing import Sequence
+from typing import Tuple
+
+import sqlalchemy as sa
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+Encoder = Callable[[Any], Any]
+ColumnsType = Sequence[Tuple[str, Any]]
+
+
+def _python_type(type_) -> Any:
+    try:
+        return type_.python_type
+    except NotImplementedError:
+        return None
+
+
+def _isoformat(value: Any) -> str:
+    return value.isoformat()
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _json_encoder(type_) -> Encoder:
+    """Encoder rendering a non-null value of a column type as JSON text"""
+    if isinstance(type_, sa.JSON):
+        return _dumps
+
+    python_type = _python_type(type_)
+
+    if python_type is bool:
+        return lambda value: "true" if value else "false"
+
+    if python_type is int:
+        return str
+
+    # decimals are written as numbers, without losing precision
+    if python_type is Decimal:
+        return str
+
+    if python_type in (datetime.datetime, datetime.date, datetime.time):
+        return lambda value: '"' + value.isoformat() + '"'
+
+    return _dumps
+
+
+def _csv_encoder(type_) -> Encoder:
+    """Encoder rendering a non-null value of a column type as a CSV field"""
+    if isinstance(type_, sa.JSON):
+        return _dumps
+
+    python_type = _python_type(type_)
+
+    if python_type is bool:
+        return lambda value: "true" if value else "false"
+
+    if python_type in (datetime.datetime, datetime.date, datetime.time):
+        return _isoformat
+
+    return str
+
+
+class NDJSONWriter:
+    """Writes rows as JSON objects, one per line, or as bare JSON values
+    for rows with a single unnamed column.
+
+    """
+
+    def __init__(self, columns: ColumnsType, scalar: bool = False):
+        self.scalar = scalar
+        self.encoders = [_json_encoder(type_) for (_, type_) in columns]
+        self.prefixes = [json.dumps(key) + ":" for (key, _) in columns]
+
+    def header(self) -> str:
+        return ""
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> str:
+        if self.scalar:
+            encode = self.encoders[0]
+            return "".join(("null" if row[0] is None else encode(row[0])) + "\n" for row in rows)
+
+        fields = list(zip(self.prefixes, self.encoders))
+        lines = []
+
+        for row in rows:
+            values = [
+                prefix + ("null" if value is None else encode(value))
+                for ((prefix, encode), value) in zip(fields, row)
+            ]
+            lines.append("{" + ",".join(values) + "}\n")
+
+        return "".join(lines)
+
+
+class CSVWriter:
+    """Writes rows as CSV records, after a header with the column names"""
+
+    def __init__(self, columns: ColumnsType, scalar: bool = False):
+        self.keys = [key for (key, _) in columns]
+        self.encoders = [_csv_encoder(type_) for (_, type_) in columns]
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator="\n")
+
+    def header(self) -> str:
+        self.writer.writerow(self.keys)
+        return self._flush()
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> str:
+        encoders = self.encoders
+
+        self.writer.writerows(
+            ["" if value is None else encode(value) for (encode, value) in zip(encoders, row)]
+            for row in rows
+        )
+
+        return self._flush()
+
+    def _flush(self) -> str:
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+
+WRITERS = {"ndjson": NDJSONWriter, "csv": CSVWriter}
+
+
+def writer(format: str, columns: ColumnsType, scalar: bool = False) -> Any:
+    return WRITERS[format](columns, scalar)
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+import sqlalchemy as sa
+from sqlalchemy import func
+from sqlalchemy import literal_column
+from sqlalchemy import sql
+from sqlalchemy import tablesample
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.functions import FunctionFilter
+from sqlalchemy.sql.functions import GenericFunction
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+class AggregateFilter(FunctionFilter):
+    """An aggregate function restricted to the rows matching a criterion.
+
+    Renders as `FILTER (WHERE ...)` where the dialect supports it, and as an
+    aggregate over a `CASE` expression otherwise.
+
+    """
+
+    inherit_cache = True
+
+
+@compiles(AggregateFilter)
+def _compile_aggregate_filter(element, compiler, **kw):
+    return compiler.visit_funcfilter(element, **kw)
+
+
+@compiles(AggregateFilter, "mysql")
+@compiles(AggregateFilter, "mariadb")
+@compiles(AggregateFilter, "mssql")
+@compiles(AggregateFilter, "oracle")
+def _compile_aggregate_filter_case(element, compiler, **kw):
+    function = element.func
+    (argument, *rest) = list(function.clauses)
+
+    # count(*) counts a constant for the matching rows instead
+    if getattr(argument, "name", None) == "*":
+        argument = literal_column("1")
+
+    case = sql.case((element.criterion, argument))
+
+    return compiler.process(getattr(func, function.name)(case, *rest), **kw)
+
+
+def aggregate_filter(function, criterion):
+    if criterion is None:
+        return function
+
+    # merge with an existing filter, as they can't be nested
+    if isinstance(function, AggregateFilter):
+        return AggregateFilter(function.func, sql.and_(function.criterion, criterion))
+
+    return AggregateFilter(function, criterion)
+
+
+TIME_BUCKET_UNITS = ("second", "minute", "hour", "day", "week", "month", "year")
+
+# formats truncating a datetime to the start of its bucket, with weeks
+# starting on monday as with date_trunc
+_BUCKET_FORMATS = {
+    "second": ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%i:%s"),
+    "minute": ("%Y-%m-%d %H:%M:00", "%Y-%m-%d %H:%i:00"),
+    "hour": ("%Y-%m-%d %H:00:00", "%Y-%m-%d %H:00:00"),
+    "day": ("%Y-%m-%d 00:00:00", "%Y-%m-%d 00:00:00"),
+    "week": ("%Y-%m-%d 00:00:00", "%Y-%m-%d 00:00:00"),
+    "month": ("%Y-%m-01 00:00:00", "%Y-%m-01 00:00:00"),
+    "year": ("%Y-01-01 00:00:00", "%Y-01-01 00:00:00"),
+}
+
+
+class TimeBucket(ColumnElement):
+    """The start of the `unit` long time bucket containing a datetime, after
+    moving it forward by `step` units.
+
+    Renders as `date_trunc()` by default, and as `strftime()` on SQLite and
+    `DATE_FORMAT()` on MySQL.
+
+    """
+
+    inherit_cache = True
+
+    _traverse_internals = [
+        ("clause", InternalTraversal.dp_clauseelement),
+        ("unit", InternalTraversal.dp_plain_obj),
+        ("step", InternalTraversal.dp_plain_obj),
+    ]
+
+    type = sa.DateTime()
+
+    def __init__(self, clause, unit: str, step: int = 0):
+        if unit not in TIME_BUCKET_UNITS:
+            raise ValueError(f"Invalid time bucket unit: {unit}")
+
+        self.clause = clause
+        self.unit = unit
+        self.step = step
+
+    @property
+    def _from_objects(self):
+        return self.clause._from_objects
+
+
+def _literal(compiler, value: str) -> str:
+    return compiler.render_literal_value(value, sa.String())
+
+
+@compiles(TimeBucket)
+def _compile_time_bucket(element, compiler, **kw):
+    value = compiler.process(element.clause, **kw)
+
+    if element.step:
+        interval = _literal(compiler, f"{element.step} {element.unit}")
+        value = f"{value} + INTERVAL {interval}"
+
+    return f"date_trunc({_literal(compiler, element.unit)}, {value})"
+
+
+@compiles(TimeBucket, "sqlite")
+def _compile_time_bucket_sqlite(element, compiler, **kw):
+    modifiers = []
+
+    if element.step and element.unit == "week":
+        modifiers.append(f"+{element.step * 7} days")
+    elif element.step:
+        modifiers.append(f"+{element.step} {element.unit}")
+
+    if element.unit == "week":
+        modifiers.extend(["weekday 0", "-6 days"])
+
+    args = [
+        _literal(compiler, _BUCKET_FORMATS[element.unit][0]),
+        compiler.process(element.clause, **kw),
+    ]
+    args.extend(_literal(compiler, modifier) for modifier in modifiers)
+
+    return f"strftime({', '.join(args)})"
+
+
+@compiles(TimeBucket, "mysql")
+@compiles(TimeBucket, "mariadb")
+def _compile_time_bucket_mysql(element, compiler, **kw):
+    value = compiler.process(element.clause, **kw)
+
+    if element.step:
+        value = f"DATE_ADD({value}, INTERVAL {int(element.step)} {element.unit.upper()})"
+
+    if element.unit == "week":
+        value = f"DATE_SUB({value}, INTERVAL WEEKDAY({value}) DAY)"
+
+    value = f"DATE_FORMAT({value}, {_literal(compiler, _BUCKET_FORMATS[element.unit][1])})"
+
+    return f"CAST({value} AS DATETIME)"
+
+
+class approx_count_distinct(GenericFunction):
+    """The approximate number of distinct values of an expression.
+
+    Renders as the native `APPROX_COUNT_DISTINCT()` on SQL Server and
+    Oracle, and as an exact `count(DISTINCT ...)` elsewhere.
+
+    """
+
+    type = sa.Integer()
+    inherit_cache = True
+
+
+@compiles(approx_count_distinct)
+def _compile_approx_count_distinct(element, compiler, **kw):
+    return f"count(DISTINCT {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(approx_count_distinct, "mssql")
+@compiles(approx_count_distinct, "oracle")
+def _compile_approx_count_distinct_native(element, compiler, **kw):
+    return f"APPROX_COUNT_DISTINCT({compiler.process(element.clauses, **kw)})"
+
+
+class approx_percentile(GenericFunction):
+    """The value below which a fraction `p` of an expression's values fall,
+    interpolated between the closest values.
+
+    Renders as the native `APPROX_PERCENTILE_CONT()` on SQL Server and
+    `APPROX_PERCENTILE()` on Oracle, and as the exact `percentile_cont()`
+    ordered-set aggregate elsewhere. Not supported on SQLite and MySQL.
+
+    """
+
+    type = sa.Float()
+    inherit_cache = True
+
+    # the fraction is rendered as a literal, so it's part of the cache key
+    _traverse_internals = GenericFunction._traverse_internals + [
+        ("fraction", InternalTraversal.dp_plain_obj),
+    ]
+
+    def __init__(self, clause, fraction: float, **kwargs):
+        self.fraction = float(fraction)
+        super().__init__(clause, **kwargs)
+
+
+def _percentile_args(element, compiler, **kw):
+    fraction = compiler.render_literal_value(element.fraction, sa.Float())
+    return compiler.process(element.clauses, **kw), fraction
+
+
+@compiles(approx_percentile)
+def _compile_approx_percentile(element, compiler, **kw):
+    clause, fraction = _percentile_args(element, compiler, **kw)
+    return f"percentile_cont({fraction}) WITHIN GROUP (ORDER BY {clause})"
+
+
+@compiles(approx_percentile, "mssql")
+def _compile_approx_percentile_mssql(element, compiler, **kw):
+    clause, fraction = _percentile_args(element, compiler, **kw)
+    return f"APPROX_PERCENTILE_CONT({fraction}) WITHIN GROUP (ORDER BY {clause})"
+
+
+@compiles(approx_percentile, "oracle")
+def _compile_approx_percentile_oracle(element, compiler, **kw):
+    clause, fraction = _percentile_args(element, compiler, **kw)
+    return f"APPROX_PERCENTILE({fraction}) WITHIN GROUP (ORDER BY {clause})"
+
+
+@compiles(approx_percentile, "sqlite")
+@compiles(approx_percentile, "mysql")
+@compiles(approx_percentile, "mariadb")
+def _compile_approx_percentile_unsupported(element, compiler, **kw):
+    raise CompileError(f"Percentiles are not supported for dialect {compiler.dialect.name}")
+
+
+class Sample(ColumnElement):
+    """A criterion matching about `percent` percent of a table's rows.
+
+    On PostgreSQL, the rows are matched by primary key against a
+    `TABLESAMPLE SYSTEM` of the table, reading only the sampled pages.
+    Elsewhere, each row is matched at random.
+
+    """
+
+    inherit_cache = True
+
+    _traverse_internals = [
+        ("table", InternalTraversal.dp_clauseelement),
+        ("percent", InternalTraversal.dp_plain_obj),
+    ]
+
+    type = sa.Boolean()
+
+    # rendered as is in WHERE, instead of compared to 1
+    _is_implicitly_boolean = True
+
+    def __init__(self, table, percent: float):
+        if not 0 < percent <= 100:
+            raise ValueError(f"Invalid sample percentage: {percent}")
+
+        self.table = table
+        self.percent = float(percent)
+
+    @property
+    def _from_objects(self):
+        return [self.table]
+
+
+def _fraction(compiler, element) -> str:
+    return compiler.render_literal_value(element.percent / 100, sa.Float())
+
+
+@compiles(Sample)
+def _compile_sample(element, compiler, **kw):
+    return f"random() < {_fraction(compiler, element)}"
+
+
+@compiles(Sample, "postgresql")
+def _compile_sample_postgresql(element, compiler, **kw):
+    table = element.table
+    percent = literal_column(compiler.render_literal_value(element.percent, sa.Float()))
+    sampled = tablesample(table, func.system(percent), name=f"{table.name}_sample")
+
+    keys = list(table.primary_key)
+    if len(keys) == 1:
+        (key,) = keys
+        criterion = key.in_(sa.select(sampled.c[key.key]))
+    else:
+        sampled_keys = [sampled.c[key.key] for key in keys]
+        criterion = sql.tuple_(*keys).in_(sa.select(*sampled_keys))
+
+    return compiler.process(criterion, **kw)
+
+
+@compiles(Sample, "sqlite")
+def _compile_sample_sqlite(element, compiler, **kw):
+    # random() returns a signed 64-bit integer
+    threshold = int(element.percent * 10000)
+    return f"abs(random() % 1000000) < {threshold}"
+
+
+@compiles(Sample, "mysql")
+@compiles(Sample, "mariadb")
+def _compile_sample_mysql(element, compiler, **kw):
+    return f"RAND() < {_fraction(compiler, element)}"
+
+
+@compiles(Sample, "mssql")
+def _compile_sample_mssql(element, compiler, **kw):
+    # RAND() is evaluated once per statement; ABS() of INT_MIN overflows
+    threshold = int(element.percent * 10000)
+    return f"ABS(CHECKSUM(NEWID()) % 1000000) < {threshold}"
+
+
+@compiles(Sample, "oracle")
+def _compile_sample_oracle(element, compiler, **kw):
+    return f"DBMS_RANDOM.VALUE < {_fraction(compiler, element)}"
+
+
+class TopRows(ColumnElement):
+    """A criterion matching the top rows of each group, as the `window`
+    criterion ranking rows with `ROW_NUMBER()`, or on PostgreSQL the
+    `lateral` criterion reading the top rows of each group with a `LATERAL`
+    join, if given.
+
+    """
+
+    inherit_cache = True
+
+    _traverse_internals = [
+        ("window", InternalTraversal.dp_clauseelement),
+        ("lateral", InternalTraversal.dp_clauseelement),
+    ]
+
+    type = sa.Boolean()
+
+    _is_implicitly_boolean = True
+
+    def __init__(self, window, lateral=None):
+        self.window = window
+        self.lateral = lateral
+
+    @property
+    def _from_objects(self):
+        return self.window._from_objects
+
+
+@compiles(TopRows)
+def _compile_top_rows(element, compiler, **kw):
+    return compiler.process(element.window, **kw)
+
+
+@compiles(TopRows, "postgresql")
+def _compile_top_rows_postgresql(element, compiler, **kw):
+    return compiler.process(element.window if element.lateral is None else element.lateral, **kw)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from time import perf_counter
+from time import time_ns
+from typing import Any
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT
+
+PROBE_OPTION = "rqlalchemy_probe"
+
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+class RQLEvent(NamedTuple):
+    operation: str
+    expression: Optional[str]
+    parsed: Optional[Dict[str, Any]]
+    stages: Dict[str, float]
+    duration: float
+    start_ns: int
+    rows: Optional[int] = None
+    joins: int = 0
+    ast_size: int = 0
+    cache_hit: Optional[bool] = None
+
+
+class RQLInstrument:
+    """Base class for instruments receiving an `RQLEvent` for every
+    `rql()`, `execute()` and `rql_paginate()` call.
+
+    Instruments are enabled by adding them to `RQLSelect._rql_instruments`.
+
+    """
+
+    def record(self, event: RQLEvent) -> None:
+        raise NotImplementedError
+
+
+class RQLProbe:
+    """Collects stage durations for a single instrumented operation.
+
+    Stages are contiguous: each call to `mark()` records the time elapsed
+    since the previous mark under the given stage name, adding up if the
+    same stage is marked more than once.
+
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.stages: Dict[str, float] = {}
+        self.cache_hit: Optional[bool] = None
+        self.start_ns = time_ns()
+        self.start = self.last = perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def execution_options(self) -> Dict[str, Any]:
+        _install_listeners()
+        return {PROBE_OPTION: self}
+
+    def _before_cursor_execute(self, context) -> None:
+        self.mark("compile")
+        hit = context.cache_hit is CACHE_HIT
+        # an operation running more than one statement is a hit only if all
+        # of them were
+        self.cache_hit = hit if self.cache_hit is None else self.cache_hit and hit
+
+    def _after_cursor_execute(self) -> None:
+        self.mark("database")
+
+    def event(self, select_, rows: Optional[int] = None) -> RQLEvent:
+        parsed = getattr(select_, "rql_parsed", None)
+
+        return RQLEvent(
+            operation=self.operation,
+            expression=getattr(select_, "rql_expression", None) if parsed else None,
+            parsed=parsed,
+            stages=self.stages,
+            duration=self.last - self.start,
+            start_ns=self.start_ns,
+            rows=rows,
+            joins=len(select_._rql_joins),
+            ast_size=ast_size(parsed),
+            cache_hit=self.cache_hit,
+        )
+
+
+def ast_size(node: Any) -> int:
+    if isinstance(node, dict):
+        return 1 + sum(ast_size(arg) for arg in node["args"])
+
+    return 0
+
+
+def _probe(context) -> Optional[RQLProbe]:
+    return context.execution_options.get(PROBE_OPTION)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    probe = _probe(context)
+    if probe is not None:
+        probe._before_cursor_execute(context)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    probe = _probe(context)
+    if probe is not None:
+        probe._after_cursor_execute()
+
+
+def _install_listeners() -> None:
+    # the cursor events are only needed to split compilation from database
+    # time, so they are installed the first time an instrumented query runs
+    global _listeners_installed
+
+    if _listeners_installed:
+        return
+
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            _listeners_installed = True
+
+
+class OpenTelemetryInstrument(RQLInstrument):
+    """Records every event as an OpenTelemetry span, with stage durations
+    and query statistics as span attributes.
+
+    Requires the `opentelemetry-api` package.
+
+    """
+
+    def __init__(self, tracer=None):
+        if tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError as e:  # pragma: no cover
+                raise ImportError("OpenTelemetryInstrument requires opentelemetry-api") from e
+
+            tracer = trace.get_tracer("rqlalchemy")
+
+        self.tracer = tracer
+
+    def record(self, event: RQLEvent) -> None:
+        span = self.tracer.start_span(f"rqlalchemy.{event.operation}", start_time=event.start_ns)
+
+        span.set_attribute("rql.joins", event.joins)
+        span.set_attribute("rql.ast_size", event.ast_size)
+
+        if event.expression is not None:
+            span.set_attribute("rql.expression", event.expression)
+
+        if event.rows is not None:
+            span.set_attribute("rql.rows", event.rows)
+
+        if event.cache_hit is not None:
+            span.set_attribute("rql.cache_hit", event.cache_hit)
+
+        for stage, duration in event.stages.items():
+            span.set_attribute(f"rql.stage.{stage}", duration)
+
+        span.end(end_time=event.start_ns + int(event.duration * 1e9))
+
+
+class PrometheusInstrument(RQLInstrument):
+    """Exports stage durations, row counts and cache hits as Prometheus
+    metrics.
+
+    Requires the `prometheus-client` package.
+
+    """
+
+    def __init__(self, prefix: str = "rqlalchemy", registry=None):
+        try:
+            from prometheus_client import REGISTRY
+            from prometheus_client import Counter
+            from prometheus_client import Histogram
+        except ImportError as e:  # pragma: no cover
+            raise ImportError("PrometheusInstrument requires prometheus-client") from e
+
+        registry = registry if registry is not None else REGISTRY
+
+        self.stage_seconds = Histogram(
+            f"{prefix}_stage_seconds",
+            "Time spent on each stage of an RQL query",
+            ["operation", "stage"],
+            registry=registry,
+        )
+        self.rows = Histogram(
+            f"{prefix}_rows",
+            "Number of rows returned by an RQL query",
+            ["operation"],
+            buckets=(1, 10, 100, 1000, 10000, 100000, float("inf")),
+            registry=registry,
+        )
+        self.joins = Counter(
+            f"{prefix}_joins",
+            "Number of joins added by RQL queries",
+            ["operation"],
+            registry=registry,
+        )
+        self.cache = Counter(
+            f"{prefix}_compiled_cache",
+            "Compiled statement cache lookups by RQL queries",
+            ["operation", "result"],
+            registry=registry,
+        )
+
+    def record(self, event: RQLEvent) -> None:
+        for stage, duration in event.stages.items():
+            self.stage_seconds.labels(event.operation, stage).observe(duration)
+
+        if event.rows is not None:
+            self.rows.labels(event.operation).observe(event.rows)
+
+        if event.joins:
+            self.joins.labels(event.operation).inc(event.joins)
+
+        if event.cache_hit is not None:
+            self.cache.labels(event.operation, "hit" if event.cache_hit else "miss").inc()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.inspection import inspect
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.elements import Grouping
+from sqlalchemy.sql.visitors import InternalTraversal
+
+PathType = Tuple[Any, ...]
+
+SQL_TYPES = {
+    str: sa.String(255),
+    int: sa.Integer(),
+    float: sa.Float(),
+    bool: sa.Boolean(),
+}
+
+
+class JSONPathElement(ColumnElement):
+    """A value extracted from a JSON column, with the path rendered as a
+    literal so the SQL text is the same in queries and index definitions.
+
+    """
+
+    inherit_cache = True
+
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("path", InternalTraversal.dp_plain_obj),
+        ("python_type", InternalTraversal.dp_plain_obj),
+    ]
+
+    def __init__(self, column, path: PathType, python_type: type = str):
+        if python_type not in SQL_TYPES:
+            raise TypeError(f"Unsupported JSON path type: {python_type}")
+
+        self.column = column
+        self.path = tuple(path)
+        self.python_type = python_type
+        self.type = SQL_TYPES[python_type]
+        self.key = str(self.path[-1])
+
+
+def _quote(literal: str) -> str:
+    return "'" + literal.replace("'", "''") + "'"
+
+
+def _json_path(path: PathType) -> str:
+    # JSONPath syntax used by SQLite and MySQL: $."key"[0]
+    parts = ["$"]
+    for key in path:
+        if isinstance(key, int):
+            parts.append(f"[{key}]")
+        else:
+            parts.append('."' + key.replace('"', '\\"') + '"')
+
+    return _quote("".join(parts))
+
+
+@compiles(JSONPathElement)
+def _compile_json_path(element, compiler, **kw):
+    raise CompileError(f"JSON paths are not supported for dialect {compiler.dialect.name}")
+
+
+@compiles(JSONPathElement, "sqlite")
+def _compile_json_path_sqlite(element, compiler, **kw):
+    column = compiler.process(element.column, **kw)
+    value = f"json_extract({column}, {_json_path(element.path)})"
+
+    if element.python_type is int:
+        return f"CAST({value} AS INTEGER)"
+    elif element.python_type is float:
+        return f"CAST({value} AS REAL)"
+
+    # strings are returned unquoted, and booleans as 0 or 1
+    return value
+
+
+@compiles(JSONPathElement, "postgresql")
+def _compile_json_path_postgresql(element, compiler, **kw):
+    column = compiler.process(element.column, **kw)
+    keys = ",".join('"' + str(key).replace('"', '\\"') + '"' for key in element.path)
+    value = f"({column} #>> {_quote('{' + keys + '}')})"
+
+    if element.python_type is int:
+        return f"CAST({value} AS INTEGER)"
+    elif element.python_type is float:
+        return f"CAST({value} AS DOUBLE PRECISION)"
+    elif element.python_type is bool:
+        return f"CAST({value} AS BOOLEAN)"
+
+    return value
+
+
+@compiles(JSONPathElement, "mysql")
+@compiles(JSONPathElement, "mariadb")
+def _compile_json_path_mysql(element, compiler, **kw):
+    column = compiler.process(element.column, **kw)
+    value = f"JSON_EXTRACT({column}, {_json_path(element.path)})"
+
+    if element.python_type in (int, bool):
+        return f"CAST({value} AS SIGNED)"
+    elif element.python_type is float:
+        return f"CAST({value} AS DOUBLE)"
+
+    # text values must have a length to be indexed
+    return f"CAST(JSON_UNQUOTE({value}) AS CHAR(255))"
+
+
+class JSONPathMapping(NamedTuple):
+    model: Any
+    path: PathType
+    python_type: type
+    column: Optional[str] = None
+    index: Optional[str] = None
+
+    def expression(self, column=None) -> JSONPathElement:
+        if column is None:
+            column = getattr(self.model, self.path[0])
+
+        return JSONPathElement(column, self.path[1:], self.python_type)
+
+
+class JSONPathRegistry:
+    """Maps paths on a model's JSON columns to a physical column, such as a
+    generated column, or to an expression index.
+
+    RQL references to a registered path are replaced by the column, or by an
+    expression with exactly the same SQL as the index definition.
+
+    """
+
+    def __init__(self):
+        self._mappings: Dict[Tuple[Any, PathType], JSONPathMapping] = {}
+
+    def register(
+        self,
+        model: Any,
+        path: PathType,
+        python_type: type = str,
+        column: Optional[str] = None,
+        index: Optional[str] = None,
+    ) -> JSONPathMapping:
+        """Register a path, starting with the JSON column name.
+
+        With `column`, references are replaced by that mapped attribute.
+        Otherwise, they are replaced by the path expression, cast to
+        `python_type`, and indexed as `index`.
+
+        """
+        if len(path) < 2:
+            raise ValueError("JSON paths must have a column and at least one key")
+
+        if column is None and index is None:
+            index = "ix_{}_{}".format(
+                inspect(model).local_table.name, "_".join(str(key) for key in path)
+            )
+
+        mapping = JSONPathMapping(model, tuple(path), python_type, column, index)
+        self._mappings[(model, mapping.path)] = mapping
+
+        return mapping
+
+    def unregister(self, model: Any, path: PathType) -> None:
+        self._mappings.pop((model, tuple(path)), None)
+
+    def get(self, model: Any, path: PathType) -> Optional[JSONPathMapping]:
+        if not self._mappings:
+            return None
+
+        return self._mappings.get((model, tuple(path)))
+
+    def mappings(self, model: Any) -> List[JSONPathMapping]:
+        return [m for (mapped, _), m in self._mappings.items() if mapped is model]
+
+    def ddl(self, model: Any, dialect) -> List[str]:
+        """Generate the DDL statements creating the columns and indexes for
+        all paths registered for a model, for use in migrations.
+
+        """
+        # work on a copy of the table so the model's metadata isn't changed
+        table = inspect(model).local_table.to_metadata(sa.MetaData())
+        mapper = inspect(model)
+
+        statements = []
+
+        for mapping in self.mappings(model):
+            json_column = table.c[mapper.attrs[mapping.path[0]].columns[0].name]
+            expression = mapping.expression(json_column)
+
+            if mapping.column is None:
+                # MySQL functional key parts need their own parentheses
+                if dialect.name in ("mysql", "mariadb"):
+                    index = sa.Index(mapping.index, Grouping(expression))
+                else:
+                    index = sa.Index(mapping.index, expression)
+                statements.append(str(CreateIndex(index).compile(dialect=dialect)))
+                continue
+
+            sql = expression.compile(
+                dialect=dialect, compile_kwargs={"include_table": False, "literal_binds": True}
+            )
+            type_ = expression.type.compile(dialect=dialect)
+            # SQLite can only add virtual generated columns
+            storage = "VIRTUAL" if dialect.name == "sqlite" else "STORED"
+            preparer = dialect.identifier_preparer
+
+            statements.append(
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {preparer.quote(mapping.column)} {type_} "
+                f"GENERATED ALWAYS AS ({sql}) {storage}"
+            )
+
+            if mapping.index is not None:
+                statements.append(
+                    f"CREATE INDEX {preparer.quote(mapping.index)} "
+                    f"ON {preparer.format_table(table)} ({preparer.quote(mapping.column)})"
+                )
+
+        return statements
+
+
+json_paths = JSONPathRegistry()
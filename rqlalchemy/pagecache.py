@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import Hashable
+from typing import NamedTuple
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+PENDING_KEY = "rqlalchemy_page_cache_models"
+
+_caches: "weakref.WeakSet[RQLPageCache]" = weakref.WeakSet()
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+class CachedPage(NamedTuple):
+    page: Any
+    total: Optional[int]
+    models: FrozenSet[Any]
+    expires: float
+
+
+class RQLPageCache:
+    """Keeps the pages fetched ahead by `rql_paginate()`.
+
+    Each paginated query fetches `pages` pages at once, returns the first,
+    and keeps the others keyed by the statement and their offset, so
+    browsing forward is served from memory. Entities are kept as snapshots
+    of their column values, and new instances are built for each request.
+    Pages expire after `ttl` seconds, at most `max_pages` pages are kept,
+    evicting the least recently used, and all pages of a model are dropped
+    when a session flushes changes to it. Sessions with pending changes
+    bypass the cache, so they're flushed before querying.
+
+    Enabled by setting `RQLSelect._rql_page_cache`.
+
+    """
+
+    def __init__(self, pages: int = 3, ttl: float = 30.0, max_pages: int = 1000):
+        if pages < 2:
+            raise ValueError("Prefetching requires at least two pages")
+
+        self.pages = pages
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._pages: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        _caches.add(self)
+        _install_listeners()
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is None:
+                return None
+
+            if cached.expires <= time.monotonic():
+                del self._pages[key]
+                return None
+
+            self._pages.move_to_end(key)
+            return cached
+
+    def put(self, key: Hashable, page: Any, total: Optional[int], models: FrozenSet[Any]) -> None:
+        cached = CachedPage(page, total, models, time.monotonic() + self.ttl)
+
+        with self._lock:
+            self._pages[key] = cached
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def invalidate(self, model: Any = None) -> None:
+        """Drop the pages including a model, or all pages"""
+        with self._lock:
+            if model is None:
+                self._pages.clear()
+                return
+
+            for key in [k for k, cached in self._pages.items() if model in cached.models]:
+                del self._pages[key]
+
+
+def freeze(value: Any) -> Hashable:
+    """Convert a parsed RQL expression or bound values to a hashable key"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+
+    return value
+
+
+def snapshot(obj: Any) -> Dict[str, Any]:
+    """Copy the loaded column values of an entity"""
+    state = inspect(obj)
+    return {
+        prop.key: deepcopy(state.dict[prop.key])
+        for prop in state.mapper.column_attrs
+        if prop.key in state.dict
+    }
+
+
+def restore(session: Session, model: Any, values: Dict[str, Any]) -> Any:
+    """Build an entity from a snapshot and merge it into the session,
+    without loading it again. Columns missing from the snapshot are loaded
+    on access, and entities already in the session are returned as they
+    are.
+
+    """
+    obj = inspect(model).class_manager.new_instance()
+    for key, value in values.items():
+        set_committed_value(obj, key, deepcopy(value))
+
+    make_transient_to_detached(obj)
+
+    existing = session.identity_map.get(inspect(obj).key)
+    if existing is not None:
+        return existing
+
+    return session.merge(obj, load=False)
+
+
+def _invalidate(models) -> None:
+    for cache in list(_caches):
+        for model in models:
+            cache.invalidate(model)
+
+
+def _after_flush(session, flush_context) -> None:
+    changed = itertools.chain(session.new, session.dirty, session.deleted)
+    models = {type(obj) for obj in changed}
+    _invalidate(models)
+
+    # pages fetched by other sessions before the commit are still stale
+    session.info.setdefault(PENDING_KEY, set()).update(models)
+
+
+def _after_commit(session) -> None:
+    _invalidate(session.info.pop(PENDING_KEY, ()))
+
+
+def _after_rollback(session) -> None:
+    session.info.pop(PENDING_KEY, None)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        models = {mapper.class_ for mapper in orm_execute_state.all_mappers}
+        _invalidate(models)
+        orm_execute_state.session.info.setdefault(PENDING_KEY, set()).update(models)
+
+
+def _install_listeners() -> None:
+    global _listeners_installed
+
+    if _listeners_installed:
+        return
+
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Session, "after_flush", _after_flush)
+            event.listen(Session, "after_commit", _after_commit)
+            event.listen(Session, "after_rollback", _after_rollback)
+            event.listen(Session, "do_orm_execute", _do_orm_execute)
+            _listeners_installed = True
@@ -1,17 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import base64
 import datetime
+import json
 import operator
+import uuid
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
 from copy import deepcopy
 from decimal import Decimal
+from decimal import InvalidOperation
 from functools import reduce
 from typing import Any
+from typing import AsyncIterator
 from typing import Callable
 from typing import Dict
+from typing import Iterator
 from typing import List
 from typing import NamedTuple
 from typing import Optional
 from typing import Sequence
+from typing import Tuple
 from typing import Union
 
 from pyrql import RQLSyntaxError
@@ -22,15 +31,53 @@ from sqlalchemy import ColumnElement
 from sqlalchemy import Row
 from sqlalchemy import RowMapping
 from sqlalchemy import Select
+from sqlalchemy import UniqueConstraint
 from sqlalchemy import func
 from sqlalchemy import sql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.exc import MultipleResultsFound
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import ColumnProperty
 from sqlalchemy.orm import Session
+from sqlalchemy.orm import aliased
 from sqlalchemy.orm import decl_api
+from sqlalchemy.orm import defer
+from sqlalchemy.orm import load_only
 from sqlalchemy.sql import _typing
 from sqlalchemy.sql import elements
+from sqlalchemy.sql import util as sql_util
+from sqlalchemy.sql import visitors
+
+from rqlalchemy.explain import RQLExplanation
+from rqlalchemy.explain import explain
+from rqlalchemy.export import EXPORT_FORMATS
+from rqlalchemy.export import writer
+from rqlalchemy.functions import TIME_BUCKET_UNITS
+from rqlalchemy.functions import AggregateFilter
+from rqlalchemy.functions import Sample
+from rqlalchemy.functions import TimeBucket
+from rqlalchemy.functions import TopRows
+from rqlalchemy.functions import aggregate_filter
+from rqlalchemy.functions import approx_count_distinct
+from rqlalchemy.functions import approx_percentile
+from rqlalchemy.instrumentation import RQLInstrument
+from rqlalchemy.instrumentation import RQLProbe
+from rqlalchemy.jsonpaths import JSONPathElement
+from rqlalchemy.jsonpaths import JSONPathRegistry
+from rqlalchemy.jsonpaths import json_paths
+from rqlalchemy.pagecache import RQLPageCache
+from rqlalchemy.pagecache import freeze
+from rqlalchemy.pagecache import restore
+from rqlalchemy.pagecache import snapshot
+from rqlalchemy.rollups import RollupRegistry
+from rqlalchemy.rollups import rollups
+from rqlalchemy.routing import RQLRoutingPolicy
+from rqlalchemy.routing import bind_arguments
+from rqlalchemy.timeouts import is_timeout_error
+from rqlalchemy.timeouts import statement_timeout
 
 ArgsType = List[Any]
 BinaryOperator = Callable[[Any, Any], Any]
@@ -39,15 +86,25 @@ NoneType = type(None)
 
 class PaginatedResults(NamedTuple):
     page: Any
-    total: int
+    total: Optional[int]
     previous_page: Optional[str] = None
     next_page: Optional[str] = None
 
 
+class SyncResults(NamedTuple):
+    changes: Any
+    token: Optional[str]
+    has_more: bool = False
+
+
 class RQLSelectError(Exception):
     pass
 
 
+class RQLTimeoutError(RQLSelectError):
+    pass
+
+
 class RQLSelect(Select):
     inherit_cache = True
     _rql_error_cls = RQLSelectError
@@ -56,19 +113,48 @@ class RQLSelect(Select):
     _rql_default_limit = None
     _rql_auto_scalar = False
     _rql_strict_json_types = False
+    _rql_instruments: Sequence[RQLInstrument] = ()
+    _rql_explain_seq_scan_rows = 10000
+    _rql_jsonb_containment = True
+    _rql_default_deferred_columns: Sequence[str] = ()
+    _rql_grouping_sets_dialects = {"postgresql", "mssql", "oracle"}
+    _rql_loose_index_scan_dialects = {"postgresql", "sqlite"}
+    _rql_percentile_unsupported_dialects = {"sqlite", "mysql", "mariadb"}
+    _rql_json_paths: JSONPathRegistry = json_paths
+    _rql_rollups: RollupRegistry = rollups
+    _rql_synchronize_session: Any = "auto"
+    _rql_sync_column: Optional[str] = None
+    _rql_routing: Optional[RQLRoutingPolicy] = None
+    _rql_timeout: Optional[float] = None
+    _rql_count_timeout: Optional[float] = None
+    _rql_page_cache: Optional[RQLPageCache] = None
 
     def __init__(self, *entities: _typing._ColumnsClauseArgument[Any]):
         super().__init__(*entities)
+        self._rql_reset()
+
+    def _rql_reset(self) -> None:
         self._rql_select_clause = []
         self._rql_values_clause = None
         self._rql_scalar_clause = None
+        self._rql_scalar_clauses = {}
         self._rql_where_clause = None
         self._rql_order_by_clause = None
         self._rql_limit_clause = None
         self._rql_offset_clause = None
+        self._rql_limit_argument = None
         self._rql_one_clause = None
         self._rql_distinct_clause = None
         self._rql_group_by_clause = None
+        self._rql_having_clause = []
+        self._rql_aggregate_labels = {}
+        self._rql_bucket_clause = None
+        self._rql_bucket_fill = False
+        self._rql_top_clause = None
+        self._rql_percentiles = False
+        self._rql_fields_clause = None
+        self._rql_facets_clause = None
+        self._rql_facets_top = None
         self._rql_joins = []
         self._rql_aliased_models = {}
 
@@ -84,11 +170,24 @@ class RQLSelect(Select):
     def _rql_select_offset(self):
         return self._offset_clause.value if self._offset_clause is not None else None
 
-    def rql(self, query: str = "", limit: Optional[int] = None) -> "RQLSelect":  # noqa: C901
+    def rql(self, query: str = "", limit: Optional[int] = None) -> "RQLSelect":
+        return self._rql_build(query, None, limit)
+
+    def _rql_build(  # noqa: C901
+        self, query: str, parsed: Optional[Dict[str, Any]], limit: Optional[int]
+    ) -> "RQLSelect":
         if len(self._rql_select_entities) > 1:
             raise self._rql_error_cls("Select must have only one entity")
 
-        if not query:
+        probe = RQLProbe("rql") if self._rql_instruments else None
+
+        self._rql_limit_argument = limit
+
+        if parsed is not None:
+            # parsed once by a template, which keeps its own copy
+            self.rql_expression = query
+            self.rql_parsed = deepcopy(parsed)
+        elif not query:
             self.rql_parsed = None
         else:
             self.rql_expression = query
@@ -98,8 +197,14 @@ class RQLSelect(Select):
             except RQLSyntaxError as e:
                 raise self._rql_error_cls(f"RQL Syntax error: {e.args}") from e
 
+        if probe is not None:
+            probe.mark("parse")
+
         self._rql_walk(self.rql_parsed)
 
+        if probe is not None:
+            probe.mark("walk")
+
         select_ = self
 
         for other in self._rql_joins:
@@ -108,6 +213,10 @@ class RQLSelect(Select):
         if self._rql_where_clause is not None:
             select_ = select_.filter(self._rql_where_clause)
 
+        # rows are ranked after all other filters
+        if self._rql_top_clause is not None:
+            select_ = select_.filter(self._rql_top_criterion(select_._where_criteria))
+
         if self._rql_order_by_clause is not None:
             select_ = select_.order_by(*self._rql_order_by_clause)
 
@@ -126,10 +235,22 @@ class RQLSelect(Select):
         if self._rql_distinct_clause is not None:
             select_ = select_.distinct()
 
+        if self._rql_fields_clause:
+            select_ = select_.options(load_only(*self._rql_fields_clause))
+        elif self._rql_default_deferred_columns:
+            entity = self._rql_select_entities[0]
+            select_ = select_.options(
+                *[defer(getattr(entity, name)) for name in self._rql_default_deferred_columns]
+            )
+
+        if probe is not None:
+            probe.mark("build")
+            select_._rql_record(probe)
+
         return select_
 
     def execute(  # noqa: C901
-        self, session: Session
+        self, session: Session, timeout: Optional[float] = None
     ) -> Sequence[Union[Union[Row, RowMapping], Any]]:  # noqa: C901
         """
         Executes the sql expression differently based on which clauses included:
@@ -137,26 +258,91 @@ class RQLSelect(Select):
         - In case the one clause is included only a single row is returned
         - In case a select clause is included only the requisite fields are returned
         - Otherwise scalars are returned
+
+        The statement is cancelled after `timeout` seconds, defaulting to
+        `_rql_timeout`, raising `RQLTimeoutError`.
         """
+        if timeout is None:
+            timeout = self._rql_timeout
+
+        if not self._rql_instruments:
+            return self._rql_execute(session, timeout=timeout)
+
+        probe = RQLProbe("execute")
+        result = self._rql_execute(session, probe, timeout)
+        self._rql_record(probe, rows=len(result) if isinstance(result, list) else 1)
+
+        return result
+
+    def _rql_execute(
+        self, session: Session, probe: Optional[RQLProbe] = None, timeout: Optional[float] = None
+    ) -> Sequence[Union[Union[Row, RowMapping], Any]]:
+        query = self._rql_statement(session.get_bind().dialect.name)
+
+        if len(self._rql_scalar_clauses) > 1:
+            return self._rql_run(session, query, probe, True, timeout).one()._asdict()
+
         if self._rql_scalar_clause is not None:
-            if self._rql_scalar_clause.__class__.__name__ == "count":
-                return session.scalar(select(self._rql_scalar_clause).select_from(self.subquery()))
-            return session.scalar(self.with_only_columns(self._rql_scalar_clause))
+            return self._rql_run(session, query, probe, True, timeout).scalar()
 
         if self._rql_one_clause is not None:
             try:
-                return [session.scalars(self).one()]
+                return [self._rql_run(session, query, probe, timeout=timeout).scalars().one()]
             except NoResultFound as e:
                 raise RQLSelectError("No result found for one()") from e
             except MultipleResultsFound as e:
                 raise RQLSelectError("Multiple results found for one()") from e
 
         if self._rql_values_clause is not None:
-            query = self.with_only_columns(self._rql_values_clause)
+            rows = self._rql_run(session, query, probe, timeout=timeout).all()
+            return self._rql_shape(rows, lambda row: row[0], probe)
+
+        if self._rql_select_clause:
+            # grouped results are aggregates
+            analytics = bool(self._rql_group_by_clause)
+            rows = self._rql_run(session, query, probe, analytics, timeout).all()
+            return self._rql_shape(rows, lambda row: row._asdict(), probe)
+
+        return self._rql_run(session, query, probe, timeout=timeout).scalars().all()
+
+    def _rql_statement(self, dialect: Optional[str] = None) -> Select:
+        """Build the statement executed by `execute()`"""
+        if self._rql_percentiles and dialect in self._rql_percentile_unsupported_dialects:
+            raise self._rql_error_cls(f"percentile() is not supported for dialect {dialect}")
+
+        rollup = self._rql_rollup_statement()
+        if rollup is not None:
+            return rollup
+
+        if len(self._rql_scalar_clauses) > 1:
+            labels = [c.label(name) for (name, c) in self._rql_scalar_clauses.items()]
+            if self._limit_clause is None and self._offset_clause is None:
+                return self.with_only_columns(*labels)
+
+            # aggregate over the limited rows, as count() does
+            subquery = self.subquery()
+            adapter = sql_util.ClauseAdapter(subquery)
+            return select(*[adapter.traverse(label) for label in labels]).select_from(subquery)
+
+        if self._rql_scalar_clause is not None:
+            if _is_count(self._rql_scalar_clause):
+                direct = self._rql_direct_count_statement(self._rql_scalar_clause)
+                if direct is not None:
+                    return direct
+
+                subquery = self.subquery()
+                clause = sql_util.ClauseAdapter(subquery).traverse(self._rql_scalar_clause)
+                return select(clause).select_from(subquery)
+            return self.with_only_columns(self._rql_scalar_clause)
+
+        if self._rql_one_clause is not None:
+            return self
+
+        if self._rql_values_clause is not None:
             if self._rql_distinct_clause is not None:
-                query = query.distinct()
+                return self._rql_distinct_values_statement(dialect)
 
-            return [row[0] for row in session.execute(query)]
+            return self.with_only_columns(self._rql_values_clause)
 
         if self._rql_select_clause:
             query = self.with_only_columns(*self._rql_select_clause)
@@ -164,20 +350,307 @@ class RQLSelect(Select):
             if self._rql_group_by_clause:
                 query = query.group_by(*self._rql_group_by_clause)
 
+            if self._rql_having_clause:
+                query = query.having(*self._rql_having_clause)
+
             if self._rql_distinct_clause is not None:
                 query = query.distinct()
 
-            return [row._asdict() for row in session.execute(query)]
+            if self._rql_bucket_fill:
+                return self._rql_bucket_fill_statement(query)
 
-        return session.scalars(self).all()
+            # time series are returned in order unless sorted otherwise
+            if self._rql_bucket_clause is not None and not self._order_by_clauses:
+                query = query.order_by(self._rql_bucket_clause)
+
+            return query
+
+        return self
+
+    def _rql_rollup_statement(self) -> Optional[Select]:
+        if not (self._rql_group_by_clause or self._rql_scalar_clauses):
+            return None
+
+        # joins change the rows aggregated, and time buckets and distinct
+        # aren't stored in rollups
+        if (
+            self._setup_joins
+            or self._from_obj
+            or self._rql_bucket_clause is not None
+            or self._rql_distinct_clause is not None
+        ):
+            return None
+
+        # scalar aggregates over a limited number of rows need the rows
+        if not self._rql_group_by_clause and (
+            self._limit_clause is not None or self._offset_clause is not None
+        ):
+            return None
+
+        return self._rql_rollups.rewrite(self)
+
+    def _rql_bucket_fill_statement(self, query: Select) -> Select:
+        """Build a statement returning every time bucket between the first
+        and last ones found, with a recursive CTE generating the series.
+
+        Empty buckets have a count of zero, and NULL for other aggregates.
+
+        """
+        bucket = self._rql_bucket_clause
+        unit = bucket.element.unit
+
+        grouped = query.limit(None).offset(None).order_by(None).cte("rql_buckets")
+        grouped_bucket = grouped.c[bucket.name]
+
+        first = func.min(grouped_bucket)
+        series = (
+            sql.select(first.label("bucket"))
+            .having(first.is_not(None))
+            .cte("rql_series", recursive=True)
+        )
+        following = TimeBucket(series.c.bucket, unit, step=1)
+        last = sql.select(func.max(grouped_bucket)).scalar_subquery()
+        series = series.union_all(sql.select(following).where(following <= last))
+
+        columns = [series.c.bucket.label(bucket.name)]
+        for clause in self._rql_select_clause[1:]:
+            column = grouped.c[clause.name]
+            if _is_count(clause.element):
+                column = func.coalesce(column, 0).label(clause.name)
+            columns.append(column)
+
+        return (
+            sql.select(*columns)
+            .select_from(series.outerjoin(grouped, grouped_bucket == series.c.bucket))
+            .order_by(series.c.bucket)
+            .limit(self._limit_clause)
+            .offset(self._offset_clause)
+        )
+
+    def _rql_distinct_values_statement(self, dialect: Optional[str] = None) -> Select:
+        """Build the statement returning the distinct values of the `values()`
+        attribute.
+
+        If the attribute leads an index, a recursive CTE jumps from each
+        value to the next with an index lookup, a loose index scan reading
+        one row per distinct value. Otherwise, values are grouped by.
+
+        """
+        attr = self._rql_values_clause
+
+        column = self._rql_index_leading_column(attr)
+        if (
+            column is None
+            or dialect not in self._rql_loose_index_scan_dialects
+            or self._setup_joins
+            or self._from_obj
+            or self._order_by_clauses
+        ):
+            return self.with_only_columns(attr).group_by(attr)
+
+        criteria = self._where_criteria
+        table = column.table
+
+        first = sql.select(func.min(column).label("value")).select_from(table).where(*criteria)
+        series = first.cte("rql_values", recursive=True)
+        following = (
+            sql.select(func.min(column))
+            .select_from(table)
+            .where(column > series.c.value, *criteria)
+            .scalar_subquery()
+        )
+        series = series.union_all(sql.select(following).where(series.c.value.is_not(None)))
+
+        query = sql.select(series.c.value.label(attr.key)).where(series.c.value.is_not(None))
+
+        # NULL isn't reached by min(), so it's added separately
+        if column.nullable:
+            null = sql.select(sql.null().label(attr.key)).where(
+                sql.select(column).where(column.is_(None), *criteria).exists()
+            )
+            query = sql.union_all(query, null)
+
+        return query.limit(self._limit_clause).offset(self._offset_clause)
+
+    def _rql_index_leading_column(self, attr: Any) -> Optional[Any]:
+        """Return the column for an attribute on the base table that is the
+        first column of an index or the primary key, or None.
 
-    def rql_paginate(self, session: Session) -> PaginatedResults:
+        """
+        prop = getattr(attr, "property", None)
+        if not isinstance(prop, ColumnProperty) or len(prop.columns) != 1:
+            return None
+
+        column = prop.columns[0]
+        table = inspect(self._rql_select_entities[0]).local_table
+        if getattr(column, "table", None) is not table:
+            return None
+
+        leading = [list(table.primary_key.columns)[:1]]
+        leading.extend(list(index.columns)[:1] for index in table.indexes)
+        leading.extend(
+            list(constraint.columns)[:1]
+            for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint)
+        )
+
+        if any(column is columns[0] for columns in leading if columns):
+            return column
+
+        return None
+
+    def _rql_count_statement(self) -> Select:
+        """Build the statement counting all results, used by `rql_paginate()`"""
+        # grouped results are counted by group
+        if self._rql_group_by_clause:
+            groups = self._rql_statement().limit(None).offset(None).order_by(None)
+            return sql.select(func.count()).select_from(groups.subquery())
+
+        direct = self._rql_direct_count_statement(func.count(), paginated=True)
+        if direct is not None:
+            return direct
+
+        total_query = self.limit(None).offset(None).order_by(None)
+        return sql.select(func.count()).select_from(total_query.subquery())
+
+    def _rql_direct_count_statement(
+        self, clause: Any, paginated: bool = False
+    ) -> Optional[Select]:
+        """Build a `SELECT count(*) FROM base WHERE ...` statement, without
+        wrapping this select in a subquery.
+
+        Only joins referenced by the filters are kept, and rows are counted
+        by distinct primary key if any of them can multiply rows. Returns
+        None if the count can't be rewritten, because of limit, offset,
+        distinct, group by, or joins and sources not added by RQL.
+
+        """
+        if not paginated and (self._limit_clause is not None or self._offset_clause is not None):
+            return None
+
+        if (
+            self._distinct
+            or self._rql_distinct_clause is not None
+            or self._group_by_clauses
+            or self._rql_group_by_clause
+            or self._having_criteria
+            or self._from_obj
+            or len(self._setup_joins) != len(self._rql_joins)
+        ):
+            return None
+
+        tables = set(sql_util.find_tables(clause, check_columns=True))
+        for criterion in self._where_criteria:
+            tables.update(sql_util.find_tables(criterion, check_columns=True))
+
+        # walk the joins backwards, keeping those reaching a filtered table
+        joins = []
+        targets = set()
+        for join in reversed(self._rql_joins):
+            mapper = join.property.mapper
+            if any(join is j for j in joins):
+                continue
+            if mapper.local_table in tables or mapper in targets:
+                joins.insert(0, join)
+                targets.add(join.parent)
+
+        entity = self._rql_select_entities[0]
+
+        if any(join.property.uselist for join in joins):
+            primary_key = inspect(entity).primary_key
+            if len(primary_key) != 1:
+                return None
+
+            distinct = func.count(sql.distinct(primary_key[0]))
+            if isinstance(clause, AggregateFilter):
+                distinct = AggregateFilter(distinct, clause.criterion)
+            clause = distinct
+
+        query = sql.select(clause).select_from(entity)
+
+        for join in joins:
+            query = query.outerjoin(join)
+
+        return query.where(*self._where_criteria)
+
+    def _rql_run(
+        self,
+        session: Session,
+        query: Select,
+        probe: Optional[RQLProbe] = None,
+        analytics: bool = False,
+        timeout: Optional[float] = None,
+    ):
+        bind = bind_arguments(self._rql_routing, session, analytics)
+
+        if probe is None and timeout is None:
+            return session.execute(query, bind_arguments=bind)
+
+        options = probe.execution_options() if probe is not None else {}
+
+        with self._rql_statement_timeout(session, query, timeout, bind) as query:
+            result = session.execute(query, execution_options=options, bind_arguments=bind)
+            # buffer the rows so fetching is timed separately from shaping,
+            # and so a timeout covers fetching them
+            result = result.freeze()()
+
+        if probe is not None:
+            probe.mark("fetch")
+
+        return result
+
+    @contextmanager
+    def _rql_statement_timeout(self, session: Session, query: Select, timeout, bind):
+        if timeout is None:
+            yield query
+            return
+
+        try:
+            with statement_timeout(session, query, timeout, bind) as query:
+                yield query
+        except DBAPIError as e:
+            if is_timeout_error(session.get_bind().dialect.name, e):
+                raise RQLTimeoutError(f"Query timed out after {timeout} seconds") from e
+            raise
+
+    def _rql_shape(
+        self, rows: Sequence[Row], shape: Callable[[Row], Any], probe=None
+    ) -> List[Any]:
+        result = [shape(row) for row in rows]
+
+        if probe is not None:
+            probe.mark("shape")
+
+        return result
+
+    def _rql_record(self, probe: RQLProbe, rows: Optional[int] = None) -> None:
+        event = probe.event(self, rows=rows)
+
+        for instrument in self._rql_instruments:
+            instrument.record(event)
+
+    def rql_paginate(
+        self,
+        session: Session,
+        timeout: Optional[float] = None,
+        count_timeout: Optional[float] = None,
+    ) -> PaginatedResults:
         """
         Convenience function for pagination. Returns:
         - the page given to the rql query
         - the count by setting the limit, offset and order by to None
         - next and last page rql queries if more records are available for pagination
+
+        The page query is cancelled after `timeout` seconds, as in
+        `execute()`. The count query has a separate `count_timeout`,
+        defaulting to `_rql_count_timeout`, and if it runs out the total is
+        None and the next page is inferred from the page length.
         """
+        if timeout is None:
+            timeout = self._rql_timeout
+
+        if count_timeout is None:
+            count_timeout = self._rql_count_timeout
 
         limit = self._rql_select_limit
         offset = self._rql_select_offset or 0
@@ -185,19 +658,124 @@ class RQLSelect(Select):
         if limit is None:
             raise RQLSelectError("Pagination requires a limit value")
 
-        page = self.execute(session)
+        probe = RQLProbe("rql_paginate") if self._rql_instruments else None
+
+        cache = self._rql_page_cache
+        scope = None
+        # pending changes would be overwritten by cached pages
+        if cache is not None and not (session.new or session.dirty or session.deleted):
+            scope = self._rql_page_scope(session.get_bind().dialect.name)
+
+        if scope is not None:
+            cached = cache.get((scope, limit, offset))
+            if cached is not None:
+                page = self._rql_cached_page(session, cached.page)
+                if probe is not None:
+                    self._rql_record(probe, rows=len(page))
+                return self._rql_paginated(page, cached.total)
+
+            # fetch the following pages in the same query
+            rows = self.limit(limit * cache.pages)._rql_execute(session, probe, timeout)
+            page = rows[:limit]
+        else:
+            page = self._rql_execute(session, probe, timeout)
 
-        total_query = self.limit(None).offset(None).order_by(None)
-        total_query_count = sql.select(func.count()).select_from(total_query.subquery())
-        total = session.scalar(total_query_count)
+        if count_timeout is None:
+            statement = self._rql_count_statement()
+            total = self._rql_run(session, statement, probe, True, timeout).scalar()
+        else:
+            total = self._rql_count_with_timeout(session, probe, count_timeout)
+
+        if scope is not None:
+            self._rql_prefetched(cache, scope, rows, total)
+
+        if probe is not None:
+            self._rql_record(probe, rows=len(page))
+
+        return self._rql_paginated(page, total)
+
+    def _rql_page_scope(self, dialect: str) -> Optional[Any]:
+        # scalar results aren't pages
+        if self._rql_scalar_clauses or self._rql_one_clause is not None:
+            return None
+
+        # the statement without limit and offset, including any criteria
+        # that aren't part of the expression
+        cache_key = self.limit(None).offset(None)._rql_statement(dialect)._generate_cache_key()
+        if cache_key is None:
+            return None
+
+        return (cache_key.key, freeze([p.effective_value for p in cache_key.bindparams]))
+
+    def _rql_prefetched(
+        self, cache: RQLPageCache, scope: Any, rows: Sequence[Any], total: Optional[int]
+    ) -> None:
+        limit = self._rql_select_limit
+        offset = self._rql_select_offset or 0
+
+        models = {self._rql_select_entities[0]}
+        models.update(join.property.mapper.class_ for join in self._rql_joins)
+
+        entities = not self._rql_select_clause and self._rql_values_clause is None
+
+        for n in range(1, cache.pages):
+            page = rows[n * limit : (n + 1) * limit]
+            if not page:
+                break
+
+            # entities are bound to this session, so only their values are kept
+            if entities:
+                page = [snapshot(obj) for obj in page]
+
+            cache.put((scope, limit, offset + n * limit), page, total, frozenset(models))
+
+    def _rql_cached_page(self, session: Session, page: Sequence[Any]) -> List[Any]:
+        if self._rql_select_clause or self._rql_values_clause is not None:
+            return list(page)
+
+        entity = self._rql_select_entities[0]
+        return [restore(session, entity, values) for values in page]
+
+    def _rql_count_with_timeout(
+        self, session: Session, probe: Optional[RQLProbe], timeout: float
+    ) -> Optional[int]:
+        statement = self._rql_count_statement()
 
-        if offset + limit < total:
+        # a cancelled statement aborts the whole transaction on PostgreSQL,
+        # so the count runs in a savepoint there
+        if session.get_bind().dialect.name != "postgresql":
+            try:
+                return self._rql_run(session, statement, probe, True, timeout).scalar()
+            except RQLTimeoutError:
+                return None
+
+        savepoint = session.begin_nested()
+        try:
+            total = self._rql_run(session, statement, probe, True, timeout).scalar()
+        except RQLTimeoutError:
+            savepoint.rollback()
+            return None
+
+        savepoint.commit()
+        return total
+
+    def _rql_paginated(self, page: Any, total: Optional[int]) -> PaginatedResults:
+        limit = self._rql_select_limit
+        offset = self._rql_select_offset or 0
+
+        # without a total, a full page means there may be more
+        if total is None:
+            more = len(page) >= limit
+        else:
+            more = offset + limit < total
+
+        if more:
             expr = self.rql_expr_replace({"name": "limit", "args": [limit, offset + limit]})
             next_page = expr
         else:
             next_page = None
 
-        if offset > 0 and total:
+        if offset > 0 and total != 0:
             expr = self.rql_expr_replace({"name": "limit", "args": [limit, offset - limit]})
             previous_page = expr
         else:
@@ -207,6 +785,561 @@ class RQLSelect(Select):
             page=page, total=total, previous_page=previous_page, next_page=next_page
         )
 
+    def rql_export(
+        self,
+        session: Session,
+        format: str = "ndjson",
+        chunk_size: int = 1000,
+        timeout: Optional[float] = None,
+    ) -> Iterator[bytes]:
+        """Stream the results as NDJSON or CSV, in UTF-8 encoded chunks of
+        `chunk_size` rows fetched from a server-side cursor.
+
+        Entities are exported as their column attributes, and `select()` and
+        `values()` results as the selected fields. The statement runs when
+        the first chunk is requested, and the session must be kept open
+        until the last one. It's cancelled after `timeout` seconds, as in
+        `execute()`.
+        """
+        query, writer_ = self._rql_export_statement(session.get_bind().dialect.name, format)
+        query = query.execution_options(stream_results=True, yield_per=chunk_size)
+
+        if timeout is None:
+            timeout = self._rql_timeout
+
+        return self._rql_export_chunks(session, query, writer_, timeout)
+
+    def _rql_export_chunks(
+        self, session: Session, query: Select, writer_, timeout: Optional[float]
+    ) -> Iterator[bytes]:
+        header = writer_.header()
+        if header:
+            yield header.encode()
+
+        probe = RQLProbe("rql_export") if self._rql_instruments else None
+        options = probe.execution_options() if probe is not None else {}
+        bind = bind_arguments(self._rql_routing, session, bool(self._rql_group_by_clause))
+
+        rows = 0
+        with self._rql_statement_timeout(session, query, timeout, bind) as query:
+            result = session.execute(query, execution_options=options, bind_arguments=bind)
+
+            for partition in result.partitions():
+                rows += len(partition)
+                yield writer_.write(partition).encode()
+
+        if probe is not None:
+            probe.mark("fetch")
+            self._rql_record(probe, rows=rows)
+
+    def rql_export_async(
+        self,
+        session: AsyncSession,
+        format: str = "ndjson",
+        chunk_size: int = 1000,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[bytes]:
+        """Same as `rql_export()`, as an async iterator over an
+        `AsyncSession` stream.
+        """
+        dialect = session.sync_session.get_bind().dialect.name
+        query, writer_ = self._rql_export_statement(dialect, format)
+        query = query.execution_options(yield_per=chunk_size)
+
+        if timeout is None:
+            timeout = self._rql_timeout
+
+        return self._rql_export_stream(session, query, writer_, timeout)
+
+    async def _rql_export_stream(
+        self, session: AsyncSession, query: Select, writer_, timeout: Optional[float]
+    ) -> AsyncIterator[bytes]:
+        header = writer_.header()
+        if header:
+            yield header.encode()
+
+        probe = RQLProbe("rql_export") if self._rql_instruments else None
+        options = probe.execution_options() if probe is not None else {}
+        bind = bind_arguments(
+            self._rql_routing, session.sync_session, bool(self._rql_group_by_clause)
+        )
+        if bind is not None:
+            # the statement runs on the sync session, which needs sync engines
+            bind = {"bind": getattr(bind["bind"], "sync_engine", bind["bind"])}
+
+        rows = 0
+        async with self._rql_statement_timeout_async(session, query, timeout, bind) as query:
+            result = await session.stream(query, execution_options=options, bind_arguments=bind)
+
+            async for partition in result.partitions():
+                rows += len(partition)
+                yield writer_.write(partition).encode()
+
+        if probe is not None:
+            probe.mark("fetch")
+            self._rql_record(probe, rows=rows)
+
+    @asynccontextmanager
+    async def _rql_statement_timeout_async(
+        self, session: AsyncSession, query: Select, timeout, bind
+    ):
+        # the timeout is set and cleared on the sync session, as execute() does
+        context = self._rql_statement_timeout(session.sync_session, query, timeout, bind)
+        query = await session.run_sync(lambda _: context.__enter__())
+
+        try:
+            yield query
+        except BaseException as e:
+            handled = await session.run_sync(
+                lambda _: context.__exit__(type(e), e, e.__traceback__)
+            )
+            if not handled:
+                raise
+        else:
+            await session.run_sync(lambda _: context.__exit__(None, None, None))
+
+    def _rql_export_statement(self, dialect: str, format: str) -> Tuple[Select, Any]:
+        if format not in EXPORT_FORMATS:
+            raise self._rql_error_cls(f"Invalid export format: {format}")
+
+        if self._rql_scalar_clauses or self._rql_scalar_clause is not None:
+            raise self._rql_error_cls("Aggregates can't be exported")
+
+        query = self._rql_statement(dialect)
+
+        if self._rql_values_clause is not None:
+            (column,) = query.selected_columns
+            return query, writer(format, [(self._rql_values_clause.key, column.type)], True)
+
+        if self._rql_select_clause:
+            columns = [(column.key, column.type) for column in query.selected_columns]
+            return query, writer(format, columns)
+
+        # entities are read as plain columns, skipping the ORM
+        props = self._rql_export_props()
+        query = query.with_only_columns(
+            *[prop.class_attribute for prop in props], maintain_column_froms=True
+        )
+
+        return query, writer(format, [(prop.key, prop.columns[0].type) for prop in props])
+
+    def _rql_export_props(self) -> List[ColumnProperty]:
+        # the columns entities would load, with fields() or deferred columns
+        mapper = inspect(self._rql_select_entities[0])
+
+        if self._rql_fields_clause:
+            keys = {attr.key for attr in self._rql_fields_clause}
+            keys.update(mapper.get_property_by_column(c).key for c in mapper.primary_key)
+            return [prop for prop in mapper.column_attrs if prop.key in keys]
+
+        deferred = set(self._rql_default_deferred_columns)
+        return [prop for prop in mapper.column_attrs if prop.key not in deferred]
+
+    def rql_sync(self, session: Session, token: Optional[str] = None) -> SyncResults:
+        """Return the results changed since `token` was issued, in the order
+        of the monotonic `_rql_sync_column`, such as an `updated_at`
+        timestamp or a version number, with ties broken by primary key.
+
+        Returns all results if no token is given. The token returned points
+        to the last change, and is the same one given if there were none. If
+        there are more changes than the limit, `has_more` is set and the
+        remaining changes are returned by the next call.
+
+        """
+        if self._rql_sync_column is None:
+            raise self._rql_error_cls("Sync requires a _rql_sync_column")
+
+        if (
+            self._rql_scalar_clauses
+            or self._rql_group_by_clause
+            or self._rql_values_clause is not None
+        ):
+            raise self._rql_error_cls("Sync doesn't support aggregates or values")
+
+        entity = self._rql_select_entities[0]
+        primary_key = inspect(entity).primary_key
+        if len(primary_key) != 1:
+            raise self._rql_error_cls("Sync requires a single primary key column")
+
+        column = self._rql_attr(self._rql_sync_column)
+        key = inspect(entity).get_property_by_column(primary_key[0]).key
+        pk = getattr(entity, key)
+
+        # rows without a sync value are sorted first, as the oldest changes
+        nullable = getattr(_column(column), "nullable", True)
+        order = [sql.case((column.is_(None), 0), else_=1)] if nullable else []
+
+        query = self.order_by(None).order_by(*order, column, pk).offset(None)
+
+        if token is not None:
+            value, last_pk = self._rql_sync_decode(token, column)
+            if value is None:
+                after = sql.or_(column.is_not(None), pk > last_pk)
+            else:
+                after = sql.or_(column > value, sql.and_(column == value, pk > last_pk))
+            query = query.where(after)
+
+        limit = self._rql_select_limit
+        if limit is not None:
+            # fetch one more row to know if there's more changes
+            query = query.limit(limit + 1)
+
+        changes = query._rql_execute(session)
+
+        has_more = limit is not None and len(changes) > limit
+        if has_more:
+            changes = changes[:limit]
+
+        if changes:
+            last = changes[-1]
+            try:
+                if isinstance(last, dict):
+                    value, last_pk = last[column.key], last[key]
+                else:
+                    value, last_pk = getattr(last, column.key), getattr(last, key)
+            except (KeyError, AttributeError) as e:
+                raise self._rql_error_cls(
+                    "Sync results must include the sync column and primary key"
+                ) from e
+
+            try:
+                token = _encode_sync_token(value, last_pk)
+            except TypeError as e:
+                raise self._rql_error_cls(f"Unsupported sync token value: {e}") from e
+
+        return SyncResults(changes=changes, token=token, has_more=has_more)
+
+    def _rql_sync_decode(self, token: str, column: Any) -> Tuple[Any, Any]:
+        entity = self._rql_select_entities[0]
+        (pk,) = inspect(entity).primary_key
+
+        try:
+            value, last_pk = json.loads(base64.urlsafe_b64decode(token.encode()))
+            return _decode_sync_value(value, column), _decode_sync_value(last_pk, pk)
+        except (ValueError, TypeError, InvalidOperation) as e:
+            raise self._rql_error_cls(f"Invalid sync token: {token}") from e
+
+    def rql_batch(self, session: Session, queries: Sequence[str]) -> List[Any]:
+        """Execute several RQL queries against this select, combining them
+        into as few statements as possible.
+
+        Scalar aggregates without limits or joins are computed together in a
+        single statement, each restricted to its own filter, and plain entity
+        queries without joins are combined with `UNION ALL`. Anything else is
+        executed separately. Results are returned in the same order as the
+        queries, as `execute()` would return them.
+
+        """
+        selects = [self._rql_copy().rql(query) for query in queries]
+        results: List[Any] = [None] * len(selects)
+
+        scalars = {}
+        rows = {}
+
+        for index, select_ in enumerate(selects):
+            if select_._rql_batch_scalar():
+                scalars[index] = select_
+            elif select_._rql_batch_rows():
+                rows[index] = select_
+            else:
+                results[index] = select_.execute(session)
+
+        if scalars:
+            aggregates = [
+                aggregate_filter(s._rql_scalar_clause, s._rql_where_clause).label(f"_rql_{i}")
+                for (i, s) in scalars.items()
+            ]
+            query = (
+                sql.select(*aggregates)
+                .select_from(self._rql_select_entities[0])
+                .where(*self._where_criteria)
+            )
+            row = self._rql_run(session, query, analytics=True).one()
+            for index, value in zip(scalars, row):
+                results[index] = value
+
+        if len(rows) == 1:
+            ((index, select_),) = rows.items()
+            results[index] = select_.execute(session)
+
+        elif rows:
+            for index, page in self._rql_batch_union(session, rows).items():
+                results[index] = page
+
+        return results
+
+    def _rql_copy(self) -> "RQLSelect":
+        select_ = self._generate()
+        select_._rql_reset()
+        return select_
+
+    def _rql_batch_scalar(self) -> bool:
+        return (
+            len(self._rql_scalar_clauses) == 1
+            and not self._rql_joins
+            and self._limit_clause is None
+            and self._offset_clause is None
+            and self._rql_distinct_clause is None
+            # top() isn't part of the filter, and percentiles are checked
+            # against the dialect by execute()
+            and self._rql_top_clause is None
+            and not self._rql_percentiles
+        )
+
+    def _rql_batch_rows(self) -> bool:
+        return (
+            self._rql_scalar_clause is None
+            and self._rql_one_clause is None
+            and self._rql_values_clause is None
+            and not self._rql_select_clause
+            and self._rql_distinct_clause is None
+            and not self._rql_joins
+        )
+
+    def _rql_batch_union(self, session: Session, selects: Dict[int, "RQLSelect"]):
+        entity = self._rql_select_entities[0]
+        columns = list(inspect(entity).columns)
+
+        members = []
+        for index, select_ in selects.items():
+            # number the rows of each query so the order within it is kept
+            position = func.row_number().over(order_by=select_._order_by_clauses)
+            member = select_.with_only_columns(
+                *columns,
+                sql.literal(index).label("_rql_batch_index"),
+                position.label("_rql_batch_position"),
+            ).subquery()
+            members.append(sql.select(*member.c))
+
+        union = sql.union_all(*members).subquery()
+        alias = aliased(entity, union)
+
+        query = sql.select(alias, union.c._rql_batch_index).order_by(
+            union.c._rql_batch_index, union.c._rql_batch_position
+        )
+
+        results: Dict[int, List[Any]] = {index: [] for index in selects}
+        for obj, index in self._rql_run(session, query):
+            results[index].append(obj)
+
+        return results
+
+    def explain(self, session: Session, analyze: bool = False) -> RQLExplanation:
+        """Run EXPLAIN on the statements used by `execute()` and
+        `rql_paginate()` and return a summary of both plans.
+
+        Sequential scans on tables with more than `_rql_explain_seq_scan_rows`
+        rows, or with no row estimate, are flagged in the plan warnings. With
+        `analyze=True` the statements are actually executed, where the dialect
+        supports it.
+
+        """
+        try:
+            return RQLExplanation(
+                statement=explain(
+                    session,
+                    self._rql_statement(session.get_bind().dialect.name),
+                    analyze=analyze,
+                    seq_scan_rows=self._rql_explain_seq_scan_rows,
+                ),
+                count=explain(
+                    session,
+                    self._rql_count_statement(),
+                    analyze=analyze,
+                    seq_scan_rows=self._rql_explain_seq_scan_rows,
+                ),
+            )
+        except NotImplementedError as e:
+            raise self._rql_error_cls(str(e)) from e
+
+    def rql_facets(
+        self,
+        session: Session,
+        attrs: Optional[Sequence[Any]] = None,
+        top: Optional[int] = None,
+    ) -> Dict[str, Dict[Any, int]]:
+        """Count the results by value of each attribute, in one statement.
+
+        Attributes are RQL attribute names, defaulting to those given to the
+        `facets()` operator. Returns a dict mapping each attribute to a dict
+        of counts by value, ordered by decreasing count and limited to the
+        `top` most frequent values, if given.
+
+        Uses `GROUPING SETS` where supported, and `UNION ALL` otherwise.
+
+        """
+        if attrs is None:
+            attrs = self._rql_facets_clause
+            top = top if top is not None else self._rql_facets_top
+        else:
+            attrs = [self._rql_attr(attr) for attr in attrs]
+
+        if not attrs:
+            raise self._rql_error_cls("Facets require at least one attribute")
+
+        base = self.limit(None).offset(None).order_by(None)
+
+        if session.get_bind().dialect.name in self._rql_grouping_sets_dialects:
+            rows = self._rql_facets_grouping_sets(session, base, attrs, top)
+        else:
+            rows = self._rql_facets_union(session, base, attrs, top)
+
+        facets: Dict[str, Dict[Any, int]] = {attr.key: {} for attr in attrs}
+        keys = list(facets)
+        for index, value, count in sorted(rows, key=lambda row: (row[0], -row[2])):
+            facets[keys[index]][value] = count
+
+        return facets
+
+    def _rql_facets_grouping_sets(self, session, base, attrs, top):
+        count = func.count().label("_rql_count")
+        groupings = [func.grouping(attr) for attr in attrs]
+
+        query = base.with_only_columns(
+            *attrs, *groupings, count, maintain_column_froms=True
+        ).group_by(func.grouping_sets(*[sql.tuple_(attr) for attr in attrs]))
+
+        if top is not None:
+            rank = func.row_number().over(partition_by=groupings, order_by=count.desc())
+            subquery = query.add_columns(rank.label("_rql_rank")).subquery()
+            query = sql.select(subquery).where(subquery.c._rql_rank <= top)
+
+        rows = []
+        for row in self._rql_run(session, query, analytics=True):
+            values, flags = row[: len(attrs)], row[len(attrs) : 2 * len(attrs)]
+            # grouping() is 0 only for the attribute the row is grouped by
+            index = list(flags).index(0)
+            rows.append((index, values[index], row[2 * len(attrs)]))
+
+        return rows
+
+    def _rql_facets_union(self, session, base, attrs, top):
+        members = []
+        for index, attr in enumerate(attrs):
+            count = func.count().label("_rql_count")
+            member = base.with_only_columns(
+                sql.literal(index).label("_rql_facet"),
+                attr.label("_rql_value"),
+                count,
+                maintain_column_froms=True,
+            ).group_by(attr)
+
+            if top is not None:
+                member = member.order_by(count.desc()).limit(top)
+
+            # members are wrapped so each can have its own order and limit
+            members.append(sql.select(member.subquery()))
+
+        rows = self._rql_run(session, sql.union_all(*members), analytics=True)
+
+        return [tuple(row) for row in rows]
+
+    def rql_update(
+        self,
+        session: Session,
+        values: Dict[str, Any],
+        synchronize_session: Optional[Any] = None,
+    ) -> int:
+        """Update all rows matching the filters with a single `UPDATE`
+        statement, and return the number of rows matched.
+
+        `values` maps attribute names to new values. Filters on
+        relationships are applied through a correlated `EXISTS`. The
+        session is synchronized with `synchronize_session`, defaulting to
+        `_rql_synchronize_session`.
+
+        """
+        entity = self._rql_select_entities[0]
+
+        for name in values:
+            prop = inspect(entity).attrs.get(name)
+            if not isinstance(prop, ColumnProperty):
+                raise self._rql_error_cls(f"Invalid update attribute: {name}")
+
+        statement = sql.update(entity).values(**values)
+
+        return self._rql_dml(session, "rql_update", statement, synchronize_session)
+
+    def rql_delete(self, session: Session, synchronize_session: Optional[Any] = None) -> int:
+        """Delete all rows matching the filters with a single `DELETE`
+        statement, and return the number of rows matched.
+
+        Filters on relationships are applied as in `rql_update()`.
+
+        """
+        statement = sql.delete(self._rql_select_entities[0])
+
+        return self._rql_dml(session, "rql_delete", statement, synchronize_session)
+
+    def _rql_dml(self, session: Session, operation: str, statement, synchronize_session) -> int:
+        if self._rql_dml_limited() or self._offset_clause is not None:
+            raise self._rql_error_cls(f"{operation}() doesn't support limit and offset")
+
+        if (
+            self._rql_select_clause
+            or self._rql_values_clause is not None
+            or self._rql_scalar_clauses
+            or self._rql_group_by_clause
+            or self._rql_distinct_clause is not None
+        ):
+            raise self._rql_error_cls(f"{operation}() only supports filters")
+
+        if self._setup_joins or self._from_obj:
+            statement = statement.where(self._rql_dml_exists())
+        elif self._where_criteria:
+            statement = statement.where(*self._where_criteria)
+
+        if synchronize_session is None:
+            synchronize_session = self._rql_synchronize_session
+
+        options = {"synchronize_session": synchronize_session}
+
+        probe = RQLProbe(operation) if self._rql_instruments else None
+        if probe is not None:
+            options.update(probe.execution_options())
+
+        rowcount = session.execute(statement, execution_options=options).rowcount
+
+        if probe is not None:
+            self._rql_record(probe, rows=rowcount)
+
+        return rowcount
+
+    def _rql_dml_limited(self) -> bool:
+        # limited by the expression, by rql() or on the select itself, as
+        # _rql_default_limit only applies to reads
+        if self._rql_limit_clause is not None or self._rql_limit_argument is not None:
+            return True
+
+        return self._limit_clause is not None and self._rql_select_limit != self._rql_default_limit
+
+    def _rql_dml_exists(self) -> elements.ColumnElement[bool]:
+        # UPDATE and DELETE can't join, so the joined select runs in a
+        # correlated EXISTS, against an alias of the target table to keep it
+        # from correlating with the outer statement
+        entity = self._rql_select_entities[0]
+        alias = aliased(entity)
+        alias_table = inspect(alias).selectable
+        adapter = sql_util.ClauseAdapter(alias_table)
+
+        query = sql.select(sql.literal(1)).select_from(alias)
+
+        joined = []
+        for join in self._rql_joins:
+            if any(join is j for j in joined):
+                continue
+            joined.append(join)
+            query = query.outerjoin(
+                getattr(alias, join.key) if join.parent.class_ is entity else join
+            )
+
+        for column in inspect(entity).primary_key:
+            query = query.where(adapter.traverse(column) == column)
+
+        query = query.where(*[adapter.traverse(criterion) for criterion in self._where_criteria])
+
+        return query.exists()
+
     def rql_expr_replace(self, replacement: Dict[str, Any]) -> str:
         """Replace any nodes matching the replacement name
 
@@ -242,6 +1375,23 @@ class RQLSelect(Select):
         if node:
             self._rql_where_clause = self._rql_apply(node)
 
+        if self._rql_aggregate_labels and self._rql_where_clause is not None:
+            self._rql_split_having()
+
+    def _rql_split_having(self) -> None:
+        # filters referencing aggregate labels can only be applied after
+        # grouping, so they are moved from WHERE to HAVING
+        labels = list(self._rql_aggregate_labels.values())
+
+        where = []
+        for clause in _and_clauses(self._rql_where_clause):
+            if any(element is label for element in visitors.iterate(clause) for label in labels):
+                self._rql_having_clause.append(clause)
+            else:
+                where.append(clause)
+
+        self._rql_where_clause = sql.and_(*where) if where else None
+
     def _rql_apply(self, node: Dict[str, Any]) -> Any:
         if isinstance(node, dict):
             name = node["name"]
@@ -263,6 +1413,10 @@ class RQLSelect(Select):
         return node
 
     def _rql_attr(self, attr, model=None):
+        # aggregate labels can be used to filter and sort grouped results
+        if model is None and isinstance(attr, str) and attr in self._rql_aggregate_labels:
+            return self._rql_aggregate_labels[attr]
+
         model = model or self._rql_select_entities[0]
 
         # if it's just a plain attribute name, return it
@@ -296,8 +1450,17 @@ class RQLSelect(Select):
             # remaining entries, set the field name as key to be used in RQL
             # select clauses, and return the result immediately.
             if isinstance(getattr(column, "type", None), JSON):
+                # registered paths are replaced by the mapped column, or by
+                # the exact expression used by their index
+                mapping = self._rql_json_paths.get(model, attr)
+                if mapping is not None:
+                    if mapping.column is not None:
+                        return self._rql_attr(mapping.column, model)
+                    return mapping.expression()
+
                 json_path = reduce(operator.getitem, attr[1:], column)  # noqa: E203
                 json_path.key = attr[-1]
+                json_path._rql_json_path = (column, attr[1:])
                 return json_path
 
             # if it's neither, something is wrong.
@@ -361,16 +1524,46 @@ class RQLSelect(Select):
 
         return attr, value
 
+    def _rql_json_containment(self, attr: Any, values: List[Any]) -> Optional[ColumnElement[bool]]:
+        # on JSONB, comparing a path for equality can be done by containment,
+        # as in `misc @> '{"eye_color": "blue"}'`, which can use a GIN index
+        column, path = getattr(attr, "_rql_json_path", (None, None))
+
+        if (
+            not self._rql_jsonb_containment
+            or column is None
+            or not isinstance(column.type, JSONB)
+            or not values
+            or not all(isinstance(key, str) for key in path)
+            or not all(isinstance(v, (str, bool, int, float)) for v in values)
+        ):
+            return None
+
+        documents = []
+        for document in values:
+            for key in reversed(path):
+                document = {key: document}
+            documents.append(column.contains(document))
+
+        return reduce(sql.or_, documents)
+
     def _rql_compare(self, args: ArgsType, op: BinaryOperator) -> elements.BinaryExpression:
         attr, value = args
         attr = self._rql_attr(attr=attr)
         value = self._rql_value(value)
 
+        if op is operator.eq:
+            containment = self._rql_json_containment(attr, [value])
+            if containment is not None:
+                return containment
+
         attr, value = self._rql_set_attr_type_for_json_value(attr, value)
 
         return op(attr, value)
 
     def _rql_and(self, args: ArgsType) -> Optional[elements.BooleanClauseList]:
+        # apply aggregate() first, so other nodes can reference its labels
+        args = sorted(args, key=lambda node: not _is_node(node, "aggregate"))
         args = [self._rql_apply(node) for node in args]
         if args := [a for a in args if a is not None]:
             return reduce(sql.and_, args)
@@ -380,10 +1573,22 @@ class RQLSelect(Select):
         if args := [a for a in args if a is not None]:
             return reduce(sql.or_, args)
 
+    def _rql_in_values(self, attr: Any, values: Sequence[Any]) -> List[Any]:
+        # registered JSON paths are compared with their declared type
+        if isinstance(attr, JSONPathElement):
+            return [attr.python_type(v) for v in values]
+
+        return [str(v) for v in values]
+
     def _rql_in(self, args: ArgsType) -> elements.BinaryExpression:
         attr, value = args
         attr = self._rql_attr(attr=attr)
-        value = self._rql_value([str(v) for v in value])
+
+        containment = self._rql_json_containment(attr, list(value))
+        if containment is not None:
+            return containment
+
+        value = self._rql_value(self._rql_in_values(attr, value))
 
         attr, value = self._rql_set_attr_type_for_json_value(attr, value)
 
@@ -392,7 +1597,7 @@ class RQLSelect(Select):
     def _rql_out(self, args: ArgsType) -> elements.BinaryExpression:
         attr, value = args
         attr = self._rql_attr(attr=attr)
-        value = self._rql_value([str(v) for v in value])
+        value = self._rql_value(self._rql_in_values(attr, value))
 
         attr, value = self._rql_set_attr_type_for_json_value(attr, value)
 
@@ -421,6 +1626,98 @@ class RQLSelect(Select):
 
         self._rql_order_by_clause = attrs
 
+    def _rql_top(self, args: ArgsType) -> None:
+        if (
+            len(args) < 3
+            or isinstance(args[0], bool)
+            or not isinstance(args[0], int)
+            or args[0] < 1
+            or not all(isinstance(arg, str) for arg in args[1:])
+        ):
+            raise self._rql_error_cls(
+                "Invalid top arguments, expected top(n,group_attr,sort_attr,...)"
+            )
+
+        (n, group, *sort) = args
+
+        order = []
+        for name in sort:
+            attr = _column(self._rql_attr(name.lstrip("+-")))
+            order.append(attr.desc() if name.startswith("-") else attr)
+
+        self._rql_top_clause = (n, _column(self._rql_attr(group)), order)
+
+    def _rql_top_criterion(self, criteria: Sequence[Any]) -> TopRows:
+        """Build the criterion matching the first `n` rows of each group,
+        ranked by the sort attributes and the primary key.
+
+        """
+        (n, group, order) = self._rql_top_clause
+
+        table = inspect(self._rql_select_entities[0]).local_table
+        keys = list(table.primary_key)
+        key = keys[0] if len(keys) == 1 else sql.tuple_(*keys)
+
+        rank = func.row_number().over(partition_by=group, order_by=[*order, *keys])
+        ranked = sql.select(*keys, rank.label("rql_rank")).select_from(table)
+
+        if self._rql_joins:
+            # joins may repeat rows, so they're only used to filter
+            matching = sql.select(*keys).select_from(table)
+            for join in self._rql_joins:
+                matching = matching.outerjoin(join)
+            ranked = ranked.where(key.in_(matching.where(*criteria).correlate(None)))
+        else:
+            ranked = ranked.where(*criteria)
+
+        ranked = ranked.subquery("rql_ranked")
+        window = key.in_(
+            sql.select(*[ranked.c[k.key] for k in keys]).where(ranked.c.rql_rank <= n)
+        )
+
+        if self._rql_joins:
+            return TopRows(window)
+
+        return TopRows(window, key.in_(self._rql_top_lateral(table, keys, criteria)))
+
+    def _rql_top_lateral(self, table: Any, keys: List[Any], criteria: Sequence[Any]) -> Any:
+        # for each distinct group, the top rows are read from an alias of
+        # the table, which can use an index on the group and sort columns
+        (n, group, order) = self._rql_top_clause
+
+        alias = table.alias("rql_top")
+        adapter = sql_util.ClauseAdapter(alias)
+        alias_group = adapter.traverse(group)
+        alias_keys = [alias.c[k.key] for k in keys]
+        alias_criteria = [adapter.traverse(c) for c in criteria]
+        alias_order = [*[adapter.traverse(o) for o in order], *alias_keys]
+
+        groups = (
+            sql.select(group.label("rql_group"))
+            .select_from(table)
+            .where(*criteria)
+            .distinct()
+            .subquery("rql_groups")
+        )
+        top = (
+            sql.select(*alias_keys)
+            .where(alias_group == groups.c.rql_group, *alias_criteria)
+            .order_by(*alias_order)
+            .limit(n)
+            .lateral("rql_top_rows")
+        )
+        grouped = sql.select(*top.c).select_from(groups.join(top, sql.true()))
+
+        # rows with a NULL group are ranked as a group of their own
+        nulls = (
+            sql.select(*alias_keys)
+            .where(alias_group.is_(None), *alias_criteria)
+            .order_by(*alias_order)
+            .limit(n)
+        )
+
+        return sql.union_all(grouped, nulls)
+
     def _rql_contains(self, args: ArgsType) -> ColumnElement[bool]:
         attr, value = args
         attr = self._rql_attr(attr=attr)
@@ -440,6 +1737,27 @@ class RQLSelect(Select):
 
         self._rql_select_clause = attrs
 
+    def _rql_fields(self, args: ArgsType) -> None:
+        entity = self._rql_select_entities[0]
+        attrs = []
+
+        for name in args:
+            attr = self._rql_attr(name)
+            if not isinstance(getattr(attr, "property", None), ColumnProperty) or (
+                attr.class_ is not entity
+            ):
+                raise self._rql_error_cls(f"Invalid fields attribute: {name}")
+
+            attrs.append(attr)
+
+        self._rql_fields_clause = attrs
+
+    def _rql_facets(self, args: ArgsType) -> None:
+        # an integer argument is the number of values to count for each facet
+        tops = [arg for arg in args if isinstance(arg, int)]
+        self._rql_facets_top = tops[0] if tops else None
+        self._rql_facets_clause = [self._rql_attr(arg) for arg in args if not isinstance(arg, int)]
+
     def _rql_values(self, args: ArgsType) -> None:
         (attr,) = args
         attr = self._rql_attr(attr)
@@ -450,30 +1768,100 @@ class RQLSelect(Select):
         self._rql_distinct_clause = True
 
     def _rql_sum(self, args: ArgsType) -> None:
-        (attr,) = args
-        attr = self._rql_attr(attr=attr)
-        self._rql_scalar_clause = func.sum(attr)
+        attr, criterion = self._rql_scalar_args(args)
+        self._rql_add_scalar("sum", func.sum(attr), attr, criterion)
 
     def _rql_mean(self, args: ArgsType) -> None:
-        (attr,) = args
-        attr = self._rql_attr(attr=attr)
+        attr, criterion = self._rql_scalar_args(args)
 
-        self._rql_scalar_clause = func.avg(attr)
+        self._rql_add_scalar("mean", func.avg(attr), attr, criterion)
 
     def _rql_max(self, args: ArgsType) -> None:
-        (attr,) = args
-        attr = self._rql_attr(attr=attr)
+        attr, criterion = self._rql_scalar_args(args)
 
-        self._rql_scalar_clause = func.max(attr)
+        self._rql_add_scalar("max", func.max(attr), attr, criterion)
 
     def _rql_min(self, args: ArgsType) -> None:
-        (attr,) = args
-        attr = self._rql_attr(attr=attr)
+        attr, criterion = self._rql_scalar_args(args)
+
+        self._rql_add_scalar("min", func.min(attr), attr, criterion)
+
+    def _rql_count(self, args: ArgsType) -> None:
+        criterion = self._rql_scalar_filter(args)
+
+        self._rql_add_scalar("count", func.count(), None, criterion)
+
+    def _rql_approx_count_distinct(self, args: ArgsType) -> None:
+        attr, criterion = self._rql_scalar_args(args)
+
+        self._rql_add_scalar("approx_count_distinct", approx_count_distinct(attr), attr, criterion)
+
+    def _rql_percentile(self, args: ArgsType) -> None:
+        clause = self._rql_percentile_clause([a for a in args if not _is_node(a, "filter")])
+        (attr,) = clause.clauses
+
+        self._rql_add_scalar("percentile", clause, attr, self._rql_scalar_filter(args))
+
+    def _rql_percentile_clause(self, args: ArgsType) -> approx_percentile:
+        if (
+            len(args) != 2
+            or isinstance(args[1], bool)
+            or not isinstance(args[1], (int, float))
+            or not 0 <= args[1] <= 1
+        ):
+            raise self._rql_error_cls(
+                "Invalid percentile arguments, expected percentile(attr,p) with 0 <= p <= 1"
+            )
+
+        self._rql_percentiles = True
+
+        return approx_percentile(self._rql_attr(args[0]), args[1])
+
+    def _rql_sample(self, args: ArgsType) -> Sample:
+        if (
+            len(args) != 1
+            or isinstance(args[0], bool)
+            or not isinstance(args[0], (int, float))
+            or not 0 < args[0] <= 100
+        ):
+            raise self._rql_error_cls(
+                "Invalid sample arguments, expected sample(pct) with 0 < pct <= 100"
+            )
+
+        return Sample(inspect(self._rql_select_entities[0]).local_table, args[0])
+
+    def _rql_filter(self, args: ArgsType) -> Optional[elements.BooleanClauseList]:
+        return self._rql_and(args)
+
+    def _rql_scalar_filter(self, args: ArgsType) -> Any:
+        # a filter() argument restricts the aggregate to the matching rows
+        filters = [a for a in args if isinstance(a, dict) and a["name"] == "filter"]
+        if len(filters) > 1:
+            raise self._rql_error_cls("Aggregates accept a single filter()")
+
+        return self._rql_apply(filters[0]) if filters else None
 
-        self._rql_scalar_clause = func.min(attr)
+    def _rql_scalar_args(self, args: ArgsType) -> Tuple[Any, Any]:
+        attrs = [a for a in args if not (isinstance(a, dict) and a["name"] == "filter")]
+        if len(attrs) != 1:
+            raise self._rql_error_cls("Aggregates require a single attribute")
 
-    def _rql_count(self, *_) -> None:
-        self._rql_scalar_clause = func.count()
+        return self._rql_attr(attr=attrs[0]), self._rql_scalar_filter(args)
+
+    def _rql_add_scalar(self, name: str, clause: Any, attr: Any, criterion: Any) -> None:
+        clause = aggregate_filter(clause, criterion)
+
+        label = name
+        if label in self._rql_scalar_clauses and attr is not None:
+            label = f"{name}_{attr.key}"
+
+        n = 1
+        while label in self._rql_scalar_clauses:
+            label = f"{name}_{n}"
+            n += 1
+
+        self._rql_scalar_clauses[label] = clause
+        self._rql_scalar_clause = clause
 
     def _rql_first(self, *_) -> None:
         self._rql_limit_clause = 1
@@ -495,12 +1883,23 @@ class RQLSelect(Select):
         aggregations = []
 
         for argument in args:
-            if isinstance(argument, dict):
+            if _is_node(argument, "bucket"):
+                attributes.append(self._rql_time_bucket(argument["args"]))
+
+            elif _is_node(argument, "percentile"):
+                aggregate_label = argument["name"]
+                aggregation = self._rql_percentile_clause(argument["args"]).label(aggregate_label)
+                aggregations.append(aggregation)
+                self._rql_aggregate_labels[aggregate_label] = aggregation
+
+            elif isinstance(argument, dict):
                 aggregate_label = argument["name"]
                 aggregate_function = getattr(func, argument["name"])
                 aggregate_attribute = self._rql_attr(argument["args"][0])
 
-                aggregations.append(aggregate_function(aggregate_attribute).label(aggregate_label))
+                aggregation = aggregate_function(aggregate_attribute).label(aggregate_label)
+                aggregations.append(aggregation)
+                self._rql_aggregate_labels[aggregate_label] = aggregation
 
             else:
                 attributes.append(self._rql_attr(argument))
@@ -508,6 +1907,85 @@ class RQLSelect(Select):
         self._rql_group_by_clause = attributes
         self._rql_select_clause = attributes + aggregations
 
+        if self._rql_bucket_fill and len(attributes) > 1:
+            raise self._rql_error_cls("Filling time buckets requires a single group attribute")
+
+    def _rql_time_bucket(self, args: ArgsType) -> elements.Label:
+        if len(args) not in (2, 3) or (len(args) == 3 and args[2] != "fill"):
+            raise self._rql_error_cls(
+                "Invalid bucket arguments, expected bucket(attr,unit[,fill])"
+            )
+
+        attr, unit = args[:2]
+        if unit not in TIME_BUCKET_UNITS:
+            raise self._rql_error_cls(f"Invalid time bucket unit: {unit}")
+
+        column = self._rql_attr(attr)
+        self._rql_bucket_clause = TimeBucket(column, unit).label(column.key)
+        self._rql_bucket_fill = len(args) == 3
+
+        return self._rql_bucket_clause
+
+
+def _encode_sync_value(value: Any) -> Any:
+    # called by json.dumps for values it can't encode
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+
+    raise TypeError(f"{type(value).__name__} values can't be encoded")
+
+
+def _encode_sync_token(value: Any, pk: Any) -> str:
+    token = json.dumps([value, pk], default=_encode_sync_value)
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+def _decode_sync_value(value: Any, column: Any) -> Any:
+    if value is None:
+        return None
+
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if python_type in (datetime.datetime, datetime.date, datetime.time):
+        return python_type.fromisoformat(value)
+
+    if python_type in (Decimal, uuid.UUID):
+        return python_type(value)
+
+    return value
+
+
+def _is_node(node: Any, name: str) -> bool:
+    return isinstance(node, dict) and node["name"] == name
+
+
+def _and_clauses(clause: Any) -> List[Any]:
+    if isinstance(clause, elements.BooleanClauseList) and clause.operator is operator.and_:
+        return [c for clause in clause.clauses for c in _and_clauses(clause)]
+
+    return [clause]
+
+
+def _column(attr: Any) -> Any:
+    # mapped attributes are converted to their column expression
+    if hasattr(attr, "__clause_element__"):
+        return attr.__clause_element__()
+
+    return attr
+
+
+def _is_count(clause: Any) -> bool:
+    if isinstance(clause, AggregateFilter):
+        clause = clause.func
+
+    return clause.__class__.__name__ == "count"
+
 
 def select(*entities: _typing._ColumnsClauseArgument[Any], **__kw: Any) -> RQLSelect:
     if __kw:
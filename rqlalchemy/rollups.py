@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+import sqlalchemy as sa
+from pyrql import parse
+from sqlalchemy import func
+from sqlalchemy import sql
+from sqlalchemy.inspection import inspect
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.elements import ColumnClause
+from sqlalchemy.sql.selectable import FromClause
+
+from rqlalchemy.functions import AggregateFilter
+from rqlalchemy.functions import aggregate_filter
+
+MeasureKey = Tuple[str, Optional[str]]
+
+# additive measures, and how partial aggregates are combined
+ADDITIVE = {"count", "sum", "min", "max"}
+
+
+class _NotCovered(Exception):
+    pass
+
+
+class Rollup:
+    """A pre-aggregated table or materialized view of a model, grouped by
+    `dimensions` and with the additive `measures`.
+
+    `dimensions` maps model attributes to rollup columns, and `measures` maps
+    rollup columns to the aggregate of the model they hold, as in
+    `{"users": "count()", "balance_total": "sum(balance)"}`.
+
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        selectable: Any,
+        dimensions: Union[Sequence[str], Mapping[str, str]],
+        measures: Mapping[str, str],
+    ):
+        if not isinstance(dimensions, Mapping):
+            dimensions = {key: key for key in dimensions}
+
+        self.model = model
+        self.selectable = inspect(selectable).selectable
+
+        columns = self.selectable.c
+
+        # model columns by identity, as column comparisons build expressions
+        self._keys = {id(prop.columns[0]): prop.key for prop in inspect(model).column_attrs}
+        self._nullable = {
+            prop.key: prop.columns[0].nullable for prop in inspect(model).column_attrs
+        }
+
+        self.dimensions: Dict[str, Any] = {key: columns[name] for key, name in dimensions.items()}
+        self.measures: Dict[MeasureKey, Any] = {}
+
+        for name, expression in measures.items():
+            parsed = parse(expression)
+            function = parsed["name"]
+            args = parsed["args"]
+
+            if function not in ADDITIVE or len(args) > 1 or (function != "count" and not args):
+                raise ValueError(f"Invalid rollup measure: {expression}")
+
+            self.measures[(function, args[0] if args else None)] = columns[name]
+
+    def rewrite(self, query: Any) -> Optional[sa.Select]:
+        """Rewrite an aggregate query to read from the rollup, or return
+        None if the rollup doesn't cover it.
+
+        """
+        try:
+            return self._rewrite(query)
+        except _NotCovered:
+            return None
+
+    def _rewrite(self, query: Any) -> sa.Select:
+        labels: Dict[int, Any] = {}
+
+        def replace(element):
+            if id(element) in labels:
+                return labels[id(element)]
+
+            if isinstance(element, ColumnClause) and element.table is not None:
+                return self._dimension(element)
+
+            # anything else reading from a table, like a sample or a subquery
+            if isinstance(element, FromClause):
+                self._not_covered()
+
+            return None
+
+        def adapt(clause):
+            return visitors.replacement_traverse(clause, {}, replace)
+
+        if query._rql_group_by_clause:
+            columns = []
+            group_by = []
+            aggregates = {id(label) for label in query._rql_aggregate_labels.values()}
+
+            for clause in query._rql_select_clause:
+                if id(clause) in aggregates:
+                    label = self._aggregate(clause.element, adapt).label(clause.name)
+                    labels[id(clause)] = label
+                    columns.append(label)
+                else:
+                    column = adapt(_column(clause))
+                    group_by.append(column)
+                    columns.append(column.label(clause.key))
+
+            statement = sql.select(*columns).group_by(*group_by)
+
+            if query._rql_having_clause:
+                statement = statement.having(*[adapt(c) for c in query._rql_having_clause])
+
+            if query._order_by_clauses:
+                statement = statement.order_by(*[adapt(c) for c in query._order_by_clauses])
+
+            if query._limit_clause is not None:
+                statement = statement.limit(query._limit_clause)
+
+            if query._offset_clause is not None:
+                statement = statement.offset(query._offset_clause)
+
+        elif len(query._rql_scalar_clauses) > 1:
+            statement = sql.select(
+                *[
+                    self._aggregate(clause, adapt).label(name)
+                    for (name, clause) in query._rql_scalar_clauses.items()
+                ]
+            )
+
+        else:
+            statement = sql.select(self._aggregate(query._rql_scalar_clause, adapt))
+
+        statement = statement.select_from(self.selectable)
+
+        if query._where_criteria:
+            statement = statement.where(*[adapt(c) for c in query._where_criteria])
+
+        return statement
+
+    def _aggregate(self, clause: Any, adapt) -> Any:
+        """Combine the partial aggregates in the rollup into the aggregate of
+        the model rows.
+
+        """
+        criterion = None
+        if isinstance(clause, AggregateFilter):
+            criterion = adapt(clause.criterion)
+            clause = clause.func
+
+        name = getattr(clause, "name", None)
+        args = [arg for arg in clause.clauses if getattr(arg, "name", None) != "*"]
+        if len(args) > 1:
+            self._not_covered()
+
+        key = self._key(args[0]) if args else None
+
+        def combine(function, column):
+            return aggregate_filter(function(column), criterion)
+
+        if name == "count":
+            measure = self._measure_count(key)
+            return func.coalesce(combine(func.sum, measure), 0)
+
+        if name in ("sum", "min", "max"):
+            return combine(getattr(func, name), self._measure(name, key))
+
+        if name == "avg":
+            total = combine(func.sum, self._measure("sum", key))
+            count = combine(func.sum, self._measure_count(key))
+            return sa.cast(total, sa.Float) / func.nullif(count, 0)
+
+        self._not_covered()
+
+    def _dimension(self, column: Any) -> Any:
+        dimension = self.dimensions.get(self._key(column))
+        if dimension is None:
+            self._not_covered()
+
+        return dimension
+
+    def _measure(self, function: str, key: Optional[str]) -> Any:
+        measure = self.measures.get((function, key))
+        if measure is None:
+            self._not_covered()
+
+        return measure
+
+    def _measure_count(self, key: Optional[str]) -> Any:
+        # counts of a column without nulls are counts of rows
+        if key is not None and not self._nullable[key] and ("count", key) not in self.measures:
+            key = None
+
+        return self._measure("count", key)
+
+    def _key(self, column: Any) -> str:
+        if not isinstance(column, ColumnClause) or column.table is None:
+            self._not_covered()
+
+        key = self._keys.get(id(column._deannotate()))
+        if key is None:
+            self._not_covered()
+
+        return key
+
+    def _not_covered(self):
+        raise _NotCovered()
+
+
+def _column(clause: Any) -> Any:
+    # mapped attributes are converted to their column expression
+    if hasattr(clause, "__clause_element__"):
+        return clause.__clause_element__()
+
+    return clause
+
+
+class RollupRegistry:
+    """Pre-aggregated tables or materialized views for models.
+
+    Aggregate queries grouping only by dimensions of a rollup, filtering only
+    on them, and computing `count()`, `sum()`, `min()`, `max()` or `mean()`
+    from its measures, are rewritten to read from the rollup, combining the
+    measures of the matching rollup rows. The first covering rollup
+    registered for a model is used, so smaller rollups should be registered
+    first.
+
+    """
+
+    def __init__(self):
+        self._rollups: Dict[Any, List[Rollup]] = {}
+
+    def register(
+        self,
+        model: Any,
+        selectable: Any,
+        dimensions: Union[Sequence[str], Mapping[str, str]],
+        measures: Mapping[str, str],
+    ) -> Rollup:
+        rollup = Rollup(model, selectable, dimensions, measures)
+        self._rollups.setdefault(model, []).append(rollup)
+
+        return rollup
+
+    def unregister(self, model: Any, selectable: Any = None) -> None:
+        if selectable is None:
+            self._rollups.pop(model, None)
+            return
+
+        selectable = inspect(selectable).selectable
+        self._rollups[model] = [r for r in self.rollups(model) if r.selectable is not selectable]
+
+    def rollups(self, model: Any) -> List[Rollup]:
+        return self._rollups.get(model, [])
+
+    def rewrite(self, query: Any) -> Optional[sa.Select]:
+        if not self._rollups:
+            return None
+
+        for rollup in self.rollups(query._rql_select_entities[0]):
+            statement = rollup.rewrite(query)
+            if statement is not None:
+                return statement
+
+        return None
+
+
+rollups = RollupRegistry()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+from typing import Any
+from typing import Optional
+from typing import Sequence
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PINNED_KEY = "rqlalchemy_pinned"
+
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+class RQLRoutingPolicy:
+    """Routes read-only RQL statements to replica engines.
+
+    Entity and value queries are spread over `replicas` round-robin, while
+    counts and aggregates go to the `analytics` engine, if given. Sessions
+    that wrote anything are pinned to the `primary` engine from then on, so
+    they read their own writes despite replication lag.
+
+    Enabled by setting `RQLSelect._rql_routing`.
+
+    """
+
+    def __init__(self, primary: Any, replicas: Sequence[Any] = (), analytics: Any = None):
+        self.primary = primary
+        self.replicas = tuple(replicas)
+        self.analytics = analytics
+        self._replicas = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+
+        _install_listeners()
+
+    def get_bind(self, session: Session, analytics: bool = False) -> Any:
+        if is_pinned(session):
+            return self.primary
+
+        if analytics and self.analytics is not None:
+            return self.analytics
+
+        if not self.replicas:
+            return self.primary
+
+        with self._lock:
+            return next(self._replicas)
+
+
+def pin(session: Session) -> None:
+    """Send all further RQL queries on the session to the primary"""
+    session.info[PINNED_KEY] = True
+
+
+def unpin(session: Session) -> None:
+    session.info.pop(PINNED_KEY, None)
+
+
+def is_pinned(session: Session) -> bool:
+    return session.info.get(PINNED_KEY, False)
+
+
+def _after_flush(session, flush_context) -> None:
+    pin(session)
+
+
+def _do_orm_execute(orm_execute_state) -> None:
+    if not orm_execute_state.is_select:
+        pin(orm_execute_state.session)
+
+
+def _install_listeners() -> None:
+    # sessions are pinned by all flushes and ORM writes, so the listeners are
+    # only installed once a policy is created
+    global _listeners_installed
+
+    if _listeners_installed:
+        return
+
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Session, "after_flush", _after_flush)
+            event.listen(Session, "do_orm_execute", _do_orm_execute)
+            _listeners_installed = True
+
+
+def bind_arguments(policy: Optional[RQLRoutingPolicy], session: Session, analytics: bool):
+    if policy is None:
+        return None
+
+    return {"bind": policy.get_bind(session, analytics)}
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from sqlalchemy import func
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+from rqlalchemy.functions import AggregateFilter
+from rqlalchemy.functions import aggregate_filter
+from rqlalchemy.pagecache import freeze
+from rqlalchemy.query import PaginatedResults
+from rqlalchemy.query import RQLSelect
+from rqlalchemy.query import _column
+
+# dialects sorting NULL after all other values
+NULLS_LAST_DIALECTS = {"postgresql", "oracle"}
+
+
+def _non_null(values):
+    return [value for value in values if value is not None]
+
+
+def _sum(values):
+    values = _non_null(values)
+    return sum(values) if values else None
+
+
+def _min(values):
+    values = _non_null(values)
+    return min(values) if values else None
+
+
+def _max(values):
+    values = _non_null(values)
+    return max(values) if values else None
+
+
+# functions combining the results of an aggregate on each shard
+COMBINE: Dict[str, Callable[[List[Any]], Any]] = {
+    "count": lambda values: sum(_non_null(values)),
+    "sum": _sum,
+    "min": _min,
+    "max": _max,
+}
+
+
+class _SortValue:
+    """Compares values as the database sorts them, with NULL as the smallest
+    or largest value depending on the dialect.
+
+    """
+
+    __slots__ = ("value", "descending", "nulls_last")
+
+    def __init__(self, value: Any, descending: bool, nulls_last: bool):
+        self.value = value
+        self.descending = descending
+        self.nulls_last = nulls_last
+
+    def _less(self, a: Any, b: Any) -> bool:
+        if a is None or b is None:
+            if a is None and b is None:
+                return False
+            return (a is None) != self.nulls_last
+
+        return a < b
+
+    def __lt__(self, other: "_SortValue") -> bool:
+        if self.descending:
+            return self._less(other.value, self.value)
+
+        return self._less(self.value, other.value)
+
+    def __eq__(self, other: Any) -> bool:
+        return self.value == other.value
+
+
+class RQLShardedExecutor:
+    """Runs RQL queries on several engines, each holding a shard of the same
+    tables, and combines the results as if they came from a single database.
+
+    Each shard runs the same statement in a thread pool. Rows are merged by
+    the `sort()` keys, with the limit and offset applied to the merged
+    results, and `count()`, `sum()`, `min()`, `max()` and `mean()` are
+    combined from the partial aggregates of each shard.
+
+    """
+
+    def __init__(self, engines: Sequence[Any], max_workers: Optional[int] = None):
+        if not engines:
+            raise ValueError("At least one engine is required")
+
+        self.engines = list(engines)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.engines), thread_name_prefix="rqlalchemy-shard"
+        )
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def __enter__(self) -> "RQLShardedExecutor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _map(self, function: Callable[[Session], Any]) -> List[Any]:
+        def run(engine):
+            # results outlive the session, so they must not be expired
+            with Session(engine, expire_on_commit=False) as session:
+                return function(session)
+
+        return list(self._pool.map(run, self.engines))
+
+    def execute(self, select_: RQLSelect) -> Any:
+        """Execute an RQL select on all shards, returning the results as
+        `RQLSelect.execute()` would.
+
+        """
+        if select_._rql_group_by_clause or select_._rql_one_clause is not None:
+            raise select_._rql_error_cls("aggregate() and one() are not supported on shards")
+
+        # the top rows of each group on every shard would need ranking again
+        if select_._rql_top_clause is not None:
+            raise select_._rql_error_cls("top() is not supported on shards")
+
+        if select_._rql_scalar_clauses:
+            return self._scalars(select_)
+
+        return self._rows(select_)
+
+    def paginate(self, select_: RQLSelect) -> PaginatedResults:
+        """Paginate an RQL select over all shards, as
+        `RQLSelect.rql_paginate()`.
+
+        """
+        if select_._rql_select_limit is None:
+            raise select_._rql_error_cls("Pagination requires a limit value")
+
+        # the same values can be counted on several shards
+        if select_._rql_distinct_clause is not None:
+            raise select_._rql_error_cls("Pagination with distinct() is not supported on shards")
+
+        page = self.execute(select_)
+        statement = select_._rql_count_statement()
+        total = sum(self._map(lambda session: session.execute(statement).scalar()))
+
+        return select_._rql_paginated(page, total)
+
+    def _scalars(self, select_: RQLSelect) -> Any:
+        # including limits given to rql() and _rql_default_limit
+        if select_._limit_clause is not None or select_._offset_clause is not None:
+            raise select_._rql_error_cls("Aggregates with limit are not supported on shards")
+
+        # the mean is computed from the sum and count on each shard
+        clauses = {}
+        for name, clause in select_._rql_scalar_clauses.items():
+            function = clause.func if isinstance(clause, AggregateFilter) else clause
+            criterion = clause.criterion if isinstance(clause, AggregateFilter) else None
+
+            if function.name == "avg":
+                (argument,) = function.clauses
+                clauses[f"{name}__sum"] = aggregate_filter(func.sum(argument), criterion)
+                clauses[f"{name}__count"] = aggregate_filter(func.count(argument), criterion)
+            elif function.name in COMBINE:
+                clauses[name] = clause
+            else:
+                raise select_._rql_error_cls(f"{function.name}() is not supported on shards")
+
+        shard_select = select_.limit(None)
+        shard_select._rql_routing = None
+        shard_select._rql_scalar_clauses = clauses
+        if len(clauses) == 1:
+            shard_select._rql_scalar_clause = next(iter(clauses.values()))
+
+        results = self._map(shard_select._rql_execute)
+        if len(clauses) == 1:
+            results = [{name: result} for name in clauses for result in results]
+
+        values = {}
+        for name, clause in select_._rql_scalar_clauses.items():
+            if name in clauses:
+                function = clause.func if isinstance(clause, AggregateFilter) else clause
+                values[name] = COMBINE[function.name]([r[name] for r in results])
+            else:
+                total = _sum([r[f"{name}__sum"] for r in results])
+                count = sum(r[f"{name}__count"] for r in results)
+                values[name] = total / count if count else None
+
+        if len(values) == 1:
+            return next(iter(values.values()))
+
+        return values
+
+    def _rows(self, select_: RQLSelect) -> List[Any]:
+        limit = select_._rql_select_limit
+        offset = select_._rql_select_offset or 0
+
+        # each shard returns enough rows to fill the page on its own
+        shard_select = select_.offset(None)
+        shard_select._rql_routing = None
+        if limit is not None:
+            shard_select = shard_select.limit(offset + limit)
+
+        key = self._sort_key(select_)
+        results = self._map(shard_select._rql_execute)
+
+        if key is None:
+            merged = itertools.chain(*results)
+        else:
+            merged = heapq.merge(*results, key=key)
+
+        # entities are distinct across shards, but values and rows may repeat
+        if select_._rql_distinct_clause is not None:
+            if select_._rql_values_clause is not None:
+                merged = _unique(merged)
+            elif select_._rql_select_clause:
+                merged = _unique(merged, freeze)
+
+        stop = offset + limit if limit is not None else None
+
+        return list(itertools.islice(merged, offset, stop))
+
+    def _sort_key(self, select_: RQLSelect) -> Optional[Callable[[Any], Any]]:
+        if not select_._rql_order_by_clause:
+            return None
+
+        nulls_last = self.engines[0].dialect.name in NULLS_LAST_DIALECTS
+
+        fields = []
+        for clause in select_._rql_order_by_clause:
+            descending = (
+                isinstance(clause, UnaryExpression) and clause.modifier is operators.desc_op
+            )
+            element = _column(clause.element if descending else clause)
+
+            if select_._rql_values_clause is not None:
+                if not element.compare(_column(select_._rql_values_clause)):
+                    raise select_._rql_error_cls("values() on shards can only sort by the values")
+                fields.append((None, descending))
+            else:
+                fields.append((_sort_name(select_, element), descending))
+
+        def key(row):
+            return tuple(
+                _SortValue(_get(row, name), descending, nulls_last) for name, descending in fields
+            )
+
+        return key
+
+
+def _sort_name(select_: RQLSelect, element: Any) -> str:
+    # rows are merged in Python, so sorts are limited to values in the rows
+    if select_._rql_select_clause:
+        columns = {clause.key: _column(clause) for clause in select_._rql_select_clause}
+    else:
+        mapper = inspect(select_._rql_select_entities[0])
+        columns = {prop.key: prop.columns[0] for prop in mapper.column_attrs}
+
+    for name, column in columns.items():
+        if element.compare(column):
+            return name
+
+    raise select_._rql_error_cls("Sorts on shards must be by attributes of the results")
+
+
+def _get(row: Any, name: Optional[str]) -> Any:
+    if name is None:
+        return row
+
+    if isinstance(row, dict):
+        return row[name]
+
+    return getattr(row, name)
+
+
+def _unique(rows, key=None):
+    seen = set()
+    for row in rows:
+        value = row if key is None else key(row)
+        if value not in seen:
+            seen.add(value)
+            yield row
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import threading
+from collections import OrderedDict
+from collections import deque
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from rqlalchemy.instrumentation import RQLEvent
+from rqlalchemy.instrumentation import RQLInstrument
+
+# operators taking an attribute as first argument and literal values after it
+FILTER_OPERATORS = {
+    "eq",
+    "ne",
+    "lt",
+    "le",
+    "gt",
+    "ge",
+    "in",
+    "out",
+    "like",
+    "contains",
+    "excludes",
+}
+
+# operators taking only literal values
+LITERAL_OPERATORS = {"limit"}
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+def normalize(node: Any) -> str:
+    """Render a parsed RQL expression as its shape, with literal values
+    replaced by `?`.
+
+    Attributes are kept, so `and(eq(state,FL),limit(10))` and
+    `and(eq(state,TX),limit(20,40))` have the same `and(eq(state,?),limit(?))`
+    shape.
+
+    """
+    if node is None:
+        return ""
+
+    name = node["name"]
+    args = node["args"]
+
+    if name in FILTER_OPERATORS and args:
+        rendered = [_attr(args[0]), "?"]
+    elif name in LITERAL_OPERATORS:
+        rendered = ["?"]
+    elif name == "sort":
+        rendered = [
+            f"{arg[0]}{_attr(arg[1])}"
+            if isinstance(arg, tuple) and arg[0] in ("+", "-")
+            else _attr(arg)
+            for arg in args
+        ]
+    else:
+        rendered = [normalize(arg) if isinstance(arg, dict) else _attr(arg) for arg in args]
+
+    return f"{name}({','.join(rendered)})"
+
+
+def _attr(attr: Any) -> str:
+    if isinstance(attr, tuple):
+        return f"({','.join(_attr(a) for a in attr)})"
+
+    if isinstance(attr, dict):
+        return normalize(attr)
+
+    if isinstance(attr, str):
+        return attr
+
+    return "?"
+
+
+class ShapeStats:
+    def __init__(self, shape: str, buckets: Sequence[float], window: int):
+        self.shape = shape
+        self.count = 0
+        self.slow = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_rows = 0
+        self.worst_expression: Optional[str] = None
+        self.buckets = buckets
+        self.histogram = [0] * (len(buckets) + 1)
+        self.recent = deque(maxlen=window)
+
+    def add(self, event: RQLEvent, slow: bool) -> None:
+        self.count += 1
+        self.slow += slow
+        self.total_time += event.duration
+        self.total_rows += event.rows or 0
+        self.histogram[bisect.bisect_left(self.buckets, event.duration)] += 1
+        self.recent.append(event.duration)
+
+        if event.duration >= self.max_time:
+            self.max_time = event.duration
+            self.worst_expression = event.expression
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.recent:
+            return None
+
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "shape": self.shape,
+            "count": self.count,
+            "slow": self.slow,
+            "total_time": self.total_time,
+            "mean_time": self.total_time / self.count,
+            "max_time": self.max_time,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "total_rows": self.total_rows,
+            "mean_rows": self.total_rows / self.count,
+            "histogram": dict(zip([*(f"le_{b:g}" for b in self.buckets), "inf"], self.histogram)),
+            "worst_expression": self.worst_expression,
+        }
+
+
+class RQLSlowQueryLog(RQLInstrument):
+    """Groups `execute()` and `rql_paginate()` calls by normalized RQL shape,
+    keeping latency histograms, row counts and the slowest expression for
+    each shape.
+
+    Executions taking at least `threshold` seconds are counted as slow. At
+    most `max_shapes` shapes are kept, evicting the least recently seen, and
+    percentiles are computed over the last `window` executions of a shape.
+
+    """
+
+    operations = {"execute", "rql_paginate"}
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        max_shapes: int = 1000,
+        window: int = 100,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.threshold = threshold
+        self.max_shapes = max_shapes
+        self.window = window
+        self.buckets = tuple(sorted(buckets))
+        self._shapes: "OrderedDict[str, ShapeStats]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, event: RQLEvent) -> None:
+        if event.operation not in self.operations:
+            return
+
+        shape = normalize(event.parsed)
+
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                if len(self._shapes) >= self.max_shapes:
+                    self._shapes.popitem(last=False)
+                stats = self._shapes[shape] = ShapeStats(shape, self.buckets, self.window)
+            else:
+                self._shapes.move_to_end(shape)
+
+            stats.add(event, event.duration >= self.threshold)
+
+    def dump(self, sort_by: str = "total_time") -> List[Dict[str, Any]]:
+        """Export the statistics for all shapes, most expensive first"""
+        with self._lock:
+            shapes = [stats.as_dict() for stats in self._shapes.values()]
+
+        return sorted(shapes, key=lambda s: s[sort_by], reverse=True)
+
+    def top(self, n: int = 10, sort_by: str = "total_time") -> List[Dict[str, Any]]:
+        return self.dump(sort_by)[:n]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shapes.clear()
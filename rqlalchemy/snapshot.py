@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import itertools
+import operator
+import re
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import sqlalchemy as sa
+from pyrql import RQLSyntaxError
+from pyrql import parse
+from sqlalchemy import event
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+
+from rqlalchemy.query import RQLSelectError
+
+PENDING_KEY = "rqlalchemy_snapshots"
+
+COMPARISONS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+}
+
+# RQL value functions, evaluated as RQLSelect does
+VALUES = {
+    "dt": datetime.datetime,
+    "date": datetime.date,
+    "time": datetime.time,
+}
+
+# python types stored as native numpy arrays, others are kept as objects
+NATIVE_TYPES = (bool, int, float, str)
+
+
+class RQLSnapshot:
+    """An in-memory, columnar copy of a model's table, evaluating RQL
+    expressions with vectorized NumPy masks instead of querying the
+    database.
+
+    Supports filters, `sort()`, `limit()`, `first()`, `one()`, `select()`,
+    `values()`, `distinct()` and the `count()`, `sum()`, `mean()`, `min()` and
+    `max()` aggregates, returning results in the same shapes as
+    `RQLSelect.execute()`. Entities are detached instances shared by all
+    queries, and must be treated as read-only.
+
+    The snapshot is loaded on the first query, and reloaded after
+    `max_age` seconds, or after a commit changing the model in a session
+    given to `refresh_on_commit()`.
+
+    Requires the `numpy` package.
+
+    """
+
+    def __init__(self, model: Any, bind: Any, max_age: Optional[float] = None):
+        try:
+            import numpy
+        except ImportError as e:  # pragma: no cover
+            raise ImportError("RQLSnapshot requires numpy") from e
+
+        self.np = numpy
+        self.model = model
+        self.bind = bind
+        self.max_age = max_age
+
+        self._mapper = inspect(model)
+        self._keys = [prop.key for prop in self._mapper.column_attrs]
+        self._lock = threading.Lock()
+        self._stale = True
+        self._loaded_at = 0.0
+        self._objects: List[Any] = []
+        self._columns: Dict[str, Any] = {}
+
+    def refresh(self) -> None:
+        """Reload the snapshot from the database"""
+        with Session(self.bind, expire_on_commit=False) as session:
+            objects = session.scalars(sa.select(self.model)).all()
+
+        columns = {key: self._array([getattr(o, key) for o in objects]) for key in self._keys}
+
+        with self._lock:
+            self._objects = objects
+            self._columns = columns
+            self._loaded_at = time.monotonic()
+            self._stale = False
+
+    def invalidate(self) -> None:
+        """Reload the snapshot on the next query"""
+        self._stale = True
+
+    def refresh_on_commit(self, target: Any = Session) -> None:
+        """Invalidate the snapshot when a session, sessionmaker or Session
+        class commits changes to the model.
+
+        """
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "after_commit", self._after_commit)
+        event.listen(target, "after_rollback", self._after_rollback)
+
+    def _after_flush(self, session, flush_context) -> None:
+        changed = itertools.chain(session.new, session.dirty, session.deleted)
+        if any(isinstance(obj, self.model) for obj in changed):
+            session.info.setdefault(PENDING_KEY, set()).add(self)
+
+    def _after_commit(self, session) -> None:
+        if self in session.info.get(PENDING_KEY, ()):
+            session.info[PENDING_KEY].discard(self)
+            self.invalidate()
+
+    def _after_rollback(self, session) -> None:
+        session.info.get(PENDING_KEY, set()).discard(self)
+
+    def _array(self, values: List[Any]) -> Any:
+        types = {type(value) for value in values}
+
+        if len(types) == 1 and types.pop() in NATIVE_TYPES:
+            return self.np.array(values)
+
+        # assigned one by one, so sequences like JSON lists aren't unpacked
+        array = self.np.empty(len(values), dtype=object)
+        for index, value in enumerate(values):
+            array[index] = value
+
+        return array
+
+    def _snapshot(self):
+        expired = self.max_age is not None and time.monotonic() - self._loaded_at > self.max_age
+        if self._stale or expired:
+            self.refresh()
+
+        with self._lock:
+            return self._objects, self._columns
+
+    def execute(self, query: str = "") -> Any:
+        """Evaluate an RQL expression against the snapshot"""
+        try:
+            parsed = parse(query) if query else None
+        except RQLSyntaxError as e:
+            raise RQLSelectError(f"RQL Syntax error: {e.args}") from e
+
+        objects, columns = self._snapshot()
+
+        return _Evaluation(self, objects, columns).run(parsed)
+
+
+class _Evaluation:
+    def __init__(self, snapshot: RQLSnapshot, objects: List[Any], columns: Dict[str, Any]):
+        self.snapshot = snapshot
+        self.np = snapshot.np
+        self.objects = objects
+        self.columns = columns
+        self.size = len(objects)
+
+        self.sort: List[Any] = []
+        self.limit: Optional[int] = None
+        self.offset = 0
+        self.select: List[str] = []
+        self.values: Optional[str] = None
+        self.distinct = False
+        self.one = False
+        self.scalars: Dict[str, Any] = {}
+
+    def run(self, node: Optional[Dict[str, Any]]) -> Any:
+        mask = self.np.ones(self.size, dtype=bool)
+
+        if node is not None:
+            criterion = self.apply(node)
+            if criterion is not None:
+                mask &= criterion
+
+        if self.scalars:
+            values = {name: function(mask) for name, function in self.scalars.items()}
+            if len(values) == 1:
+                return next(iter(values.values()))
+            return values
+
+        indices = self.order(self.np.flatnonzero(mask))
+
+        if self.one:
+            if len(indices) != 1:
+                found = "No result" if not len(indices) else "Multiple results"
+                raise RQLSelectError(f"{found} found for one()")
+            return [self.objects[indices[0]]]
+
+        if self.values is not None:
+            rows = self.columns[self.values][indices].tolist()
+            if self.distinct:
+                rows = list(dict.fromkeys(rows))
+        elif self.select:
+            selected = [self.columns[key][indices].tolist() for key in self.select]
+            rows = [dict(zip(self.select, row)) for row in zip(*selected)]
+            if self.distinct:
+                rows = [dict(row) for row in dict.fromkeys(tuple(r.items()) for r in rows)]
+        else:
+            rows = [self.objects[index] for index in indices]
+
+        stop = self.offset + self.limit if self.limit is not None else None
+
+        return rows[self.offset : stop]
+
+    def apply(self, node: Any) -> Any:
+        name = node["name"]
+        args = node["args"]
+
+        if name in COMPARISONS:
+            return self.compare(args, COMPARISONS[name])
+
+        try:
+            method = getattr(self, f"op_{name}")
+        except AttributeError as e:
+            raise RQLSelectError(f"Query function not supported by snapshots: {name}") from e
+
+        return method(args)
+
+    def column(self, attr: Any) -> Any:
+        if not isinstance(attr, str) or attr not in self.columns:
+            raise RQLSelectError(f"Invalid query attribute: {attr}")
+
+        return self.columns[attr]
+
+    def value(self, node: Any) -> Any:
+        if not isinstance(node, dict):
+            return node
+
+        if node["name"] not in VALUES:
+            raise RQLSelectError(f"Invalid query value: {node['name']}()")
+
+        try:
+            return VALUES[node["name"]](*node["args"])
+        except (TypeError, ValueError) as e:
+            raise RQLSelectError(f"Invalid {node['name']}() arguments: {node['args']}") from e
+
+    def coerce(self, attr: str, value: Any) -> Any:
+        value = self.value(value)
+
+        # dates are given as strings, and compared as such by the database
+        try:
+            python_type = self.snapshot._mapper.columns[attr].type.python_type
+        except NotImplementedError:
+            return value
+
+        if isinstance(value, str) and python_type in (datetime.datetime, datetime.date):
+            return python_type.fromisoformat(value)
+
+        if python_type is str and value is not None and not isinstance(value, str):
+            return str(value)
+
+        return value
+
+    def not_null(self, column: Any) -> Any:
+        if column.dtype == object:
+            return self.np.array([value is not None for value in column], dtype=bool)
+
+        return self.np.ones(len(column), dtype=bool)
+
+    def compare(self, args, op) -> Any:
+        attr, value = args
+        column = self.column(attr)
+        value = self.coerce(attr, value)
+        valid = self.not_null(column)
+
+        # comparisons with NULL are only meaningful as IS NULL and IS NOT NULL
+        if value is None:
+            if op is operator.eq:
+                return ~valid
+            if op is operator.ne:
+                return valid
+            return self.np.zeros(self.size, dtype=bool)
+
+        result = self.np.zeros(self.size, dtype=bool)
+        result[valid] = op(column[valid], value)
+
+        return result
+
+    def op_and(self, args) -> Any:
+        masks = [mask for mask in (self.apply(node) for node in args) if mask is not None]
+        if not masks:
+            return None
+
+        return self.np.logical_and.reduce(masks)
+
+    def op_or(self, args) -> Any:
+        masks = [mask for mask in (self.apply(node) for node in args) if mask is not None]
+        if not masks:
+            return None
+
+        return self.np.logical_or.reduce(masks)
+
+    op_filter = op_and
+
+    def op_in(self, args) -> Any:
+        attr, values = args
+        column = self.column(attr)
+        values = [self.coerce(attr, value) for value in values]
+
+        return self.not_null(column) & self.np.isin(column, values)
+
+    def op_out(self, args) -> Any:
+        attr, values = args
+        column = self.column(attr)
+        values = [self.coerce(attr, value) for value in values]
+
+        return self.not_null(column) & ~self.np.isin(column, values)
+
+    def op_like(self, args) -> Any:
+        attr, value = args
+        column = self.column(attr)
+        pattern = re.compile(
+            ".*".join(re.escape(part) for part in str(value).split("*")), re.DOTALL
+        )
+
+        return self.np.fromiter(
+            (v is not None and pattern.fullmatch(str(v)) is not None for v in column),
+            dtype=bool,
+            count=len(column),
+        )
+
+    def op_sort(self, args) -> None:
+        args = [("+", arg) if isinstance(arg, str) else arg for arg in args]
+        self.sort = [(prefix == "-", attr, self.column(attr)) for (prefix, attr) in args]
+
+    def op_limit(self, args) -> None:
+        self.limit = args[0]
+        if len(args) == 2:
+            self.offset = args[1]
+
+    def op_first(self, args) -> None:
+        self.limit = 1
+
+    def op_one(self, args) -> None:
+        self.one = True
+
+    def op_select(self, args) -> None:
+        for attr in args:
+            self.column(attr)
+
+        self.select = list(args)
+
+    def op_values(self, args) -> None:
+        (attr,) = args
+        self.column(attr)
+        self.values = attr
+
+    def op_distinct(self, args) -> None:
+        self.distinct = True
+
+    def order(self, indices: Any) -> Any:
+        if not self.sort:
+            return indices
+
+        keys = []
+        for descending, _, column in self.sort:
+            column = column[indices]
+            valid = self.not_null(column)
+
+            # rank the values, with NULL as the smallest as in SQLite
+            ranks = self.np.zeros(len(column), dtype=int)
+            if valid.any():
+                ranks[valid] = self.np.unique(column[valid], return_inverse=True)[1] + 1
+
+            keys.append(-ranks if descending else ranks)
+
+        # lexsort sorts by the last key first
+        return indices[self.np.lexsort(keys[::-1])]
+
+    def aggregate(self, name: str, args, function) -> None:
+        attrs = [a for a in args if not (isinstance(a, dict) and a["name"] == "filter")]
+        filters = [self.apply(a) for a in args if isinstance(a, dict) and a["name"] == "filter"]
+
+        column = self.column(attrs[0]) if attrs else None
+        label = name
+        if label in self.scalars and attrs:
+            label = f"{name}_{attrs[0]}"
+
+        n = 1
+        while label in self.scalars:
+            label = f"{name}_{n}"
+            n += 1
+
+        def evaluate(mask):
+            for criterion in filters:
+                if criterion is not None:
+                    mask = mask & criterion
+
+            if column is None:
+                return int(mask.sum())
+
+            values = column[mask & self.not_null(column)].tolist()
+            return function(values)
+
+        self.scalars[label] = evaluate
+
+    def op_count(self, args) -> None:
+        self.aggregate("count", args, len)
+
+    def op_sum(self, args) -> None:
+        self.aggregate("sum", args, lambda values: sum(values) if values else None)
+
+    def op_mean(self, args) -> None:
+        self.aggregate("mean", args, lambda values: sum(values) / len(values) if values else None)
+
+    def op_min(self, args) -> None:
+        self.aggregate("min", args, lambda values: min(values) if values else None)
+
+    def op_max(self, args) -> None:
+        self.aggregate("max", args, lambda values: max(values) if values else None)
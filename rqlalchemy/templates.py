@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Type
+
+from pyrql import RQLSyntaxError
+from pyrql import parse
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import configure_mappers
+
+from rqlalchemy.query import RQLSelect
+
+# execution options aren't part of the cache key, so streaming doesn't
+# change the cached statement
+STREAM = {"stream_results": True}
+
+
+class RQLTemplate:
+    """An immutable RQL query for a model, parsed once and safe to share
+    across threads.
+
+    `select()` binds the template to a fresh `select_cls` query, so a
+    template can be created at import time and used by every request. The
+    expression is checked against the model when the template is created,
+    raising the query's error class if it's invalid.
+
+    """
+
+    __slots__ = ("_model", "_expression", "_parsed", "_select_cls")
+
+    def __init__(self, model: Any, expression: str, select_cls: Type[RQLSelect] = RQLSelect):
+        try:
+            parsed = parse(expression) if expression else None
+        except RQLSyntaxError as e:
+            raise select_cls._rql_error_cls(f"RQL Syntax error: {e.args}") from e
+
+        object.__setattr__(self, "_model", model)
+        object.__setattr__(self, "_expression", expression)
+        object.__setattr__(self, "_parsed", parsed)
+        object.__setattr__(self, "_select_cls", select_cls)
+
+        # resolves the attributes, and configures the mappers on first use
+        self.select()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._model.__name__}, {self._expression!r})"
+
+    @property
+    def model(self) -> Any:
+        return self._model
+
+    @property
+    def expression(self) -> str:
+        return self._expression
+
+    @property
+    def select_cls(self) -> Type[RQLSelect]:
+        return self._select_cls
+
+    def select(self, limit: Optional[int] = None) -> RQLSelect:
+        """Build a new query from the template, as
+        `select_cls(model).rql(expression, limit)` would without parsing
+        the expression again.
+
+        """
+        if self._parsed is None:
+            return self._select_cls(self._model).rql("", limit)
+
+        return self._select_cls(self._model)._rql_build(self._expression, self._parsed, limit)
+
+
+def warm_up(
+    engines: Sequence[Any],
+    expressions: Mapping[Any, Sequence[str]],
+    select_cls: Type[RQLSelect] = RQLSelect,
+) -> Dict[Any, List[RQLTemplate]]:
+    """Prepare representative RQL expressions for each model at startup.
+
+    Mappers are configured, the expressions are parsed into templates and
+    their attributes resolved, and the statements are executed once on
+    each engine, so they're in its compiled statement cache before the
+    first request. Each engine has its own cache, so replicas and shards
+    should all be given. Expressions with a limit also have the count
+    statement of `rql_paginate()` executed.
+
+    Statements are executed with a server side cursor, closed before
+    fetching any rows, in a transaction that is rolled back. Counts and
+    aggregates still run to completion, so they should be cheap.
+
+    Returns the templates by model, in the given order.
+
+    """
+    configure_mappers()
+
+    templates = {
+        model: [RQLTemplate(model, expression, select_cls) for expression in model_expressions]
+        for (model, model_expressions) in expressions.items()
+    }
+
+    for engine in engines:
+        with Session(engine) as session:
+            for model_templates in templates.values():
+                for template in model_templates:
+                    for statement in _statements(template.select(), engine.dialect.name):
+                        session.execute(statement, execution_options=STREAM).close()
+
+            session.rollback()
+
+    return templates
+
+
+def _statements(query: RQLSelect, dialect: str) -> List[Any]:
+    statements = [query._rql_statement(dialect)]
+
+    if query._rql_select_limit is not None and not (
+        query._rql_scalar_clauses or query._rql_one_clause is not None
+    ):
+        statements.append(query._rql_count_statement())
+
+    return statements
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import time
+from contextlib import contextmanager
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from sqlalchemy import text
+
+# number of SQLite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 1000
+
+# error codes for statements cancelled by a timeout
+POSTGRESQL_QUERY_CANCELED = "57014"
+MYSQL_QUERY_TIMEOUT = 3024
+
+
+@contextmanager
+def statement_timeout(
+    session, statement, timeout: float, bind_arguments: Optional[Dict[str, Any]] = None
+):
+    """Limit the execution time of a statement executed in the context,
+    yielding the statement to execute.
+
+    On PostgreSQL, `statement_timeout` is set for the transaction and
+    restored afterwards. On MySQL, the statement is given a
+    `MAX_EXECUTION_TIME` hint. On SQLite, a progress handler interrupts the
+    statement after the deadline. Other dialects are not limited.
+
+    """
+    connection = session.connection(bind_arguments=bind_arguments)
+    dialect = connection.dialect.name
+    milliseconds = max(1, int(timeout * 1000))
+
+    if dialect == "postgresql":
+        previous = connection.execute(
+            text(
+                "SELECT current_setting('statement_timeout'), "
+                "set_config('statement_timeout', :timeout, true)"
+            ),
+            {"timeout": str(milliseconds)},
+        ).scalar()
+
+        yield statement
+
+        # not restored if the statement failed, as that aborts the transaction
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"), {"timeout": previous}
+        )
+
+    elif dialect == "mysql":
+        yield statement.prefix_with(f"/*+ MAX_EXECUTION_TIME({milliseconds}) */", dialect="mysql")
+
+    elif dialect == "sqlite":
+        deadline = time.monotonic() + timeout
+        dbapi_connection = connection.connection.dbapi_connection
+        _set_progress_handler(dbapi_connection, lambda: time.monotonic() > deadline)
+        try:
+            yield statement
+        finally:
+            _set_progress_handler(dbapi_connection, None)
+
+    else:
+        yield statement
+
+
+def _set_progress_handler(dbapi_connection, handler) -> None:
+    if hasattr(dbapi_connection, "set_progress_handler"):
+        dbapi_connection.set_progress_handler(handler, SQLITE_PROGRESS_STEPS)
+        return
+
+    # aiosqlite runs the connection in its own thread
+    driver_connection = dbapi_connection.driver_connection
+    dbapi_connection.await_(driver_connection.set_progress_handler(handler, SQLITE_PROGRESS_STEPS))
+
+
+def is_timeout_error(dialect: str, error: Exception) -> bool:
+    """Check if a DBAPI error was raised by a statement timeout"""
+    orig = getattr(error, "orig", error)
+
+    if dialect == "postgresql":
+        code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+        return code == POSTGRESQL_QUERY_CANCELED
+
+    if dialect == "mysql":
+        return bool(orig.args) and orig.args[0] == MYSQL_QUERY_TIMEOUT
+
+    if dialect == "sqlite":
+        return "interrupted" in str(orig)
+
+    return False
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import mssql
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import oracle
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.functions import _compile_approx_percentile_unsupported
+from rqlalchemy.functions import approx_percentile
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+def compiled(query, dialect):
+    statement = query._rql_statement(dialect.name)
+    return str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+class TestApproxCountDistinct:
+    def test_exact_by_default(self, session, users):
+        res = select(User).rql("approx_count_distinct(state)").execute(session)
+
+        assert res == len({u.state for u in users})
+
+    def test_with_filter(self, session, users):
+        res = select(User).rql("approx_count_distinct(state,filter(eq(gender,male)))")
+        res = res.execute(session)
+
+        assert res == len({u.state for u in users if u.gender == "male"})
+
+    def test_with_other_aggregates(self, session, users):
+        res = select(User).rql("and(approx_count_distinct(city),count())").execute(session)
+
+        assert res == {"approx_count_distinct": len({u.city for u in users}), "count": len(users)}
+
+    def test_aggregate(self, session, users):
+        res = select(User).rql("aggregate(gender,approx_count_distinct(state))").execute(session)
+
+        assert {r["gender"]: r["approx_count_distinct"] for r in res} == {
+            gender: len({u.state for u in users if u.gender == gender})
+            for gender in {u.gender for u in users}
+        }
+
+    def test_native(self):
+        query = select(User).rql("approx_count_distinct(state)")
+
+        assert "APPROX_COUNT_DISTINCT([user].state)" in compiled(query, mssql.dialect())
+        assert 'APPROX_COUNT_DISTINCT("user".state)' in compiled(query, oracle.dialect())
+        assert 'count(DISTINCT "user".state)' in compiled(query, postgresql.dialect())
+
+
+class TestPercentile:
+    def test_postgresql(self):
+        query = select(User).rql("percentile(balance,0.95)")
+
+        assert 'percentile_cont(0.95) WITHIN GROUP (ORDER BY "user".balance)' in compiled(
+            query, postgresql.dialect()
+        )
+
+    def test_native(self):
+        query = select(User).rql("percentile(balance,0.5)")
+
+        assert "APPROX_PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY [user].balance)" in compiled(
+            query, mssql.dialect()
+        )
+        assert 'APPROX_PERCENTILE(0.5) WITHIN GROUP (ORDER BY "user".balance)' in compiled(
+            query, oracle.dialect()
+        )
+
+    def test_with_filter(self):
+        query = select(User).rql("percentile(balance,0.5,filter(eq(state,FL)))")
+
+        assert (
+            'percentile_cont(0.5) WITHIN GROUP (ORDER BY "user".balance) '
+            "FILTER (WHERE \"user\".state = 'FL')"
+        ) in compiled(query, postgresql.dialect())
+
+    def test_aggregate(self):
+        query = select(User).rql(
+            "and(aggregate(state,percentile(balance,0.9)),gt(percentile,100))"
+        )
+        sql = compiled(query, postgresql.dialect())
+
+        assert 'percentile_cont(0.9) WITHIN GROUP (ORDER BY "user".balance) AS percentile' in sql
+        assert "HAVING percentile_cont(0.9)" in sql
+
+    def test_fraction_cached(self, engine):
+        # the fraction is rendered as a literal, so the statements must not
+        # share a compiled cache entry
+        queries = [
+            select(User).rql(f"percentile(balance,{p})")._rql_statement("postgresql")
+            for p in (0.5, 0.9)
+        ]
+        assert queries[0]._generate_cache_key() != queries[1]._generate_cache_key()
+
+        @compiles(approx_percentile, "sqlite")
+        def _compile_fraction(element, compiler, **kw):
+            return compiler.render_literal_value(element.fraction, sa.Float())
+
+        try:
+            with Session(engine) as session:
+                res = [
+                    session.execute(
+                        select(User).rql(f"percentile(balance,{p})")._rql_statement()
+                    ).scalar()
+                    for p in (0.5, 0.9, 0.1)
+                ]
+        finally:
+            compiles(approx_percentile, "sqlite")(_compile_approx_percentile_unsupported)
+
+        assert res == [0.5, 0.9, 0.1]
+
+    def test_unsupported_dialect(self, session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("percentile(balance,0.5)").execute(session)
+
+        with pytest.raises(RQLSelectError):
+            compiled(select(User).rql("percentile(balance,0.5)"), mysql.dialect())
+
+        with pytest.raises(CompileError):
+            str(sa.select(approx_percentile(User.balance, 0.5)).compile(dialect=mysql.dialect()))
+
+    @pytest.mark.parametrize("expr", ["percentile(balance)", "percentile(balance,95)"])
+    def test_invalid(self, expr):
+        with pytest.raises(RQLSelectError):
+            select(User).rql(expr)
+
+
+class TestSample:
+    def test_sample(self, session, users):
+        res = select(User).rql("and(sample(50),count())").execute(session)
+
+        # a binomial distribution with a standard deviation of about 16
+        assert 350 < res < 650
+
+    def test_sample_all(self, session, users):
+        res = select(User).rql("and(sample(100),count())").execute(session)
+
+        assert res == len(users)
+
+    def test_sample_with_filter(self, session, users):
+        res = select(User).rql("and(eq(state,FL),sample(50))").execute(session)
+
+        assert all(u.state == "FL" for u in res)
+        assert len(res) <= len([u for u in users if u.state == "FL"])
+
+    def test_tablesample(self):
+        sql = compiled(select(User).rql("and(eq(state,FL),sample(10))"), postgresql.dialect())
+
+        assert (
+            '"user".user_id IN (SELECT user_sample.user_id '
+            'FROM "user" AS user_sample TABLESAMPLE system(10.0))'
+        ) in sql.replace("\n", "")
+
+    def test_random_filter(self):
+        sql = compiled(select(User).rql("sample(10)"), mysql.dialect())
+
+        assert sql.endswith("WHERE RAND() < 0.1")
+
+    def test_random_filter_mssql(self):
+        sql = compiled(select(User).rql("sample(10)"), mssql.dialect())
+
+        assert sql.endswith("WHERE ABS(CHECKSUM(NEWID()) % 1000000) < 100000")
+
+    @pytest.mark.parametrize("expr", ["sample(0)", "sample(101)", "sample(a)", "sample(1,2)"])
+    def test_invalid(self, expr):
+        with pytest.raises(RQLSelectError):
+            select(User).rql(expr)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import postgresql
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.functions import aggregate_filter
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+class TestBatch:
+    def test_batch_matches_individual_queries(self, session):
+        queries = [
+            "count()",
+            "state=FL&count()",
+            "is_active=true&sum(balance)",
+            "max(balance)",
+            "in(state,(FL,TX))&sort(-balance)&limit(3)",
+            "gender=female&limit(2,5)",
+            "select(user_id,state)&limit(3)",
+            "state=FL&count(filter(eq(is_active,true)))",
+            "gt(balance,3000)&mean(balance)",
+        ]
+
+        res = select(User).rql_batch(session, queries)
+        exp = [select(User).rql(query).execute(session) for query in queries]
+
+        assert res[:8] == exp[:8]
+        assert res[8] == pytest.approx(exp[8])
+
+    def test_batch_combines_round_trips(self, session, engine):
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        queries = ["count()", "state=FL&count()", "state=TX&limit(2)", "state=FL&limit(2)"]
+
+        event.listen(engine, "before_cursor_execute", count_statements)
+        try:
+            select(User).rql_batch(session, queries)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statements)
+
+        assert len(statements) == 2
+        assert "FILTER (WHERE" in statements[0]
+        assert "UNION ALL" in statements[1]
+
+    def test_batch_with_base_filter(self, session):
+        queries = ["count()", "limit(3)&sort(name)", "gender=male&count()"]
+        res = select(User).where(User.state == "FL").rql_batch(session, queries)
+        exp = [select(User).where(User.state == "FL").rql(q).execute(session) for q in queries]
+
+        assert res == exp
+
+    def test_batch_top(self, session):
+        queries = ["count()", "and(top(1,state,-user_id),count())", "top(1,state,-user_id)"]
+        res = select(User).rql_batch(session, queries)
+        exp = [select(User).rql(query).execute(session) for query in queries]
+
+        assert res == exp
+        assert res[1] == len({u.state for u in res[2]})
+
+    def test_batch_percentile(self, session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql_batch(session, ["count()", "percentile(balance,0.5)"])
+
+    def test_aggregate_filter_case_fallback(self):
+        expr = aggregate_filter(func.count(), User.state == "FL")
+
+        assert "FILTER (WHERE" in str(expr.compile(dialect=postgresql.dialect()))
+        assert str(expr.compile(dialect=mysql.dialect())) == (
+            "count(CASE WHEN (user.state = %s) THEN 1 END)"
+        )
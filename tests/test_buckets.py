@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import postgresql
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+class TestTimeBuckets:
+    def test_bucket_day(self, session, users):
+        res = select(User).rql("aggregate(bucket(registered,day),count(user_id))").execute(session)
+        exp = Counter(datetime.combine(u.registered.date(), datetime.min.time()) for u in users)
+
+        assert {r["registered"]: r["count"] for r in res} == exp
+        assert [r["registered"] for r in res] == sorted(exp)
+
+    def test_bucket_month(self, session, users):
+        res = (
+            select(User).rql("aggregate(bucket(registered,month),count(user_id))").execute(session)
+        )
+        exp = Counter(u.registered.replace(day=1, hour=0, minute=0, second=0) for u in users)
+
+        assert {r["registered"]: r["count"] for r in res} == exp
+
+    def test_bucket_week_starts_on_monday(self, session, users):
+        res = (
+            select(User).rql("aggregate(bucket(registered,week),count(user_id))").execute(session)
+        )
+
+        assert res
+        assert all(r["registered"].weekday() == 0 for r in res)
+        assert sum(r["count"] for r in res) == len(users)
+
+    def test_bucket_with_filter_and_sort(self, session, users):
+        res = (
+            select(User)
+            .rql("aggregate(bucket(registered,year),count(user_id))&eq(state,FL)&sort(-count)")
+            .execute(session)
+        )
+        exp = Counter(u.registered.year for u in users if u.state == "FL")
+
+        assert {r["registered"].year: r["count"] for r in res} == exp
+        assert [r["count"] for r in res] == sorted(exp.values(), reverse=True)
+
+    def test_bucket_fill(self, session, users):
+        res = (
+            select(User)
+            .rql("aggregate(bucket(registered,day,fill),count(user_id),sum(balance))&eq(state,FL)")
+            .execute(session)
+        )
+        registered = [u.registered.date() for u in users if u.state == "FL"]
+        exp = Counter(registered)
+
+        days = [r["registered"].date() for r in res]
+        assert days[0] == min(registered)
+        assert days[-1] == max(registered)
+        assert all(b - a == timedelta(days=1) for (a, b) in zip(days, days[1:]))
+
+        assert {r["registered"].date(): r["count"] for r in res if r["count"]} == exp
+        assert all(r["sum"] is None for r in res if not r["count"])
+
+    def test_bucket_fill_with_limit(self, session, users):
+        res = (
+            select(User)
+            .rql("aggregate(bucket(registered,month,fill),count(user_id))&limit(3,2)")
+            .execute(session)
+        )
+        first = min(u.registered for u in users)
+
+        assert len(res) == 3
+        assert res[0]["registered"] == datetime(first.year, first.month + 2, 1)
+
+    def test_bucket_invalid_unit(self):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("aggregate(bucket(registered,fortnight),count(user_id))")
+
+    def test_bucket_fill_requires_single_group(self):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("aggregate(state,bucket(registered,day,fill),count(user_id))")
+
+    def test_bucket_postgresql(self):
+        query = select(User).rql("aggregate(bucket(registered,hour),count(user_id))")
+        sql = str(query._rql_statement().compile(dialect=postgresql.dialect()))
+
+        assert "date_trunc('hour', \"user\".registered) AS registered" in sql
+        assert "GROUP BY date_trunc('hour', \"user\".registered)" in sql
+
+    def test_bucket_mysql(self):
+        query = select(User).rql("aggregate(bucket(registered,day,fill),count(user_id))")
+        sql = str(query._rql_statement().compile(dialect=mysql.dialect()))
+
+        assert "CAST(DATE_FORMAT(user.registered, '%%Y-%%m-%%d 00:00:00') AS DATETIME)" in sql
+        assert "DATE_ADD(rql_series.bucket, INTERVAL 1 DAY)" in sql
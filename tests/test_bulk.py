@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import RQLSelect
+from rqlalchemy.query import select
+
+from .fixtures import Base
+from .fixtures import Blog
+from .fixtures import Post
+from .fixtures import User
+
+
+@pytest.fixture
+def bulk_session():
+    # bulk changes run on their own database, to keep the shared fixtures
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        for user_id in range(6):
+            user = User(
+                user_id=user_id, name=f"User {user_id}", state="FL" if user_id % 2 else "TX"
+            )
+            session.add(user)
+            for blog_no in range(user_id % 3):
+                blog = Blog(title=f"Blog {blog_no} of user {user_id}", user=user)
+                session.add(blog)
+                session.add(Post(title=f"Post of blog {blog_no}", blog=blog))
+
+        session.commit()
+        yield session
+
+
+class TestBulk:
+    def test_update(self, bulk_session):
+        count = select(User).rql("eq(state,FL)").rql_update(bulk_session, {"state": "GA"})
+
+        assert count == 3
+        assert select(User).rql("eq(state,GA)").rql("count()").execute(bulk_session) == 3
+        assert not select(User).rql("eq(state,FL)").execute(bulk_session)
+
+    def test_update_synchronizes_session(self, bulk_session):
+        user = bulk_session.get(User, 1)
+
+        select(User).rql("eq(user_id,1)").rql_update(bulk_session, {"name": "Renamed"})
+
+        assert user.name == "Renamed"
+
+    def test_update_relationship_filter(self, bulk_session):
+        count = (
+            select(User)
+            .rql("like((blogs,title),Blog 1*)")
+            .rql_update(bulk_session, {"state": "GA"})
+        )
+        exp = [u.user_id for u in bulk_session.scalars(select(User)) if u.user_id % 3 == 2]
+
+        assert count == len(exp)
+        assert [u.user_id for u in select(User).rql("eq(state,GA)").execute(bulk_session)] == exp
+
+    def test_update_statement_uses_exists(self, bulk_session, caplog):
+        query = select(User).rql("and(eq(state,TX),eq((blogs,posts,title),Post of blog 0))")
+
+        with caplog.at_level("INFO", logger="sqlalchemy.engine"):
+            bulk_session.get_bind().echo = True
+            count = query.rql_update(bulk_session, {"name": "Poster"})
+
+        statements = [r.getMessage() for r in caplog.records if "UPDATE" in r.getMessage()]
+        assert len(statements) == 1
+        assert "WHERE EXISTS (SELECT" in statements[0]
+        assert "FROM user AS user_1 LEFT OUTER JOIN blog" in statements[0]
+
+        assert count == 2
+        assert {u.user_id for u in select(User).rql("eq(name,Poster)").execute(bulk_session)} == {
+            2,
+            4,
+        }
+
+    def test_delete(self, bulk_session):
+        count = select(Post).rql("eq((blog,user,state),FL)").rql_delete(bulk_session)
+
+        assert count == 3
+        assert all(p.blog.user.state == "TX" for p in select(Post).execute(bulk_session))
+
+    def test_delete_without_filters(self, bulk_session):
+        assert select(Post).rql("").rql_delete(bulk_session) == 6
+        assert select(Post).rql("count()").execute(bulk_session) == 0
+
+    def test_synchronize_session_option(self, bulk_session):
+        user = bulk_session.get(User, 1)
+
+        select(User).rql("eq(user_id,1)").rql_update(
+            bulk_session, {"name": "Renamed"}, synchronize_session=False
+        )
+
+        assert user.name == "User 1"
+
+    def test_invalid_attribute(self, bulk_session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("eq(user_id,1)").rql_update(bulk_session, {"blogs": []})
+
+    def test_limit_not_supported(self, bulk_session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("limit(10)").rql_delete(bulk_session)
+
+    def test_other_limits_not_supported(self, bulk_session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("eq(state,FL)", limit=1).rql_delete(bulk_session)
+
+        with pytest.raises(RQLSelectError):
+            select(User).limit(1).rql("eq(state,FL)").rql_delete(bulk_session)
+
+        assert select(User).rql("eq(state,FL)&count()").execute(bulk_session) > 1
+
+    def test_default_limit_ignored(self, bulk_session):
+        with patch.object(RQLSelect, "_rql_default_limit", 1):
+            select(User).rql("eq(state,FL)").rql_update(bulk_session, {"name": "Renamed"})
+
+        names = select(User).rql("eq(state,FL)&values(name)").execute(bulk_session)
+        assert len(names) > 1
+        assert set(names) == {"Renamed"}
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+def compiled(statement):
+    return str(statement.compile()).replace("\n", "")
+
+
+class TestCount:
+    def test_count_without_subquery(self, session, users):
+        query = select(User).rql("state=FL&count()")
+
+        assert "FROM (SELECT" not in compiled(query._rql_statement())
+        assert query.execute(session) == len([u for u in users if u.state == "FL"])
+
+    def test_count_with_limit_uses_subquery(self, session):
+        query = select(User).rql("count()&limit(5)")
+
+        assert "FROM (SELECT" in compiled(query._rql_statement())
+        assert query.execute(session) == 5
+
+    def test_count_drops_unreferenced_joins(self, session, blogs, users):
+        query = select(User).rql("sort(+(blogs,title))&state=FL&count()")
+        statement = compiled(query._rql_statement())
+
+        assert "JOIN" not in statement
+        assert query.execute(session) == len([u for u in users if u.state == "FL"])
+
+    def test_count_distinct_with_one_to_many_join(self, session, posts):
+        query = select(User).rql("like((blogs,posts,title),*Post*)&count()")
+        statement = compiled(query._rql_statement())
+
+        assert "count(DISTINCT" in statement
+        assert query.execute(session) == len({p.blog.user_id for p in posts})
+
+    def test_paginate_count_without_subquery(self, session, users):
+        query = select(User).rql("state=FL&sort(name)&limit(5)")
+        statement = compiled(query._rql_count_statement())
+
+        assert "FROM (SELECT" not in statement
+        assert "ORDER BY" not in statement
+        assert query.rql_paginate(session).total == len([u for u in users if u.state == "FL"])
+
+    def test_paginate_count_with_distinct_uses_subquery(self, session):
+        query = select(User).rql("select(state)&distinct()&limit(5)")
+
+        assert "FROM (SELECT" in compiled(query._rql_count_statement())
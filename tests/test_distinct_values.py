@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import declarative_base
+
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+ValuesBase = declarative_base()
+
+
+class Event(ValuesBase):
+    __tablename__ = "event"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    category = sa.Column(sa.String(20), index=True)
+    source = sa.Column(sa.String(20))
+
+
+@pytest.fixture(scope="module")
+def events_session():
+    engine = create_engine("sqlite:///:memory:")
+    ValuesBase.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        for i in range(200):
+            category = None if i % 17 == 0 else f"category {i % 7}"
+            session.add(Event(id=i, category=category, source=f"source {i % 3}"))
+        session.commit()
+
+        yield session
+
+
+class TestDistinctValues:
+    def test_loose_index_scan(self, events_session):
+        query = select(Event).rql("values(category)&distinct()")
+        sql = str(query._rql_statement("sqlite"))
+
+        assert "WITH RECURSIVE rql_values" in sql
+        assert "DISTINCT" not in sql
+
+        res = query.execute(events_session)
+        exp = {e.category for e in events_session.scalars(select(Event))}
+
+        assert len(res) == len(exp)
+        assert set(res) == exp
+        assert res[:-1] == sorted(res[:-1])
+        assert res[-1] is None
+
+    def test_loose_index_scan_with_filter(self, events_session):
+        res = (
+            select(Event)
+            .rql("values(category)&distinct()&eq(source,source 1)")
+            .execute(events_session)
+        )
+        exp = {e.category for e in events_session.scalars(select(Event)) if e.source == "source 1"}
+
+        assert sorted(res, key=str) == sorted(exp, key=str)
+
+    def test_loose_index_scan_with_limit(self, events_session):
+        res = select(Event).rql("values(category)&distinct()&limit(3,1)").execute(events_session)
+
+        assert res == ["category 1", "category 2", "category 3"]
+
+    def test_loose_index_scan_primary_key(self, events_session):
+        res = select(Event).rql("values(id)&distinct()&lt(id,5)").execute(events_session)
+
+        assert res == [0, 1, 2, 3, 4]
+
+    def test_unindexed_column_uses_group_by(self, events_session):
+        query = select(Event).rql("values(source)&distinct()")
+        sql = str(query._rql_statement("sqlite"))
+
+        assert "GROUP BY event.source" in sql
+        assert sorted(query.execute(events_session)) == ["source 0", "source 1", "source 2"]
+
+    def test_sorted_values_use_group_by(self, events_session):
+        res = (
+            select(Event)
+            .rql("values(category)&distinct()&sort(-category)")
+            .execute(events_session)
+        )
+
+        assert res[:-1] == sorted(res[:-1], reverse=True)
+
+    def test_unsupported_dialect_uses_group_by(self):
+        query = select(Event).rql("values(category)&distinct()")
+
+        assert "GROUP BY" in str(query._rql_statement("mysql"))
+        assert "WITH RECURSIVE" in str(
+            query._rql_statement("postgresql").compile(dialect=postgresql.dialect())
+        )
+
+    def test_values_distinct(self, session, users):
+        res = select(User).rql("values(state)&distinct()").execute(session)
+
+        assert sorted(res) == sorted({u.state for u in users})
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.explain import parse_postgresql_plan
+from rqlalchemy.explain import parse_sqlite_plan
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+class TestExplain:
+    def test_explain_sequential_scan(self, session):
+        res = select(User).rql("state=FL&limit(10)").explain(session)
+
+        assert res.statement.dialect == "sqlite"
+        assert [(s.table, s.kind) for s in res.statement.scans] == [("user", "seq")]
+        assert res.statement.warnings == ["Sequential scan on user"]
+        assert res.count.scans
+
+    def test_explain_unique_index(self, session):
+        res = select(User).rql("guid=abc").explain(session)
+
+        (scan,) = res.statement.scans
+        assert scan.kind == "index"
+        assert scan.index == res.statement.indexes[0]
+        assert not scan.sequential
+        assert res.statement.warnings == []
+
+    def test_explain_primary_key(self, session):
+        res = select(User).rql("user_id=10").explain(session)
+
+        (scan,) = res.statement.scans
+        assert scan.kind == "index"
+        assert scan.index == "user.pk"
+
+    def test_explain_analyze_not_supported(self, session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("user_id=10").explain(session, analyze=True)
+
+    def test_parse_sqlite_plan(self):
+        rows = [
+            (2, 0, 0, "SCAN user"),
+            (5, 0, 0, "SEARCH blog USING COVERING INDEX ix_blog_user (user_id=?)"),
+            (9, 0, 0, "USE TEMP B-TREE FOR ORDER BY"),
+        ]
+        scans = parse_sqlite_plan(rows)
+
+        assert [(s.table, s.kind, s.index) for s in scans] == [
+            ("user", "seq", None),
+            ("blog", "index_only", "ix_blog_user"),
+        ]
+
+    def test_parse_postgresql_plan(self):
+        plan = {
+            "Node Type": "Hash Join",
+            "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "user", "Plan Rows": 50000},
+                {
+                    "Node Type": "Index Scan",
+                    "Relation Name": "blog",
+                    "Index Name": "blog_pkey",
+                    "Plan Rows": 3,
+                },
+            ],
+        }
+        scans = parse_postgresql_plan(plan)
+
+        assert [(s.table, s.kind, s.index, s.rows) for s in scans] == [
+            ("user", "seq", None, 50000),
+            ("blog", "index", "blog_pkey", 3),
+        ]
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from rqlalchemy import RQLInstrument
+from rqlalchemy import RQLSelect
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import select
+
+from .fixtures import Base
+from .fixtures import User
+
+
+@pytest.fixture(scope="module")
+def export_db(tmp_path_factory):
+    path = tmp_path_factory.mktemp("export") / "export.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add(
+            User(
+                user_id=1,
+                name='Quoted "name", with comma',
+                state="FL",
+                balance="$1,234.50",
+                registered="2020-01-02T03:04:05",
+                birthdate="1990-01-01",
+                is_active=True,
+                raw={"tags": ["a", "b"]},
+            )
+        )
+        for user_id in range(2, 11):
+            session.add(User(user_id=user_id, name=f"User {user_id}", state="TX"))
+        session.commit()
+
+    yield path
+
+    engine.dispose()
+
+
+@pytest.fixture
+def export_session(export_db):
+    engine = create_engine(f"sqlite:///{export_db}")
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+class RecordingInstrument(RQLInstrument):
+    def __init__(self):
+        self.events = []
+
+    def record(self, event):
+        self.events.append(event)
+
+
+def ndjson(chunks):
+    return [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+
+
+class TestExport:
+    def test_ndjson_entities(self, export_session):
+        rows = ndjson(select(User).rql("sort(user_id)").rql_export(export_session))
+
+        assert len(rows) == 10
+        assert rows[0]["user_id"] == 1
+        assert rows[0]["name"] == 'Quoted "name", with comma'
+        assert rows[0]["registered"] == "2020-01-02T03:04:05"
+        assert rows[0]["birthdate"] == "1990-01-01"
+        assert rows[0]["is_active"] is True
+        assert rows[0]["raw"] == {"tags": ["a", "b"]}
+        assert rows[1]["balance"] is None
+
+    def test_ndjson_fields(self, export_session):
+        rows = ndjson(
+            select(User).rql("and(fields(name),sort(user_id))").rql_export(export_session)
+        )
+
+        assert rows[0] == {"user_id": 1, "name": 'Quoted "name", with comma'}
+
+    def test_ndjson_deferred_columns(self, export_session):
+        with patch.object(RQLSelect, "_rql_default_deferred_columns", ("raw", "misc")):
+            rows = ndjson(select(User).rql("sort(user_id)").rql_export(export_session))
+
+        assert "raw" not in rows[0]
+        assert "misc" not in rows[0]
+        assert rows[0]["name"] == 'Quoted "name", with comma'
+
+    def test_instrumented(self, export_session):
+        instrument = RecordingInstrument()
+        with patch.object(RQLSelect, "_rql_instruments", (instrument,)):
+            list(select(User).rql("sort(user_id)").rql_export(export_session, chunk_size=4))
+
+        event = instrument.events[-1]
+        assert event.operation == "rql_export"
+        assert event.rows == 10
+
+    def test_ndjson_decimal_precision(self, export_session):
+        chunks = select(User).rql("and(eq(user_id,1),select(balance))").rql_export(export_session)
+        text = b"".join(chunks).decode()
+
+        assert text == '{"balance":1234.50}\n'
+        assert json.loads(text, parse_float=Decimal)["balance"] == Decimal("1234.50")
+
+    def test_ndjson_values(self, export_session):
+        chunks = select(User).rql("and(lt(user_id,4),values(name),sort(user_id))")
+        rows = ndjson(chunks.rql_export(export_session))
+
+        assert rows == ['Quoted "name", with comma', "User 2", "User 3"]
+
+    def test_csv(self, export_session):
+        query = select(User).rql("and(select(user_id,name,registered),sort(user_id))")
+        text = b"".join(query.rql_export(export_session, "csv")).decode()
+        rows = list(csv.reader(io.StringIO(text)))
+
+        assert rows[0] == ["user_id", "name", "registered"]
+        assert rows[1] == ["1", 'Quoted "name", with comma', "2020-01-02T03:04:05"]
+        assert rows[2] == ["2", "User 2", ""]
+        assert len(rows) == 11
+
+    def test_csv_aggregate(self, export_session):
+        query = select(User).rql("and(aggregate(state,count(user_id)),sort(state))")
+        text = b"".join(query.rql_export(export_session, "csv")).decode()
+
+        assert text == "state,count\nFL,1\nTX,9\n"
+
+    def test_chunks(self, export_session):
+        chunks = list(select(User).rql("sort(user_id)").rql_export(export_session, chunk_size=3))
+
+        assert [len(chunk.splitlines()) for chunk in chunks] == [3, 3, 3, 1]
+
+    def test_csv_header_chunk(self, export_session):
+        query = select(User).rql("and(select(user_id),sort(user_id))")
+        chunks = list(query.rql_export(export_session, "csv", chunk_size=5))
+
+        assert chunks[0] == b"user_id\n"
+        assert len(chunks) == 3
+
+    def test_limit(self, export_session):
+        rows = ndjson(
+            select(User).rql("and(sort(-user_id),limit(2,1))").rql_export(export_session)
+        )
+        assert [row["user_id"] for row in rows] == [9, 8]
+
+    def test_invalid_format(self, export_session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("").rql_export(export_session, "xml")
+
+    def test_scalar_aggregate(self, export_session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("count()").rql_export(export_session)
+
+    def test_async(self, export_db):
+        pytest.importorskip("aiosqlite")
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        async def export():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{export_db}")
+            chunks = []
+            async with AsyncSession(engine) as session:
+                query = select(User).rql("and(select(user_id,state),sort(user_id))")
+                async for chunk in query.rql_export_async(session, chunk_size=4, timeout=5):
+                    chunks.append(chunk)
+            await engine.dispose()
+            return chunks
+
+        instrument = RecordingInstrument()
+        with patch.object(RQLSelect, "_rql_instruments", (instrument,)):
+            chunks = asyncio.run(export())
+
+        assert len(chunks) == 3
+        event = instrument.events[-1]
+        assert event.operation == "rql_export"
+        assert event.rows == 10
+        assert ndjson(chunks)[:2] == [{"user_id": 1, "state": "FL"}, {"user_id": 2, "state": "TX"}]
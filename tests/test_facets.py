@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+def counts(values, top=None):
+    return dict(Counter(values).most_common(top))
+
+
+class TestFacets:
+    def test_facets(self, session, users):
+        res = select(User).rql("is_active=true&limit(10)").rql_facets(session, ["state", "gender"])
+        active = [u for u in users if u.is_active]
+
+        assert res == {
+            "state": counts(u.state for u in active),
+            "gender": counts(u.gender for u in active),
+        }
+        assert list(res["state"].values()) == sorted(res["state"].values(), reverse=True)
+
+    def test_facets_operator_with_top(self, session, users):
+        res = select(User).rql("facets(state,gender,3)&limit(10)").rql_facets(session)
+
+        assert len(res["state"]) == 3
+        assert sorted(res["state"].values()) == sorted(
+            counts((u.state for u in users), 3).values()
+        )
+        assert res["gender"] == counts(u.gender for u in users)
+
+    def test_facets_json_path(self, session, users):
+        res = select(User).rql("facets((misc,eye_color))").rql_facets(session)
+
+        assert res == {"eye_color": counts(u.misc["eye_color"] for u in users)}
+
+    def test_facets_does_not_change_execute(self, session):
+        res = select(User).rql("facets(state)&limit(5)").execute(session)
+        assert len(res) == 5
+
+    def test_facets_require_attributes(self, session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("limit(5)").rql_facets(session)
+
+    def test_facets_grouping_sets(self):
+        session = MagicMock()
+        session.get_bind.return_value.dialect.name = "postgresql"
+        session.execute.return_value = [("FL", None, 0, 1, 20), (None, "male", 1, 0, 500)]
+
+        res = select(User).rql("is_active=true").rql_facets(session, ["state", "gender"], top=5)
+        (query,) = session.execute.call_args[0]
+        statement = str(query.compile(dialect=postgresql.dialect()))
+
+        assert 'GROUP BY GROUPING SETS(("user".state), ("user".gender))' in statement
+        assert "row_number() OVER (PARTITION BY grouping" in statement
+        assert res == {"state": {"FL": 20}, "gender": {"male": 500}}
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+@pytest.fixture
+def fresh_session(session, engine):
+    with Session(engine) as fresh:
+        yield fresh
+
+
+class TestFields:
+    def test_fields_loads_only_given_columns(self, fresh_session, users):
+        query = select(User).rql("fields(name,state)&state=FL")
+        res = query.execute(fresh_session)
+
+        assert "raw" not in str(query.compile())
+        assert [u.user_id for u in res] == [u.user_id for u in users if u.state == "FL"]
+        assert {"raw", "misc", "email"} <= inspect(res[0]).unloaded
+        assert not {"name", "state"} & inspect(res[0]).unloaded
+
+    def test_fields_invalid_attribute(self):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("fields((misc,eye_color))")
+
+    def test_fields_relationship(self, blogs):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("fields((blogs,title))")
+
+    @patch("rqlalchemy.RQLSelect._rql_default_deferred_columns", ("raw", "misc"))
+    def test_default_deferred_columns(self, fresh_session):
+        query = select(User).rql("limit(5)")
+        res = query.execute(fresh_session)
+
+        assert "raw" not in str(query.compile())
+        assert len(res) == 5
+        assert {"raw", "misc"} <= inspect(res[0]).unloaded
+        assert "name" not in inspect(res[0]).unloaded
+
+        # deferred columns are loaded on access
+        assert res[0].raw["index"] == res[0].user_id
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+import pytest
+
+from rqlalchemy import RQLInstrument
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+class RecordingInstrument(RQLInstrument):
+    def __init__(self):
+        self.events = []
+
+    def record(self, event):
+        self.events.append(event)
+
+
+@pytest.fixture
+def instrument():
+    instrument = RecordingInstrument()
+    with patch("rqlalchemy.RQLSelect._rql_instruments", (instrument,)):
+        yield instrument
+
+
+class TestInstrumentation:
+    def test_disabled_by_default(self, session):
+        res = select(User).rql("state=FL").execute(session)
+        assert res
+
+    def test_rql_stages(self, instrument):
+        select(User).rql("and(eq(state,FL),like((blogs,title),*1*))")
+
+        (event,) = instrument.events
+        assert event.operation == "rql"
+        assert event.expression == "and(eq(state,FL),like((blogs,title),*1*))"
+        assert set(event.stages) == {"parse", "walk", "build"}
+        assert event.joins == 1
+        assert event.ast_size == 3
+        assert event.rows is None
+
+    def test_execute_stages(self, session, instrument):
+        query = select(User).rql("select(user_id,state)&state=FL")
+        res = query.execute(session)
+
+        event = instrument.events[-1]
+        assert event.operation == "execute"
+        assert set(event.stages) == {"compile", "database", "fetch", "shape"}
+        assert event.rows == len(res)
+        assert event.duration >= sum(event.stages.values()) - 1e-6
+
+    def test_execute_scalar(self, session, instrument):
+        res = select(User).rql("count()").execute(session)
+
+        event = instrument.events[-1]
+        assert res == 1000
+        assert event.rows == 1
+
+    def test_cache_hit(self, session, instrument):
+        select(User).rql("state=TX&limit(3)").execute(session)
+        select(User).rql("state=TX&limit(3)").execute(session)
+
+        assert instrument.events[-1].cache_hit is True
+
+    def test_paginate(self, session, instrument):
+        res = select(User).rql("state=FL&limit(5)").rql_paginate(session)
+
+        event = instrument.events[-1]
+        assert event.operation == "rql_paginate"
+        assert event.rows == len(res.page) == 5
+        assert [e.operation for e in instrument.events] == ["rql", "rql_paginate"]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects import sqlite
+
+from rqlalchemy.jsonpaths import JSONPathRegistry
+from rqlalchemy.query import select
+
+from .fixtures import User
+
+
+@pytest.fixture
+def registry():
+    registry = JSONPathRegistry()
+    with patch("rqlalchemy.RQLSelect._rql_json_paths", registry):
+        yield registry
+
+
+class TestJSONPaths:
+    def test_mapped_column(self, session, users, registry):
+        registry.register(User, ("raw", "state"), column="state")
+
+        query = select(User).rql("in((raw,state),(FL,TX))&sort((raw,state))")
+        res = query.execute(session)
+        exp = sorted([u for u in users if u.state in ("FL", "TX")], key=lambda u: u.state)
+
+        assert "json" not in str(query.compile()).lower()
+        assert res == exp
+
+    def test_expression(self, session, users, registry):
+        registry.register(User, ("misc", "unread_messages"), int)
+
+        res = select(User).rql("ge((misc,unread_messages),8)").execute(session)
+        exp = [u for u in users if u.misc["unread_messages"] >= 8]
+        assert res
+        assert res == exp
+
+        res = select(User).rql("in((misc,unread_messages),(1,2))").execute(session)
+        exp = [u for u in users if u.misc["unread_messages"] in (1, 2)]
+        assert res
+        assert res == exp
+
+    def test_select_expression(self, session, users, registry):
+        registry.register(User, ("misc", "preferences", "favorite_fruit"))
+
+        res = (
+            select(User).rql("select(user_id,(misc,preferences,favorite_fruit))").execute(session)
+        )
+        exp = [
+            {"user_id": u.user_id, "favorite_fruit": u.misc["preferences"]["favorite_fruit"]}
+            for u in users
+        ]
+        assert res == exp
+
+    def test_expression_matches_index(self, session, registry):
+        registry.register(User, ("misc", "unread_messages"), int, index="ix_user_unread")
+        (ddl,) = registry.ddl(User, session.get_bind().dialect)
+
+        session.execute(text(ddl))
+        try:
+            plan = select(User).rql("eq((misc,unread_messages),8)").explain(session)
+        finally:
+            session.execute(text("DROP INDEX ix_user_unread"))
+
+        assert plan.statement.indexes == ["ix_user_unread"]
+
+    def test_ddl(self, registry):
+        registry.register(User, ("misc", "unread_messages"), int)
+        registry.register(User, ("misc", "eye_color"), column="eye_color", index="ix_eye")
+
+        assert registry.ddl(User, sqlite.dialect()) == [
+            "CREATE INDEX ix_user_misc_unread_messages ON user "
+            "(CAST(json_extract(misc, '$.\"unread_messages\"') AS INTEGER))",
+            "ALTER TABLE user ADD COLUMN eye_color VARCHAR(255) "
+            "GENERATED ALWAYS AS (json_extract(misc, '$.\"eye_color\"')) VIRTUAL",
+            "CREATE INDEX ix_eye ON user (eye_color)",
+        ]
+
+        assert registry.ddl(User, postgresql.dialect())[0] == (
+            'CREATE INDEX ix_user_misc_unread_messages ON "user" '
+            "(CAST((misc #>> '{\"unread_messages\"}') AS INTEGER))"
+        )
+
+        assert registry.ddl(User, mysql.dialect())[0] == (
+            "CREATE INDEX ix_user_misc_unread_messages ON user "
+            "((CAST(JSON_EXTRACT(misc, '$.\"unread_messages\"') AS SIGNED)))"
+        )
+
+    def test_unregistered_paths_unchanged(self, registry):
+        registry.register(User, ("misc", "eye_color"), column="state")
+
+        query = select(User).rql("eq((misc,likes_apples),true)")
+        assert "json" in str(query.compile(dialect=sqlite.dialect())).lower()
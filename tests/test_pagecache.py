@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from rqlalchemy.pagecache import RQLPageCache
+from rqlalchemy.query import RQLSelect
+from rqlalchemy.query import select
+
+from .fixtures import Base
+from .fixtures import User
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        for user_id in range(25):
+            session.add(User(user_id=user_id, name=f"User {user_id}", state="FL"))
+        session.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    engine.statements = statements
+
+    yield engine
+
+    engine.dispose()
+
+
+@pytest.fixture
+def cache():
+    cache = RQLPageCache(pages=3, ttl=60)
+    with patch.object(RQLSelect, "_rql_page_cache", cache):
+        yield cache
+
+
+def browse(session, expression):
+    pages = []
+    while expression is not None:
+        res = select(User).rql(expression).rql_paginate(session)
+        pages.append([user.user_id for user in res.page])
+        expression = res.next_page
+    return pages
+
+
+class TestPageCache:
+    def test_pages_match_uncached(self, engine, cache):
+        with Session(engine) as session:
+            cached = browse(session, "and(eq(state,FL),sort(user_id),limit(4))")
+
+        with patch.object(RQLSelect, "_rql_page_cache", None), Session(engine) as session:
+            uncached = browse(session, "and(eq(state,FL),sort(user_id),limit(4))")
+
+        assert cached == uncached
+        assert [user_id for page in cached for user_id in page] == list(range(25))
+
+    def test_next_pages_served_from_cache(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+            assert len(cache) == 2
+
+            del engine.statements[:]
+            res = select(User).rql(res.next_page).rql_paginate(session)
+
+            assert [user.user_id for user in res.page] == [5, 6, 7, 8, 9]
+            assert res.total == 25
+            assert res.previous_page is not None
+            assert not engine.statements
+
+            res = select(User).rql(res.next_page).rql_paginate(session)
+            assert [user.user_id for user in res.page] == [10, 11, 12, 13, 14]
+            assert not engine.statements
+
+            # the fourth page is fetched, with the two after it
+            res = select(User).rql(res.next_page).rql_paginate(session)
+            assert [user.user_id for user in res.page] == [15, 16, 17, 18, 19]
+            assert len(engine.statements) == 2
+
+    def test_cached_entities_merged(self, engine, cache):
+        with Session(engine) as session:
+            next_page = select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+            next_page = next_page.next_page
+
+        with Session(engine) as session:
+            res = select(User).rql(next_page).rql_paginate(session)
+            assert all(user in session for user in res.page)
+            assert res.page[0] is session.get(User, 5)
+
+    def test_cached_entities_not_shared(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+            # expires the instances loaded by the session
+            session.commit()
+
+        with Session(engine) as session:
+            del engine.statements[:]
+            first = select(User).rql(res.next_page).rql_paginate(session)
+            assert [user.name for user in first.page] == [f"User {i}" for i in range(5, 10)]
+            assert not engine.statements
+
+        with Session(engine) as session:
+            second = select(User).rql(res.next_page).rql_paginate(session)
+            assert not any(a is b for (a, b) in zip(first.page, second.page))
+
+            second.page[0].name = "Renamed"
+            third = select(User).rql(res.next_page).rql_paginate(Session(engine))
+            assert third.page[0].name == "User 5"
+
+    def test_pending_changes_kept(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+            session.get(User, 6).name = "Dirty"
+
+            res = select(User).rql(res.next_page).rql_paginate(session)
+            assert res.page[1].name == "Dirty"
+            assert res.page[1] is session.get(User, 6)
+
+    def test_session_entities_kept(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+            user = session.get(User, 6)
+
+            res = select(User).rql(res.next_page).rql_paginate(session)
+            assert res.page[1] is user
+            assert not session.dirty
+
+    def test_deferred_columns_loaded(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(fields(user_id),sort(user_id),limit(5))")
+            res = select(User).rql(res.rql_paginate(session).next_page).rql_paginate(session)
+
+            del engine.statements[:]
+            assert res.page[0].name == "User 5"
+            assert len(engine.statements) == 1
+
+    def test_values_cached(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(values(user_id),sort(user_id),limit(10))")
+            res = res.rql_paginate(session)
+            res = select(User).rql(res.next_page).rql_paginate(session)
+
+        assert res.page == list(range(10, 20))
+
+    def test_other_criteria_not_shared(self, engine, cache):
+        with Session(engine) as session:
+            query = select(User).where(User.user_id >= 10).rql("and(sort(user_id),limit(5))")
+            next_page = query.rql_paginate(session).next_page
+
+            res = select(User).rql(next_page).rql_paginate(session)
+
+        assert [user.user_id for user in res.page] == [5, 6, 7, 8, 9]
+
+    def test_ttl(self, engine, cache):
+        cache.ttl = 0
+
+        with Session(engine) as session:
+            select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+            assert cache.get(next(iter(cache._pages))) is None
+
+    def test_max_pages(self, engine):
+        cache = RQLPageCache(pages=5, max_pages=3)
+
+        with patch.object(RQLSelect, "_rql_page_cache", cache), Session(engine) as session:
+            select(User).rql("and(sort(user_id),limit(2))").rql_paginate(session)
+
+        assert len(cache) == 3
+
+    def test_invalidated_on_flush(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+            assert len(cache) == 2
+
+            session.get(User, 6).name = "Renamed"
+            session.commit()
+            assert not len(cache)
+
+            res = select(User).rql(res.next_page).rql_paginate(session)
+            assert res.page[1].name == "Renamed"
+
+    def test_invalidated_on_bulk_update(self, engine, cache):
+        with Session(engine) as session:
+            res = select(User).rql("and(sort(user_id),limit(5))").rql_paginate(session)
+
+            select(User).rql("eq(user_id,6)").rql_update(session, {"name": "Renamed"})
+            assert not len(cache)
+
+            res = select(User).rql(res.next_page).rql_paginate(session)
+            assert res.page[1].name == "Renamed"
+
+    def test_scalars_not_cached(self, engine, cache):
+        with Session(engine) as session:
+            select(User).rql("and(count(),limit(5))").execute(session)
+
+        assert not len(cache)
+
+    def test_invalid_pages(self):
+        with pytest.raises(ValueError):
+            RQLPageCache(pages=1)
@@ -146,6 +146,48 @@ class TestQuery:
         exp = len(users)
         assert res == exp
 
+    def test_multiple_aggregates(self, session, users):
+        res = select(User).rql("count()&sum(balance)&max(balance)").execute(session)
+        exp = {
+            "count": len(users),
+            "sum": sum(u.balance for u in users),
+            "max": max(u.balance for u in users),
+        }
+        assert res == exp
+
+    def test_multiple_aggregates_same_function(self, session, users):
+        res = select(User).rql("max(balance)&max(registered)&state=FL").execute(session)
+        exp = {
+            "max": max(u.balance for u in users if u.state == "FL"),
+            "max_registered": max(u.registered for u in users if u.state == "FL"),
+        }
+        assert res == exp
+
+    def test_filtered_count(self, session, users):
+        res = select(User).rql("count(filter(eq(is_active,true)))").execute(session)
+        exp = len([u for u in users if u.is_active])
+        assert res == exp
+
+    def test_filtered_aggregates(self, session, users):
+        res = (
+            select(User)
+            .rql(
+                "count()&count(filter(eq(is_active,true)))&sum(balance,filter(eq(gender,female)))"
+            )
+            .execute(session)
+        )
+        exp = {
+            "count": len(users),
+            "count_1": len([u for u in users if u.is_active]),
+            "sum": sum(u.balance for u in users if u.gender == "female"),
+        }
+        assert res == exp
+
+    def test_multiple_aggregates_with_limit(self, session, users):
+        res = select(User).rql("count()&sum(balance)&sort(user_id)&limit(10)").execute(session)
+        exp = {"count": 10, "sum": sum(u.balance for u in users[:10])}
+        assert res == exp
+
     @pytest.mark.parametrize("user_id", (1, 2, 3))
     def test_eq_operator(self, session, user_id, users):
         res = select(User).rql("user_id={}".format(user_id)).execute(session)
@@ -195,6 +237,42 @@ class TestQuery:
         assert res
         assert res == exp
 
+    def test_aggregate_having(self, session, users):
+        res = (
+            select(User).rql("aggregate(state,count(user_id))&gt(count,15)&sort(-count)&limit(5)")
+        ).execute(session)
+
+        counts = {}
+        for user in users:
+            counts[user.state] = counts.get(user.state, 0) + 1
+
+        exp = sorted(
+            ({"state": k, "count": v} for k, v in counts.items() if v > 15),
+            key=lambda r: -r["count"],
+        )[:5]
+
+        assert res
+        assert [r["count"] for r in res] == [r["count"] for r in exp]
+        assert all(r["count"] > 15 for r in res)
+
+    def test_aggregate_having_with_where(self, session, users):
+        query = select(User).rql("and(eq(is_active,true),aggregate(state,sum(balance)),gt(sum,0))")
+        sql = str(query._rql_statement())
+
+        assert 'WHERE "user".is_active' in sql
+        assert 'HAVING sum("user".balance) >' in sql
+
+        res = query.execute(session)
+        assert res
+        assert all(r["sum"] > 0 for r in res)
+
+    def test_aggregate_having_paginate(self, session, users):
+        query = select(User).rql("aggregate(state,count(user_id))&gt(count,15)&limit(100)")
+        page = query.rql_paginate(session)
+
+        assert page.page
+        assert page.total == len(page.page)
+
     def test_like_with_relationship_1_deep(self, session, blogs, users):
         res = select(User).rql("like((blogs, title), *1*)").execute(session)
         exp = [b.user for b in blogs if "1" in b.title]
@@ -1,10 +1,28 @@
+from unittest.mock import patch
+
+import sqlalchemy as sa
 from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import declarative_base
 
 from rqlalchemy import select
 
 from .fixtures import User
 from .test_query import to_dict
 
+JSONBBase = declarative_base()
+
+
+class Document(JSONBBase):
+    __tablename__ = "document"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    data = sa.Column(postgresql.JSONB)
+
+
+def compiled(query):
+    return str(query.compile(dialect=postgresql.dialect())).replace("\n", "")
+
 
 class TestQueryJSON:
     def test_simple_sort(self, session, users):
@@ -211,3 +229,45 @@ class TestQueryInvalidJSON:
         exp = [{"invalid": None} for _ in users]
         assert res
         assert res == exp
+
+
+class TestQueryJSONB:
+    def test_eq_compiles_to_containment(self):
+        query = select(Document).rql("eq((data,eye_color),blue)")
+
+        assert "WHERE document.data @> %(data_1)s" in compiled(query)
+        assert query.compile().params["data_1"] == {"eye_color": "blue"}
+
+    def test_eq_nested_path(self):
+        query = select(Document).rql("eq((data,preferences,favorite_fruit),banana)")
+
+        params = query.compile(dialect=postgresql.dialect()).params
+        assert params["data_1"] == {"preferences": {"favorite_fruit": "banana"}}
+
+    def test_in_compiles_to_containment(self):
+        query = select(Document).rql("in((data,unread_messages),(1,2))")
+
+        assert "(document.data @> %(data_1)s::JSONB) OR (document.data @> %(data_2)s::JSONB)" in (
+            compiled(query)
+        )
+
+    def test_array_index_is_not_containment(self):
+        query = select(Document).rql("eq((data,location,coordinates,1),10)")
+
+        assert "@>" not in compiled(query)
+
+    def test_null_is_not_containment(self):
+        query = select(Document).rql("eq((data,eye_color),null)")
+
+        assert "@>" not in compiled(query)
+
+    def test_range_is_not_containment(self):
+        query = select(Document).rql("gt((data,unread_messages),1)")
+
+        assert "@>" not in compiled(query)
+
+    @patch("rqlalchemy.RQLSelect._rql_jsonb_containment", False)
+    def test_containment_disabled(self):
+        query = select(Document).rql("eq((data,eye_color),blue)")
+
+        assert "@>" not in compiled(query)
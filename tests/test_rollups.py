@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import func
+
+from rqlalchemy.query import RQLSelect
+from rqlalchemy.query import select
+from rqlalchemy.rollups import RollupRegistry
+
+from .fixtures import User
+
+metadata = sa.MetaData()
+
+user_rollup = sa.Table(
+    "user_rollup",
+    metadata,
+    sa.Column("state", sa.String(2)),
+    sa.Column("gender", sa.String(6)),
+    sa.Column("active", sa.Boolean),
+    sa.Column("users", sa.Integer),
+    sa.Column("balances", sa.Integer),
+    sa.Column("balance_total", sa.Numeric(12, 2)),
+    sa.Column("balance_min", sa.Numeric(9, 2)),
+    sa.Column("balance_max", sa.Numeric(9, 2)),
+)
+
+
+@pytest.fixture(scope="module")
+def rollup_table(session):
+    engine = session.get_bind()
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        columns = [User.state, User.gender, User.is_active]
+        connection.execute(
+            user_rollup.insert().from_select(
+                [c.name for c in user_rollup.c],
+                sa.select(
+                    *columns,
+                    func.count(),
+                    func.count(User.balance),
+                    func.sum(User.balance),
+                    func.min(User.balance),
+                    func.max(User.balance),
+                ).group_by(*columns),
+            )
+        )
+
+    yield user_rollup
+
+    metadata.drop_all(engine)
+
+
+@pytest.fixture
+def registry(rollup_table):
+    registry = RollupRegistry()
+    registry.register(
+        User,
+        rollup_table,
+        dimensions={"state": "state", "gender": "gender", "is_active": "active"},
+        measures={
+            "users": "count()",
+            "balances": "count(balance)",
+            "balance_total": "sum(balance)",
+            "balance_min": "min(balance)",
+            "balance_max": "max(balance)",
+        },
+    )
+
+    with patch.object(RQLSelect, "_rql_rollups", registry):
+        yield registry
+
+
+def reads_rollup(query):
+    sql = str(query._rql_statement().compile())
+    return "FROM user_rollup" in sql and "FROM user " not in sql + " "
+
+
+def same_results(session, registry, expr):
+    query = select(User).rql(expr)
+    res = query.execute(session)
+
+    with patch.object(RQLSelect, "_rql_rollups", RollupRegistry()):
+        exp = select(User).rql(expr).execute(session)
+
+    assert reads_rollup(query)
+    assert res == exp
+    return res
+
+
+class TestRollups:
+    def test_aggregate(self, session, registry):
+        res = same_results(
+            session, registry, "and(aggregate(state,gender,count(user_id)),sort(state,gender))"
+        )
+        assert sum(r["count"] for r in res) == 1000
+
+    def test_aggregate_measures(self, session, registry):
+        same_results(
+            session,
+            registry,
+            "and(aggregate(state,sum(balance),min(balance),max(balance)),sort(state))",
+        )
+
+    def test_aggregate_filtered(self, session, registry):
+        same_results(
+            session,
+            registry,
+            "and(eq(is_active,true),in(state,(FL,TX,CA)),aggregate(gender,count(user_id)),"
+            "sort(gender))",
+        )
+
+    def test_aggregate_having(self, session, registry):
+        same_results(
+            session,
+            registry,
+            "and(aggregate(state,count(user_id)),gt(count,15),sort(-count,+state))",
+        )
+
+    def test_aggregate_paginate(self, session, registry):
+        query = select(User).rql("and(aggregate(state,count(user_id)),sort(state),limit(5,10))")
+        res = query.rql_paginate(session)
+
+        assert reads_rollup(query)
+        assert [r["state"] for r in res.page] == sorted({u.state for u in session.query(User)})[
+            10:15
+        ]
+        assert res.total == len({u.state for u in session.query(User)})
+
+    def test_scalar(self, session, registry):
+        same_results(session, registry, "and(eq(state,FL),count())")
+
+    def test_scalars(self, session, registry):
+        res = same_results(
+            session, registry, "and(eq(gender,female),count(),sum(balance),max(balance))"
+        )
+        assert set(res) == {"count", "sum", "max"}
+
+    def test_scalar_filter(self, session, registry):
+        same_results(session, registry, "and(count(filter(eq(state,FL))),count())")
+
+    def test_mean(self, session, registry):
+        query = select(User).rql("and(eq(state,FL),mean(balance))")
+        res = query.execute(session)
+
+        with patch.object(RQLSelect, "_rql_rollups", RollupRegistry()):
+            exp = select(User).rql("and(eq(state,FL),mean(balance))").execute(session)
+
+        assert reads_rollup(query)
+        assert res == pytest.approx(float(exp))
+
+    @pytest.mark.parametrize(
+        "expr",
+        [
+            # group attribute, filter or measure missing from the rollup
+            "aggregate(city,count(user_id))",
+            "and(eq(city,Miami),count())",
+            "sum(user_id)",
+            # not additive
+            "approx_count_distinct(state)",
+            # over limited rows
+            "and(count(),limit(10))",
+            "and(eq((blogs,title),x),count())",
+            "and(sample(10),count())",
+            "and(aggregate(bucket(registered,day),count(user_id)))",
+        ],
+    )
+    def test_not_covered(self, registry, expr):
+        assert not reads_rollup(select(User).rql(expr))
+
+    def test_first_covering_rollup(self, registry, rollup_table):
+        by_state = sa.Table(
+            "user_state_rollup",
+            sa.MetaData(),
+            sa.Column("state", sa.String(2)),
+            sa.Column("users", sa.Integer),
+        )
+        registry.unregister(User)
+        registry.register(User, by_state, ["state"], {"users": "count()"})
+        registry.register(User, rollup_table, ["state", "gender"], {"users": "count()"})
+
+        sql = str(select(User).rql("aggregate(state,count(user_id))")._rql_statement().compile())
+        assert "FROM user_state_rollup" in sql
+
+        sql = str(select(User).rql("aggregate(gender,count(user_id))")._rql_statement().compile())
+        assert "FROM user_rollup" in sql
+
+    def test_invalid_measure(self, rollup_table):
+        with pytest.raises(ValueError):
+            RollupRegistry().register(User, rollup_table, ["state"], {"users": "mean(balance)"})
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from rqlalchemy.query import select
+from rqlalchemy.routing import RQLRoutingPolicy
+from rqlalchemy.routing import is_pinned
+from rqlalchemy.routing import unpin
+
+from .fixtures import Base
+from .fixtures import User
+
+
+@pytest.fixture
+def engines(tmp_path):
+    # each database has a different number of users, to tell them apart
+    engines = {}
+    for size, name in enumerate(["primary", "replica1", "replica2", "analytics"], 1):
+        engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            for user_id in range(size):
+                session.add(User(user_id=user_id, name=name, state="FL"))
+            session.commit()
+        engines[name] = engine
+
+    yield engines
+
+    for engine in engines.values():
+        engine.dispose()
+
+
+@pytest.fixture
+def policy(engines):
+    policy = RQLRoutingPolicy(
+        engines["primary"],
+        replicas=[engines["replica1"], engines["replica2"]],
+        analytics=engines["analytics"],
+    )
+    with patch("rqlalchemy.RQLSelect._rql_routing", policy):
+        yield policy
+
+
+class TestRouting:
+    def test_reads_go_to_replicas(self, engines, policy):
+        with Session(engines["primary"]) as session:
+            first = select(User).rql("values(name)").execute(session)
+            second = select(User).rql("values(name)").execute(session)
+
+        assert {first[0], second[0]} == {"replica1", "replica2"}
+
+    def test_aggregates_go_to_analytics(self, engines, policy):
+        with Session(engines["primary"]) as session:
+            assert select(User).rql("count()").execute(session) == 4
+            assert select(User).rql("aggregate(state,count(user_id))").execute(session) == [
+                {"state": "FL", "count": 4}
+            ]
+            assert select(User).rql_facets(session, ["name"]) == {"name": {"analytics": 4}}
+
+    def test_paginate_counts_on_analytics(self, engines, policy):
+        with Session(engines["primary"]) as session:
+            res = select(User).rql("limit(1)").rql_paginate(session)
+
+        assert res.page[0].name.startswith("replica")
+        assert res.total == 4
+
+    def test_primary_without_replicas(self, engines):
+        policy = RQLRoutingPolicy(engines["primary"], analytics=engines["analytics"])
+        with patch("rqlalchemy.RQLSelect._rql_routing", policy):
+            with Session(engines["replica1"]) as session:
+                assert select(User).rql("values(name)").execute(session) == ["primary"]
+
+    def test_pinned_after_flush(self, engines, policy):
+        with Session(engines["primary"]) as session:
+            assert not is_pinned(session)
+
+            session.add(User(user_id=10, name="primary"))
+            session.flush()
+
+            assert is_pinned(session)
+            assert select(User).rql("count()").execute(session) == 2
+            assert {u.name for u in select(User).rql("").execute(session)} == {"primary"}
+
+            unpin(session)
+            assert select(User).rql("count()").execute(session) == 4
+
+    def test_pinned_after_bulk_update(self, engines, policy):
+        with Session(engines["primary"]) as session:
+            select(User).rql("eq(user_id,0)").rql_update(session, {"state": "TX"})
+
+            assert is_pinned(session)
+            assert select(User).rql("eq(state,TX)&values(name)").execute(session) == ["primary"]
+
+    def test_no_routing(self, engines):
+        with Session(engines["replica2"]) as session:
+            assert select(User).rql("count()").execute(session) == 3
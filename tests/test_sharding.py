@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import create_engine
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import select
+from rqlalchemy.sharding import RQLShardedExecutor
+
+from .fixtures import Base
+from .fixtures import User
+
+SHARDS = 3
+
+
+@pytest.fixture(scope="module")
+def shards(session, tmp_path_factory):
+    # the users are split by id across the shards
+    path = tmp_path_factory.mktemp("shards")
+    rows = [dict(row) for row in session.execute(sa.select(User.__table__)).mappings()]
+
+    engines = []
+    for shard in range(SHARDS):
+        engine = create_engine(f"sqlite:///{path / str(shard)}.db")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                sa.insert(User.__table__), [r for r in rows if r["user_id"] % SHARDS == shard]
+            )
+        engines.append(engine)
+
+    with RQLShardedExecutor(engines) as executor:
+        yield executor
+
+    for engine in engines:
+        engine.dispose()
+
+
+def ids(users):
+    return [u.user_id for u in users]
+
+
+class TestSharding:
+    @pytest.mark.parametrize(
+        "expr",
+        [
+            "sort(+balance,+user_id)",
+            "sort(-balance,+user_id)",
+            "eq(state,FL)&sort(+name,+user_id)",
+            "sort(-registered,+user_id)&limit(10)",
+            "sort(+state,-balance,+user_id)&limit(15,30)",
+            "is_active=true&sort(+birthdate,+user_id)&limit(5,490)",
+        ],
+    )
+    def test_sorted_entities(self, session, shards, expr):
+        res = shards.execute(select(User).rql(expr))
+        exp = select(User).rql(expr).execute(session)
+
+        assert ids(res) == ids(exp)
+
+    def test_unsorted_limit(self, session, shards):
+        res = shards.execute(select(User).rql("limit(10,5)"))
+
+        assert len(res) == 10
+        assert len(set(ids(res))) == 10
+
+    def test_select(self, session, shards):
+        expr = "select(user_id,state,balance)&sort(-balance)&limit(20)"
+
+        assert shards.execute(select(User).rql(expr)) == select(User).rql(expr).execute(session)
+
+    def test_values(self, session, shards):
+        expr = "values(state)&distinct()&sort(state)"
+
+        assert shards.execute(select(User).rql(expr)) == select(User).rql(expr).execute(session)
+
+    @pytest.mark.parametrize(
+        "expr", ["select(state)&distinct()&sort(state)", "select(state,gender)&distinct()"]
+    )
+    def test_select_distinct(self, session, shards, expr):
+        res = shards.execute(select(User).rql(expr))
+        exp = select(User).rql(expr).execute(session)
+
+        assert sorted(res, key=str) == sorted(exp, key=str)
+
+    @pytest.mark.parametrize(
+        "expr",
+        [
+            "count()",
+            "eq(state,FL)&count()",
+            "sum(balance)",
+            "min(birthdate)",
+            "max(registered)",
+            "count()&sum(balance)&max(balance)",
+            "count(filter(eq(gender,female)))&sum(balance,filter(eq(is_active,true)))",
+        ],
+    )
+    def test_scalars(self, session, shards, expr):
+        res = shards.execute(select(User).rql(expr))
+        exp = select(User).rql(expr).execute(session)
+
+        assert res == exp
+
+    def test_mean(self, session, shards):
+        res = shards.execute(select(User).rql("mean(balance)&count()"))
+        exp = select(User).rql("mean(balance)&count()").execute(session)
+
+        assert res["count"] == exp["count"]
+        assert float(res["mean"]) == pytest.approx(float(exp["mean"]))
+
+    def test_paginate(self, session, shards):
+        expr = "eq(gender,male)&sort(-balance,+user_id)&limit(10,20)"
+        res = shards.paginate(select(User).rql(expr))
+        exp = select(User).rql(expr).rql_paginate(session)
+
+        assert ids(res.page) == ids(exp.page)
+        assert res.total == exp.total
+        assert res.next_page == exp.next_page
+        assert res.previous_page == exp.previous_page
+
+    @pytest.mark.parametrize(
+        "expr",
+        [
+            "sort(-(raw,balance))",
+            "sort(+(misc,x))",
+            "select(user_id,state)&sort(-balance)",
+            "values(state)&sort(balance)",
+        ],
+    )
+    def test_sort_not_in_results(self, shards, expr):
+        with pytest.raises(RQLSelectError):
+            shards.execute(select(User).rql(expr))
+
+    def test_paginate_distinct_not_supported(self, shards):
+        with pytest.raises(RQLSelectError):
+            shards.paginate(select(User).rql("select(state)&distinct()&limit(5)"))
+
+    def test_top_not_supported(self, shards):
+        with pytest.raises(RQLSelectError):
+            shards.execute(select(User).rql("top(1,state,-balance)"))
+
+    def test_scalar_limit_not_supported(self, shards):
+        with pytest.raises(RQLSelectError):
+            shards.execute(select(User).rql("count()", limit=5))
+
+    def test_aggregate_not_supported(self, shards):
+        with pytest.raises(RQLSelectError):
+            shards.execute(select(User).rql("aggregate(state,count(user_id))"))
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from pyrql import parse
+
+from rqlalchemy.query import select
+from rqlalchemy.slowlog import RQLSlowQueryLog
+from rqlalchemy.slowlog import normalize
+
+from .fixtures import User
+
+
+class TestSlowQueryLog:
+    def test_normalize_strips_literals(self):
+        shape = normalize(
+            parse("and(eq(state,FL),in((misc,eye_color),(blue,green)),limit(10,20))")
+        )
+        assert shape == "and(eq(state,?),in((misc,eye_color),?),limit(?))"
+
+    def test_normalize_keeps_attributes(self):
+        shape = normalize(parse("aggregate(state,sum(balance))&sort(-balance,name)"))
+        assert shape == "and(aggregate(state,sum(balance)),sort(-balance,name))"
+
+    def test_normalize_nested_values(self):
+        shape = normalize(parse("gt(registered,dt(2020,1,1))"))
+        assert shape == "gt(registered,?)"
+
+    def test_groups_by_shape(self, session):
+        log = RQLSlowQueryLog(threshold=0)
+
+        with patch("rqlalchemy.RQLSelect._rql_instruments", (log,)):
+            select(User).rql("state=FL").execute(session)
+            select(User).rql("state=TX").execute(session)
+            select(User).rql("state=TX&limit(5)").rql_paginate(session)
+
+        stats = {s["shape"]: s for s in log.dump()}
+
+        assert stats.keys() == {"eq(state,?)", "and(eq(state,?),limit(?))"}
+        assert stats["eq(state,?)"]["count"] == 2
+        assert stats["eq(state,?)"]["slow"] == 2
+        assert stats["eq(state,?)"]["worst_expression"] in ("state=FL", "state=TX")
+        assert stats["and(eq(state,?),limit(?))"]["total_rows"] == 5
+        assert sum(stats["eq(state,?)"]["histogram"].values()) == 2
+
+    def test_bounded_shapes(self, session):
+        log = RQLSlowQueryLog(max_shapes=2)
+
+        with patch("rqlalchemy.RQLSelect._rql_instruments", (log,)):
+            select(User).rql("state=FL").execute(session)
+            select(User).rql("gender=male&limit(1)").execute(session)
+            select(User).rql("state=FL").execute(session)
+            select(User).rql("is_active=true&limit(1)").execute(session)
+
+        assert {s["shape"] for s in log.dump()} == {
+            "eq(state,?)",
+            "and(eq(is_active,?),limit(?))",
+        }
+
+    def test_top(self, session):
+        log = RQLSlowQueryLog()
+
+        with patch("rqlalchemy.RQLSelect._rql_instruments", (log,)):
+            select(User).rql("state=FL").execute(session)
+            select(User).rql("limit(1)").execute(session)
+
+        assert len(log.top(1)) == 1
+        log.reset()
+        assert log.dump() == []
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import sessionmaker
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import select
+
+from .fixtures import Base
+from .fixtures import User
+
+pytest.importorskip("numpy")
+
+from rqlalchemy.snapshot import RQLSnapshot  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def snapshot(engine, session):
+    return RQLSnapshot(User, engine)
+
+
+def ids(users):
+    return [u.user_id for u in users]
+
+
+class TestSnapshot:
+    @pytest.mark.parametrize(
+        "expr",
+        [
+            "eq(state,FL)",
+            "ne(state,FL)&sort(+name,+user_id)",
+            "gt(balance,3000)&sort(-balance,+user_id)",
+            "and(le(user_id,100),eq(is_active,true))",
+            "or(eq(state,TX),eq(gender,female))&sort(+user_id)&limit(10,5)",
+            "in(state,(FL,TX,CA))&sort(+registered,+user_id)",
+            "out(state,(FL,TX,CA))&first()",
+            "like(name,*Wil*)",
+            "lt(birthdate,1980-01-01)&sort(+birthdate,+user_id)",
+            "ge(registered,2018-01-01)",
+            "gt(registered,dt(2016,1,3))&sort(+registered,+user_id)",
+            "lt(birthdate,date(1970,6,1))",
+        ],
+    )
+    def test_entities(self, session, snapshot, expr):
+        res = snapshot.execute(expr)
+        exp = select(User).rql(expr).execute(session)
+
+        assert ids(res) == ids(exp)
+
+    @pytest.mark.parametrize(
+        "expr",
+        [
+            "count()",
+            "eq(state,FL)&count()",
+            "sum(balance)",
+            "min(birthdate)",
+            "max(registered)",
+            "count()&sum(balance)&max(balance)",
+            "count(filter(eq(gender,female)))&max(balance,filter(eq(is_active,true)))",
+            "select(user_id,state)&sort(-user_id)&limit(5)",
+            "values(state)&sort(+state)&distinct()",
+            "eq(user_id,10)&one()",
+        ],
+    )
+    def test_results(self, session, snapshot, expr):
+        res = snapshot.execute(expr)
+        exp = select(User).rql(expr).execute(session)
+
+        if isinstance(exp, list) and exp and isinstance(exp[0], User):
+            assert ids(res) == ids(exp)
+        else:
+            assert res == exp
+
+    def test_mean(self, session, snapshot):
+        res = snapshot.execute("mean(balance)")
+        exp = select(User).rql("mean(balance)").execute(session)
+
+        assert float(res) == pytest.approx(float(exp))
+
+    def test_one_not_found(self, snapshot):
+        with pytest.raises(RQLSelectError):
+            snapshot.execute("eq(user_id,-1)&one()")
+
+    def test_unsupported_operator(self, snapshot):
+        with pytest.raises(RQLSelectError):
+            snapshot.execute("aggregate(state,count(user_id))")
+
+    @pytest.mark.parametrize("expr", ["gt(registered,dt(2020,13,1))", "eq(state,upper(fl))"])
+    def test_invalid_value(self, snapshot, expr):
+        with pytest.raises(RQLSelectError):
+            snapshot.execute(expr)
+
+    def test_invalid_attribute(self, snapshot):
+        with pytest.raises(RQLSelectError):
+            snapshot.execute("eq(invalid,1)")
+
+    def test_refresh_on_commit(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'snapshot.db'}")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+
+        snapshot = RQLSnapshot(User, engine)
+        snapshot.refresh_on_commit(factory)
+
+        assert snapshot.execute("count()") == 0
+
+        with factory() as session:
+            session.add(User(user_id=1, name="Snapshot", state="FL"))
+            session.flush()
+            assert snapshot.execute("count()") == 0
+            session.commit()
+
+        assert snapshot.execute("eq(state,FL)&values(name)") == ["Snapshot"]
+
+        # sessions not tracked by the snapshot don't refresh it
+        with Session(engine) as session:
+            session.add(User(user_id=2, name="Other", state="FL"))
+            session.commit()
+
+        assert snapshot.execute("count()") == 1
+
+    def test_max_age(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'snapshot.db'}")
+        Base.metadata.create_all(engine)
+
+        snapshot = RQLSnapshot(User, engine, max_age=0)
+        assert snapshot.execute("count()") == 0
+
+        with Session(engine) as session:
+            session.add(User(user_id=1, name="Snapshot", state="FL"))
+            session.commit()
+
+        assert snapshot.execute("count()") == 1
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+import uuid
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import _decode_sync_value
+from rqlalchemy.query import _encode_sync_token
+from rqlalchemy.query import select
+
+from .fixtures import Base
+from .fixtures import User
+
+
+def ordered(users):
+    return sorted(users, key=lambda u: (u.registered, u.user_id))
+
+
+@patch("rqlalchemy.RQLSelect._rql_sync_column", "registered")
+class TestSync:
+    def test_initial_sync(self, session, users):
+        res = select(User).rql("eq(state,FL)").rql_sync(session)
+        exp = ordered(u for u in users if u.state == "FL")
+
+        assert res.changes == exp
+        assert res.token
+        assert not res.has_more
+
+    def test_sync_since_token(self, session, users):
+        exp = ordered(u for u in users if u.state == "FL")
+        first = select(User).rql("eq(state,FL)&limit(5)").rql_sync(session)
+
+        assert first.changes == exp[:5]
+        assert first.has_more
+
+        second = select(User).rql("eq(state,FL)&limit(100)").rql_sync(session, first.token)
+
+        assert second.changes == exp[5:]
+        assert not second.has_more
+
+    def test_sync_pages_through_all_changes(self, session, users):
+        changes = []
+        token = None
+        while True:
+            res = select(User).rql("limit(97)").rql_sync(session, token)
+            changes.extend(res.changes)
+            token = res.token
+            if not res.has_more:
+                break
+
+        assert changes == ordered(users)
+
+        # no changes since the last token
+        res = select(User).rql("limit(97)").rql_sync(session, token)
+        assert res.changes == []
+        assert res.token == token
+
+    def test_sync_breaks_ties_by_primary_key(self, session, users):
+        # every user in a state has the same sync value
+        with patch("rqlalchemy.RQLSelect._rql_sync_column", "state"):
+            res = select(User).rql("eq(state,FL)").rql_sync(session)
+            first = select(User).rql("eq(state,FL)&limit(1)").rql_sync(session)
+            rest = select(User).rql("eq(state,FL)").rql_sync(session, first.token)
+
+        assert [u.user_id for u in res.changes] == sorted(
+            u.user_id for u in users if u.state == "FL"
+        )
+        assert first.changes + rest.changes == res.changes
+
+    def test_sync_decimal_column(self, session, users):
+        changes = []
+        token = None
+        with patch("rqlalchemy.RQLSelect._rql_sync_column", "balance"):
+            while True:
+                res = select(User).rql("limit(300)").rql_sync(session, token)
+                changes.extend(res.changes)
+                token = res.token
+                if not res.has_more:
+                    break
+
+        assert changes == sorted(users, key=lambda u: (u.balance, u.user_id))
+
+    def test_sync_nullable_column(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as session:
+            for user_id in range(20):
+                city = None if user_id % 3 else f"City {user_id % 4}"
+                session.add(User(user_id=user_id, name=f"User {user_id}", city=city))
+            session.commit()
+
+            changes = []
+            token = None
+            with patch("rqlalchemy.RQLSelect._rql_sync_column", "city"):
+                while True:
+                    res = select(User).rql("limit(4)").rql_sync(session, token)
+                    changes.extend(res.changes)
+                    token = res.token
+                    if not res.has_more:
+                        break
+
+            exp = sorted(
+                session.query(User), key=lambda u: (u.city is not None, u.city or "", u.user_id)
+            )
+            assert changes == exp
+
+        engine.dispose()
+
+    def test_sync_values(self, session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("values((misc,eye_color))").rql_sync(session)
+
+    def test_sync_token_types(self):
+        value = uuid.uuid4()
+        token = _encode_sync_token(value, 1)
+
+        (encoded, pk) = json.loads(base64.urlsafe_b64decode(token))
+        assert _decode_sync_value(encoded, sa.Column(sa.Uuid)) == value
+        assert pk == 1
+
+        with pytest.raises(TypeError):
+            _encode_sync_token(object(), 1)
+
+    def test_invalid_decimal_token(self, session):
+        token = _encode_sync_token("nope", 1)
+
+        with patch("rqlalchemy.RQLSelect._rql_sync_column", "balance"):
+            with pytest.raises(RQLSelectError):
+                select(User).rql("").rql_sync(session, token)
+
+    def test_sync_with_select(self, session, users):
+        res = select(User).rql("select(user_id,registered)&limit(5)").rql_sync(session)
+        more = select(User).rql("select(user_id,registered)&limit(5)").rql_sync(session, res.token)
+
+        assert [r["user_id"] for r in res.changes + more.changes] == [
+            u.user_id for u in ordered(users)[:10]
+        ]
+
+    def test_sync_select_without_column(self, session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("select(user_id)").rql_sync(session)
+
+    def test_invalid_token(self, session):
+        with pytest.raises(RQLSelectError):
+            select(User).rql("").rql_sync(session, "invalid")
+
+    def test_sync_requires_column(self, session):
+        with patch("rqlalchemy.RQLSelect._rql_sync_column", None):
+            with pytest.raises(RQLSelectError):
+                select(User).rql("").rql_sync(session)
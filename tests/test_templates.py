@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy import RQLTemplate
+from rqlalchemy import warm_up
+from rqlalchemy.query import RQLSelect
+from rqlalchemy.query import select
+
+from .fixtures import Base
+from .fixtures import Blog
+from .fixtures import User
+
+EXPRESSION = "and(eq(state,FL),sort(-balance),limit(5))"
+
+
+class CustomSelect(RQLSelect):
+    inherit_cache = True
+    _rql_max_limit = 10
+
+
+class TestRQLTemplate:
+    def test_select(self, session, users):
+        template = RQLTemplate(User, EXPRESSION)
+
+        res = template.select().execute(session)
+        exp = select(User).rql(EXPRESSION).execute(session)
+
+        assert [u.user_id for u in res] == [u.user_id for u in exp]
+
+    def test_fresh_select(self):
+        template = RQLTemplate(User, EXPRESSION)
+
+        first = template.select()
+        second = template.select()
+
+        assert first is not second
+        assert first.rql_parsed == second.rql_parsed
+        assert first.rql_parsed is not second.rql_parsed
+
+        first.rql_parsed["args"].clear()
+        assert template.select().rql_parsed == second.rql_parsed
+
+    def test_limit(self, session, users):
+        res = RQLTemplate(User, "sort(user_id)").select(limit=3).execute(session)
+
+        assert [u.user_id for u in res] == [0, 1, 2]
+
+    def test_empty(self, session, users):
+        res = RQLTemplate(User, "").select().execute(session)
+
+        assert len(res) == len(users)
+
+    def test_select_cls(self):
+        query = RQLTemplate(User, EXPRESSION, CustomSelect).select()
+
+        assert isinstance(query, CustomSelect)
+
+    def test_immutable(self):
+        template = RQLTemplate(User, EXPRESSION)
+
+        with pytest.raises(AttributeError):
+            template.expression = "eq(state,TX)"
+
+        with pytest.raises(AttributeError):
+            template._parsed = None
+
+        assert template.expression == EXPRESSION
+        assert template.model is User
+
+    def test_threads(self):
+        template = RQLTemplate(User, EXPRESSION)
+        exp = str(select(User).rql(EXPRESSION).compile())
+
+        with ThreadPoolExecutor(8) as executor:
+            compiled = list(executor.map(lambda _: str(template.select().compile()), range(64)))
+
+        assert set(compiled) == {exp}
+
+    @pytest.mark.parametrize("expr", ["eq(state,FL", "eq(nope,FL)", "top(0,state,balance)"])
+    def test_invalid(self, expr):
+        with pytest.raises(RQLSelectError):
+            RQLTemplate(User, expr)
+
+
+@pytest.fixture
+def empty_engine():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+
+    yield engine
+
+    engine.dispose()
+
+
+class TestWarmUp:
+    def test_templates(self, empty_engine):
+        templates = warm_up([empty_engine], {User: [EXPRESSION, "count()"], Blog: ["sort(title)"]})
+
+        assert [t.expression for t in templates[User]] == [EXPRESSION, "count()"]
+        assert [t.expression for t in templates[Blog]] == ["sort(title)"]
+
+    def test_compiled_cache(self, empty_engine):
+        expressions = [
+            EXPRESSION,
+            "and(eq(gender,female),count())",
+            "aggregate(state,count(user_id))",
+        ]
+        templates = warm_up([empty_engine], {User: expressions})
+
+        cached = len(empty_engine._compiled_cache)
+        assert cached >= len(expressions)
+
+        with Session(empty_engine) as session:
+            for template in templates[User]:
+                template.select().execute(session)
+            for expression in expressions:
+                select(User).rql(expression).execute(session)
+
+        assert len(empty_engine._compiled_cache) == cached
+
+    def test_paginate_count(self, empty_engine):
+        warm_up([empty_engine], {User: [EXPRESSION]})
+        cached = len(empty_engine._compiled_cache)
+
+        with Session(empty_engine) as session:
+            select(User).rql(EXPRESSION).rql_paginate(session)
+
+        assert len(empty_engine._compiled_cache) == cached
+
+    def test_streamed(self, empty_engine):
+        options = []
+        event.listen(
+            empty_engine,
+            "before_cursor_execute",
+            lambda *args: options.append(args[4].execution_options.get("stream_results")),
+        )
+
+        warm_up([empty_engine], {User: ["", EXPRESSION]})
+
+        assert options == [True, True, True]
+
+    def test_rolled_back(self, empty_engine):
+        warm_up([empty_engine], {User: [EXPRESSION]})
+
+        with Session(empty_engine) as session:
+            assert select(User).rql("count()").execute(session) == 0
+
+    def test_invalid(self, empty_engine):
+        with pytest.raises(RQLSelectError):
+            warm_up([empty_engine], {User: ["eq(nope,FL)"]})
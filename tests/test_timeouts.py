@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy import RQLTimeoutError
+from rqlalchemy.query import select
+from rqlalchemy.timeouts import statement_timeout
+
+from .fixtures import User
+
+# SQLite checks the deadline every thousand instructions, so a timeout this
+# short interrupts any query reading more than a few rows
+EXPIRED = 1e-9
+
+
+class TestTimeouts:
+    def test_execute_timeout(self, session):
+        with pytest.raises(RQLTimeoutError):
+            select(User).rql("sort(name)").execute(session, timeout=EXPIRED)
+
+    def test_timeout_error_is_select_error(self):
+        assert issubclass(RQLTimeoutError, RQLSelectError)
+
+    def test_execute_within_timeout(self, session, users):
+        res = select(User).rql("eq(state,FL)").execute(session, timeout=10)
+
+        assert res == [u for u in users if u.state == "FL"]
+
+    def test_scalar_timeout(self, session):
+        with pytest.raises(RQLTimeoutError):
+            select(User).rql("sum(balance)").execute(session, timeout=EXPIRED)
+
+    @patch("rqlalchemy.RQLSelect._rql_timeout", EXPIRED)
+    def test_default_timeout(self, session):
+        with pytest.raises(RQLTimeoutError):
+            select(User).rql("sort(name)").execute(session)
+
+    def test_progress_handler_removed(self, session):
+        with pytest.raises(RQLTimeoutError):
+            select(User).rql("sort(name)").execute(session, timeout=EXPIRED)
+
+        assert len(select(User).rql("sort(name)").execute(session)) == 1000
+
+    def test_paginate_count_timeout(self, session, users):
+        res = (
+            select(User).rql("eq(state,FL)&limit(5)").rql_paginate(session, count_timeout=EXPIRED)
+        )
+        exp = [u for u in users if u.state == "FL"]
+
+        assert res.page == exp[:5]
+        assert res.total is None
+        assert res.next_page == "and(eq(state,FL),limit(5,5))"
+        assert res.previous_page is None
+
+    def test_paginate_count_timeout_last_page(self, session, users):
+        count = len([u for u in users if u.state == "FL"])
+        res = (
+            select(User)
+            .rql(f"eq(state,FL)&limit(5,{count - 2})")
+            .rql_paginate(session, count_timeout=EXPIRED)
+        )
+
+        assert len(res.page) == 2
+        assert res.total is None
+        assert res.next_page is None
+        assert res.previous_page is not None
+
+    @patch("rqlalchemy.RQLSelect._rql_count_timeout", 10)
+    def test_paginate_count_within_timeout(self, session, users):
+        res = select(User).rql("eq(state,FL)&limit(5)").rql_paginate(session)
+
+        assert res.total == len([u for u in users if u.state == "FL"])
+
+    def test_paginate_page_timeout(self, session):
+        with pytest.raises(RQLTimeoutError):
+            select(User).rql("sort(name)&limit(5)").rql_paginate(session, timeout=EXPIRED)
+
+    def test_mysql_hint(self):
+        session = MagicMock()
+        session.connection().dialect.name = "mysql"
+        query = select(User).rql("eq(state,FL)")
+
+        with statement_timeout(session, query, 1.5) as statement:
+            sql = str(statement.compile(dialect=mysql.dialect()))
+
+        assert sql.startswith("SELECT /*+ MAX_EXECUTION_TIME(1500) */ user.user_id")
+
+    def test_postgresql_statement_timeout(self):
+        session = MagicMock()
+        connection = session.connection()
+        connection.dialect.name = "postgresql"
+        connection.execute().scalar.return_value = "0"
+        query = select(User).rql("eq(state,FL)")
+
+        with statement_timeout(session, query, 2) as statement:
+            assert statement is query
+
+        (set_timeout, restore) = connection.execute.call_args_list[-2:]
+        assert "set_config('statement_timeout', :timeout, true)" in str(set_timeout.args[0])
+        assert set_timeout.args[1] == {"timeout": "2000"}
+        assert restore.args[1] == {"timeout": "0"}
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects import sqlite
+
+from rqlalchemy import RQLSelectError
+from rqlalchemy.query import select
+
+from .fixtures import Post
+from .fixtures import User
+
+
+def compiled(query, dialect):
+    statement = query._rql_statement(dialect.name)
+    return str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def top(users, n, key):
+    groups = {}
+    for user in sorted(users, key=lambda u: (key(u), u.user_id)):
+        groups.setdefault(user.state, []).append(user.user_id)
+
+    return {user_id for ids in groups.values() for user_id in ids[:n]}
+
+
+class TestTop:
+    def test_top(self, session, users):
+        res = select(User).rql("top(3,state,-balance)").execute(session)
+
+        assert {u.user_id for u in res} == top(users, 3, lambda u: -u.balance)
+
+    def test_ascending(self, session, users):
+        res = select(User).rql("top(1,state,+balance)").execute(session)
+
+        assert {u.user_id for u in res} == top(users, 1, lambda u: u.balance)
+
+    def test_several_sort_attributes(self, session, users):
+        res = select(User).rql("top(2,state,gender,-balance)").execute(session)
+
+        assert {u.user_id for u in res} == top(users, 2, lambda u: (u.gender, -u.balance))
+
+    def test_with_filter(self, session, users):
+        res = select(User).rql("and(eq(is_active,true),top(2,state,-balance))").execute(session)
+
+        assert {u.user_id for u in res} == top(
+            [u for u in users if u.is_active], 2, lambda u: -u.balance
+        )
+
+    def test_with_sort_and_limit(self, session, users):
+        res = select(User).rql("and(top(1,state,-balance),sort(-balance),limit(5))")
+        res = res.execute(session)
+
+        exp = sorted(
+            [u for u in users if u.user_id in top(users, 1, lambda u: -u.balance)],
+            key=lambda u: -u.balance,
+        )
+        assert [u.user_id for u in res] == [u.user_id for u in exp[:5]]
+
+    def test_with_count(self, session, users):
+        res = select(User).rql("and(top(2,state,-balance),count())").execute(session)
+
+        assert res == len(top(users, 2, lambda u: -u.balance))
+
+    def test_with_join(self, session, posts):
+        res = select(Post).rql("and(eq((blog,user_id),1),top(1,blog_id,-id))").execute(session)
+
+        exp = {}
+        for post in posts:
+            if post.blog.user_id == 1:
+                exp[post.blog_id] = max(exp.get(post.blog_id, 0), post.id)
+
+        assert exp
+        assert {p.id for p in res} == set(exp.values())
+
+    def test_window(self):
+        sql = compiled(select(User).rql("top(3,state,-balance)"), sqlite.dialect())
+
+        assert (
+            "row_number() OVER (PARTITION BY user.state ORDER BY user.balance DESC, user.user_id)"
+        ) in sql
+        assert "rql_ranked.rql_rank <= 3" in sql
+
+    def test_lateral(self):
+        sql = compiled(select(User).rql("top(3,state,-balance)"), postgresql.dialect())
+
+        assert "JOIN LATERAL" in sql
+        assert "ORDER BY rql_top.balance DESC, rql_top.user_id \n LIMIT 3" in sql
+        assert "row_number()" not in sql
+
+    @pytest.mark.parametrize(
+        "expr",
+        [
+            "top(3,state)",
+            "top(0,state,balance)",
+            "top(a,state,balance)",
+            "top(true,state,balance)",
+            "top(3,state,(blogs,title))",
+            "top(3,state,nope)",
+        ],
+    )
+    def test_invalid(self, expr):
+        with pytest.raises(RQLSelectError):
+            select(User).rql(expr)